@@ -6,9 +6,19 @@ from speedysvc.client_server.shared_memory.SHMClient import SHMClient
 from speedysvc.client_server.shared_memory.SHMServer import SHMServer
 from speedysvc.client_server.network.NetworkClient import NetworkClient
 from speedysvc.client_server.network.NetworkServer import NetworkServer
+from speedysvc.client_server.network.PooledNetworkClient import PooledNetworkClient
+from speedysvc.client_server.network.GatewayClient import GatewayClient
+from speedysvc.client_server.network.GatewayServer import GatewayServer
+from speedysvc.client_server.network.UDPClient import UDPClient
+from speedysvc.client_server.network.UDPServer import UDPServer
+from speedysvc.client_server.wrappers.BatchingClient import BatchingClient
+from speedysvc.client_server.wrappers.HedgingClient import HedgingClient
+from speedysvc.client_server.wrappers.FailoverClient import FailoverClient
 from speedysvc.rpc_decorators import \
     json_method, marshal_method, msgpack_method, \
-    raw_method, pickle_method
+    raw_method, pickle_method, singleflight, cached, oneway, \
+    concurrency_limit
+from speedysvc.client_server.admission import ServiceBusyError
 #from speedysvc.logger.std_logging.LoggerServer import LoggerServer
 #from speedysvc.logger.std_logging.LoggerClient import LoggerClient
 #from speedysvc.logger.time_series_data.ServiceTimeSeriesData import \
@@ -0,0 +1,163 @@
+import time
+from threading import Condition
+
+
+class ServiceBusyError(Exception):
+    """
+    Raised (including on the client) when a call is rejected because
+    the service or method already has as many calls in progress and
+    waiting as its limits allow. The call wasn't started, so it's safe
+    to retry it later, or to fall back to something else.
+    """
+    pass
+
+
+class _Limit:
+    __slots__ = ('description', 'max_concurrency', 'max_queued', 'running', 'waiting')
+
+    def __init__(self, description, max_concurrency, max_queued):
+        self.description = description
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_queued or 0
+        self.running = 0
+        self.waiting = 0
+
+    def is_full(self):
+        return (
+            self.running + self.waiting >=
+            self.max_concurrency + self.max_queued
+        )
+
+    def can_run(self):
+        return self.running < self.max_concurrency
+
+
+class AdmissionControl:
+    def __init__(self, name, load_stats, max_concurrency=None, max_queued=None,
+                 num_workers=1):
+        """
+        Limits the number of calls a server handles at once, for the
+        service as a whole and for methods decorated with
+        @concurrency_limit. Calls over the concurrency limit wait for
+        a free slot, and calls over the queue limit on top of that
+        are rejected with ServiceBusyError straight away, rather than
+        piling up with unbounded latency under overload.
+
+        The limits apply to each server separately, so for
+        the SHMServer in each worker process, the limits
+        are per worker.
+
+        :param name: the name of the service
+        :param load_stats: the server's LoadStats, which is sent how
+                           long calls waited for a free slot (which
+                           the load autoscaler uses)
+        :param max_concurrency: the maximum number of calls to the
+                                service to handle at once, or None
+                                for no limit
+        :param max_queued: the maximum number of calls to the
+                           service which can wait for a free slot
+        :param num_workers: the number of worker processes the calls
+                            are forwarded to, for servers which don't
+                            call the methods themselves (e.g. the
+                            MultiProcessManager's NetworkServer). The
+                            limits are per worker, so both the service's
+                            and methods' limits are multiplied by this.
+        """
+        self.name = name
+        self.load_stats = load_stats
+        self.num_workers = num_workers
+        self.cond = Condition()
+
+        if max_concurrency is None:
+            self.service_limit = None
+        else:
+            self.service_limit = _Limit(
+                f'Service {name}',
+                max_concurrency * num_workers,
+                (max_queued or 0) * num_workers
+            )
+        # {cmd: _Limit, ...} for methods with @concurrency_limit
+        self.DMethodLimits = {}
+
+    def __get_limits(self, cmd, fn, include_service):
+        LLimits = []
+        if include_service and self.service_limit is not None:
+            LLimits.append(self.service_limit)
+
+        if getattr(fn, 'max_concurrency', None) is not None:
+            method_limit = self.DMethodLimits.get(cmd)
+            if method_limit is None:
+                method_limit = self.DMethodLimits[cmd] = _Limit(
+                    f'Method {cmd} of service {self.name}',
+                    fn.max_concurrency * self.num_workers,
+                    (fn.max_queued or 0) * self.num_workers
+                )
+            LLimits.append(method_limit)
+        return LLimits
+
+    def is_saturated(self):
+        """
+        :return: whether the service is at its concurrency limit,
+                 so new calls would need to wait (or be rejected)
+        """
+        limit = self.service_limit
+        return limit is not None and not limit.can_run()
+
+    def acquire(self, cmd, fn, wait=True, include_service=True):
+        """
+        Start a call to method `cmd`, waiting for a free slot
+        if the service or method is at its concurrency limit
+
+        :param cmd: the name of the method
+        :param fn: the method (or None for internal commands)
+        :param wait: if False, calls waiting elsewhere (e.g. in
+                     NetworkServer's queue) are counted as running, and
+                     it never waits: calls are only rejected once there
+                     are max_concurrency+max_queued in progress
+        :param include_service: whether to apply the service's limits,
+                                as well as the method's
+        :return: the limits which were acquired, to pass to release()
+        :raise: ServiceBusyError if the service or method already has
+                too many calls in progress and waiting
+        """
+        LLimits = self.__get_limits(cmd, fn, include_service)
+        if not LLimits:
+            return LLimits
+
+        with self.cond:
+            for limit in LLimits:
+                if limit.is_full():
+                    raise ServiceBusyError(
+                        f"{limit.description} is busy: {limit.running} "
+                        f"calls running and {limit.waiting} waiting"
+                    )
+
+            if wait and not all(limit.can_run() for limit in LLimits):
+                t_from = time.time()
+                for limit in LLimits:
+                    limit.waiting += 1
+                try:
+                    while not all(limit.can_run() for limit in LLimits):
+                        self.cond.wait()
+                finally:
+                    for limit in LLimits:
+                        limit.waiting -= 1
+                self.load_stats.add_queue_wait(time.time() - t_from)
+
+            for limit in LLimits:
+                limit.running += 1
+        return LLimits
+
+    def release(self, LLimits):
+        """
+        Finish a call started with acquire()
+
+        :param LLimits: the limits acquire() returned
+        """
+        if not LLimits:
+            return
+
+        with self.cond:
+            for limit in LLimits:
+                limit.running -= 1
+            self.cond.notify_all()
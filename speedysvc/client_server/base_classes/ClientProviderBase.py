@@ -2,6 +2,12 @@ from ast import literal_eval
 from abc import ABC, abstractmethod
 from speedysvc.toolkit.exceptions.exception_map import DExceptions
 from speedysvc.toolkit.io.file_locks import lock, unlock, LockException, LOCK_NB, LOCK_EX
+from speedysvc.client_server.admission import ServiceBusyError
+
+
+# Exceptions raised by servers which are recreated on the client,
+# including ones specific to speedysvc, so they can be caught
+_DExceptions = dict(DExceptions, ServiceBusyError=ServiceBusyError)
 
 
 class ClientProviderBase(ABC):
@@ -15,6 +21,16 @@ class ClientProviderBase(ABC):
     def get_server_methods(self):
         return self.server_methods
 
+    def get_cache_versions(self):
+        """
+        Get the CacheVersions of the service, if it's on the same
+        host, so that results of @cached methods can be cached.
+
+        :return: a CacheVersions instance, or None if
+                 results can't be cached by this client
+        """
+        return None
+
     PATH = '/tmp/shmsrv-%s-%s'
     MAX_CONNECTIONS = 500
 
@@ -89,7 +105,7 @@ class ClientProviderBase(ABC):
             remainder = ''
             exc_type = None
 
-        if exc_type is not None and exc_type in DExceptions:
-            raise DExceptions[exc_type](remainder)
+        if exc_type is not None and exc_type in _DExceptions:
+            raise _DExceptions[exc_type](remainder)
         else:
             raise Exception(response_data)
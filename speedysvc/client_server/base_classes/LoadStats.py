@@ -0,0 +1,130 @@
+import time
+from collections import deque
+from _thread import allocate_lock
+
+
+# The maximum number of call durations kept between
+# snapshots, for estimating the latency percentiles
+MAX_LATENCY_SAMPLES = 256
+
+
+class LoadStats:
+    def __init__(self):
+        """
+        Counts the calls handled by a service in this process: how
+        many are in progress, how long they took, and how long they
+        waited before being handled. The counts are reset each time
+        `snapshot()` is called, which LoggerClient does periodically,
+        to report them to the MultiProcessManager for autoscaling.
+        """
+        self.lock = allocate_lock()
+        self.in_flight = 0
+        self.__reset(time.time())
+
+    def __reset(self, t):
+        self.period_started = t
+        self.num_requests = 0
+        self.busy_secs = 0.0
+        self.queue_wait_secs = 0.0
+        self.num_queued = 0
+        self.LLatencies = deque(maxlen=MAX_LATENCY_SAMPLES)
+
+    def started(self):
+        """
+        Call when a call starts being handled
+        """
+        with self.lock:
+            self.in_flight += 1
+
+    def finished(self, duration):
+        """
+        Call when a call which `started()` has been handled
+
+        :param duration: how long the call took in seconds
+        """
+        with self.lock:
+            self.in_flight -= 1
+            self.num_requests += 1
+            self.busy_secs += duration
+            self.LLatencies.append(duration)
+
+    def add_queue_wait(self, wait_secs):
+        """
+        Record how long a call waited in a queue
+        before a thread was free to handle it
+        """
+        with self.lock:
+            self.queue_wait_secs += wait_secs
+            self.num_queued += 1
+
+    def snapshot(self):
+        """
+        :return: a dict (which can be encoded as json) of the stats
+                 since the last snapshot, resetting them
+        """
+        t = time.time()
+        with self.lock:
+            D = {
+                'period': t - self.period_started,
+                'num_requests': self.num_requests,
+                'in_flight': self.in_flight,
+                'busy_secs': self.busy_secs,
+                'queue_wait_secs': self.queue_wait_secs,
+                'num_queued': self.num_queued,
+                'latencies': list(self.LLatencies),
+            }
+            self.__reset(t)
+        return D
+
+
+_DLoadStats = {}
+_load_stats_lock = allocate_lock()
+
+
+def get_load_stats(port):
+    """
+    Get the LoadStats for a service, shared by all the
+    servers for the service (e.g. SHMServer and NetworkServer)
+    in this process
+    """
+    with _load_stats_lock:
+        if not port in _DLoadStats:
+            _DLoadStats[port] = LoadStats()
+        return _DLoadStats[port]
+
+
+def combine_load_stats(LSnapshots):
+    """
+    Combine snapshots from several processes
+
+    :param LSnapshots: a list of dicts returned by LoadStats.snapshot()
+    :return: a dict with the total request rate (per second), the
+             number of calls in progress, the average number of
+             calls in progress over the period (concurrency), the
+             average queue wait and the 95th percentile call duration
+             (both in seconds, or None if there were no calls)
+    """
+    request_rate = in_flight = concurrency = 0
+    queue_wait_secs = num_queued = 0
+    LLatencies = []
+
+    for D in LSnapshots:
+        period = max(D['period'], 0.001)
+        request_rate += D['num_requests'] / period
+        concurrency += D['busy_secs'] / period
+        in_flight += D['in_flight']
+        queue_wait_secs += D['queue_wait_secs']
+        num_queued += D['num_queued']
+        LLatencies.extend(D['latencies'])
+
+    LLatencies.sort()
+    return {
+        'request_rate': request_rate,
+        'in_flight': in_flight,
+        'concurrency': concurrency,
+        'queue_wait': queue_wait_secs / num_queued if num_queued else None,
+        'p95_latency': (
+            LLatencies[min(int(len(LLatencies) * 0.95), len(LLatencies) - 1)]
+            if LLatencies else None
+        ),
+    }
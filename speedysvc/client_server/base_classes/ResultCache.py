@@ -0,0 +1,60 @@
+from collections import OrderedDict
+from _thread import allocate_lock
+
+
+class ResultCache:
+    def __init__(self, server_fn, max_entries):
+        """
+        A per-process LRU cache of the results of a method decorated
+        with @cached. Results are only used while the server hasn't
+        bumped the method's version since they were requested.
+
+        :param server_fn: the server method
+        :param max_entries: the maximum number of results to keep
+        """
+        self.server_fn = server_fn
+        self.max_entries = max_entries
+        self.DResults = OrderedDict()
+        self.lock = allocate_lock()
+
+    def __get_key(self, client_provider, args):
+        try:
+            key = (client_provider.port, tuple(args))
+            hash(key)
+            return key
+        except TypeError:
+            # Lists/dicts etc can't be hashed,
+            # so use the encoded arguments instead
+            return client_provider.port, self.server_fn.serialiser.dumps(args)
+
+    def send(self, client_methods, args):
+        """
+        Return the cached result of calling the method with `args`
+        if there is one which is still valid, otherwise call it.
+        """
+        client_provider = client_methods.client_provider
+        cache_versions = client_provider.get_cache_versions()
+        if cache_versions is None:
+            # Can't tell when results become stale,
+            # e.g. if the service is on a different host
+            return client_methods.send(self.server_fn, args)
+
+        # The version must be read before the call, in case the
+        # server changes the data while the call is in progress
+        version = cache_versions.get_version(self.server_fn.__name__)
+        key = self.__get_key(client_provider, args)
+
+        with self.lock:
+            cached = self.DResults.get(key)
+            if cached is not None and cached[0] == version:
+                self.DResults.move_to_end(key)
+                return cached[1]
+
+        result = client_methods.send(self.server_fn, args)
+
+        with self.lock:
+            self.DResults[key] = (version, result)
+            self.DResults.move_to_end(key)
+            while len(self.DResults) > self.max_entries:
+                self.DResults.popitem(last=False)
+        return result
@@ -1,3 +1,6 @@
+from speedysvc.client_server.shared_memory.CacheVersions import get_cache_versions
+
+
 class ServerMethodsBase:
     def __init__(self, logger_client):
         """
@@ -8,6 +11,28 @@ class ServerMethodsBase:
 
         self.logger_client = self.log = logger_client
 
+    @classmethod
+    def preload(cls):
+        """
+        Can be overridden to import modules/load data which all the
+        worker processes need before the class is instantiated.
+        If the service is started with zygote=true, this is only
+        called once, and the workers share what was loaded
+        copy-on-write. Otherwise it's called in each worker.
+        """
+        pass
+
+    def invalidate_cache(self, *methods):
+        """
+        Make clients stop using cached results of methods decorated
+        with @cached, e.g. after the data they return has changed.
+
+        :param methods: the methods (or their names)
+        """
+        cache_versions = get_cache_versions(self.port)
+        for method in methods:
+            cache_versions.bump_version(getattr(method, '__name__', method))
+
     """
     `port` Must be implemented by classes
     which supply server methods.
@@ -1,39 +1,201 @@
+import sys
+import time
+import traceback
+
 from speedysvc.serialisation.RawSerialisation import \
     RawSerialisation
+from speedysvc.client_server.shared_memory.SingleFlight import SingleFlight
+from speedysvc.client_server.base_classes.LoadStats import get_load_stats
+from speedysvc.client_server.base_classes.WorkerEventLoop import get_worker_event_loop
+from speedysvc.client_server.admission import AdmissionControl, ServiceBusyError
+from speedysvc.client_server.batch_encoding import \
+    BATCH_CMD, decode_batch_requests, encode_batch_responses
+from speedysvc.client_server.ping import PING_CMD
 
 
 class ServerProviderBase:
     ___init = False
 
-    def __init__(self, server_methods):
+    def __init__(self, server_methods, max_concurrency=None, max_queued=None,
+                 num_workers=1):
         """
         TODO!!!! ===========================================================
 
         :param server_inst:
+        :param max_concurrency: the maximum number of calls to handle
+                                at once, or None for no limit (see
+                                AdmissionControl)
+        :param max_queued: the maximum number of calls which can
+                           wait for a free slot, on top of that
+        :param num_workers: the number of worker processes calls
+                            are forwarded to, which the limits
+                            are multiplied by
         """
         # Couldn't see much reason to have an abstract base class here,
         # as the "serve" logic is implementation-specific
         self.server_methods = server_methods
         self.port = server_methods.port
         self.name = server_methods.name
+        self.single_flight = SingleFlight()
+        self.load_stats = get_load_stats(self.port)
+        self.admission_control = AdmissionControl(
+            self.name, self.load_stats, max_concurrency, max_queued,
+            num_workers
+        )
 
         assert not self.___init, \
             f"{self.__class__} has already been started!"
         self.___init = True
 
     def handle_fn(self, cmd, args):
-        fn = getattr(self.server_methods, cmd.decode('ascii'))
+        """
+        Call the method `cmd` (including batches of calls)
+        with the encoded arguments `args`
+
+        :return: the encoded result
+        """
+        if isinstance(cmd, bytes):
+            cmd = cmd.decode('ascii')
+        if cmd == PING_CMD:
+            return b''
+
+        t_from = time.time()
+        self.load_stats.started()
+        try:
+            if cmd == BATCH_CMD:
+                return self.handle_batch(args)
+            fn = getattr(self.server_methods, cmd)
+            result = self.call_method(fn, cmd, args)
+        finally:
+            self.load_stats.finished(time.time() - t_from)
+
+        if hasattr(fn, 'metadata'):
+            fn.metadata['num_calls'] += 1
+            fn.metadata['total_time'] += time.time() - t_from
+        return result
+
+    def handle_batch(self, args):
+        """
+        Call each of the methods in a batch in turn. Exceptions are
+        encoded for each call separately, so that one call failing
+        doesn't affect the others. The batch counts as a single call
+        towards the service's concurrency limit, but each call is
+        subject to its method's limit.
+
+        :return: the encoded responses
+        """
+        LResponses = []
+
+        for cmd, args in decode_batch_requests(args):
+            t_from = time.time()
+            fn = None
+
+            try:
+                fn = getattr(self.server_methods, cmd)
+                LLimits = self.admission_control.acquire(
+                    cmd, fn, include_service=False
+                )
+                try:
+                    LResponses.append((b'+', self.call_method(fn, cmd, args)))
+                finally:
+                    self.admission_control.release(LLimits)
+
+            except ServiceBusyError as exc:
+                LResponses.append((b'-', b'-' + repr(exc).encode('utf-8')))
+
+            except Exception as exc:
+                sys.stderr.write(f"Service {self.name} error handling method: {fn}\n")
+                traceback.print_exc()
+                LResponses.append((b'-', b'-' + repr(exc).encode('utf-8')))
+
+            if hasattr(fn, 'metadata'):
+                fn.metadata['num_calls'] += 1
+                fn.metadata['total_time'] += time.time() - t_from
+
+        return encode_batch_responses(LResponses)
 
-        # Use the serialiser to decode the arguments,
-        # before encoding the return value of the RPC call
-        if fn.serialiser == RawSerialisation:
+    def call_method(self, fn, cmd, args):
+        """
+        Call `fn`, returning the encoded result. If `fn` was decorated
+        with @singleflight, identical calls already in progress in
+        this worker process share a single call's result.
+        """
+        if getattr(fn, 'singleflight', False):
+            return self.single_flight.do(
+                (cmd, bytes(args)), lambda: self.__call_method_now(fn, args)
+            )
+        return self.__call_method_now(fn, args)
+
+    def __call_method_now(self, fn, args):
+        serialiser = fn.serialiser
+        if serialiser == RawSerialisation:
             # Special case: if the data is just raw bytes
             # (not a list of parameters) treat it as just
             # a single parameter
-            args = (args,)
+            return serialiser.dumps(self.call_fn(fn, args))
         else:
-            args = fn.serialiser.loads(args)
+            return serialiser.dumps(self.call_fn(fn, *serialiser.loads(args)))
 
-        result = fn(*args)
-        result = fn.serialiser.dumps(result)
-        return result
+    def get_async_method(self, cmd):
+        """
+        :return: the method `cmd` if it's `async def`, and can be
+                 called with call_async_method(), otherwise None
+        """
+        if isinstance(cmd, bytes):
+            cmd = cmd.decode('ascii')
+        fn = getattr(self.server_methods, cmd, None)
+        if getattr(fn, 'is_async', False) and not getattr(fn, 'singleflight', False):
+            return fn
+        return None
+
+    def call_async_method(self, fn, args, callback):
+        """
+        Start calling the async method `fn` with the encoded arguments
+        `args` on this process's event loop, without waiting for it
+        to finish, so that the calling thread can handle other
+        requests in the meantime.
+
+        :param callback: called with (the encoded result, None) or
+                         (None, the exception) once the call has
+                         finished, usually from the event loop's thread
+        """
+        t_from = time.time()
+        self.load_stats.started()
+
+        def done(future):
+            self.load_stats.finished(time.time() - t_from)
+            fn.metadata['num_calls'] += 1
+            fn.metadata['total_time'] += time.time() - t_from
+            # The callback must always be called, including if the
+            # coroutine was cancelled, or the caller's request (and its
+            # admission control slot) would never be finished
+            try:
+                if future.cancelled():
+                    raise RuntimeError(f"Call to {fn.__name__} was cancelled")
+                result = fn.serialiser.dumps(future.result())
+            except BaseException as exc:
+                callback(None, exc)
+            else:
+                callback(result, None)
+
+        try:
+            if fn.serialiser == RawSerialisation:
+                coro = fn(args)
+            else:
+                coro = fn(*fn.serialiser.loads(args))
+        except Exception as exc:
+            self.load_stats.finished(time.time() - t_from)
+            callback(None, exc)
+            return
+        get_worker_event_loop().submit(coro).add_done_callback(done)
+
+    def call_fn(self, fn, *args):
+        """
+        Call `fn` with `args`, running it on this process's
+        event loop until it's finished if it's `async def`
+
+        :return: the (unencoded) result
+        """
+        if getattr(fn, 'is_async', False):
+            return get_worker_event_loop().run(fn(*args))
+        return fn(*args)
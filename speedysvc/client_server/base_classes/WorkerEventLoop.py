@@ -0,0 +1,61 @@
+import os
+import asyncio
+from _thread import start_new_thread, allocate_lock
+
+
+class WorkerEventLoop:
+    def __init__(self):
+        """
+        An asyncio event loop, run in its own thread, which `async def`
+        methods of a service are run on. Each call is still received
+        by the thread for the client which sent it, which waits for the
+        method's coroutine to finish before sending the response, but
+        the coroutines run concurrently on the loop. This allows a
+        worker to have many calls waiting on I/O (e.g. databases or
+        other services) at once, and to share async resources such as
+        connection pools between them.
+
+        Coroutines shouldn't block (e.g. with time.sleep() or
+        synchronous I/O), as that holds up all the others.
+        """
+        self.pid = os.getpid()
+        self.loop = asyncio.new_event_loop()
+        start_new_thread(self.__run, ())
+
+    def __run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """
+        Start running a coroutine on the loop
+
+        :return: a concurrent.futures.Future for its result
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        """
+        Run a coroutine on the loop, blocking until it's finished
+
+        :return: the coroutine's result
+        :raise: any exception the coroutine raised
+        """
+        return self.submit(coro).result()
+
+
+_event_loop = [None]
+_event_loop_lock = allocate_lock()
+
+
+def get_worker_event_loop():
+    """
+    Get the WorkerEventLoop for this process, starting it the first
+    time an async method is called, so that services without them
+    don't have an extra thread. Processes forked after it's started
+    (which don't have its thread) get their own.
+    """
+    with _event_loop_lock:
+        if _event_loop[0] is None or _event_loop[0].pid != os.getpid():
+            _event_loop[0] = WorkerEventLoop()
+        return _event_loop[0]
@@ -0,0 +1,87 @@
+from speedysvc.serialisation.RawSerialisation import RawSerialisation
+from speedysvc.client_server.shared_memory.SHMBase import SHMBase
+
+
+# Several calls are sent to the server as a single call to this
+# reserved method name, so that they only need one lock handoff
+# (or one network frame). Every transport forwards it as-is.
+BATCH_CMD = '__batch__'
+
+# Use the same encoding as a single SHM request/response for each call
+_request_packer = SHMBase.request_serialiser
+_response_packer = SHMBase.response_serialiser
+
+
+def batch_fn(encoded_calls):
+    """
+    Stands in for an RPC method when sending a batch, as the
+    clients only need the name and serialiser of methods
+    """
+    raise NotImplementedError()
+
+batch_fn.__name__ = BATCH_CMD
+batch_fn.serialiser = RawSerialisation
+
+
+def encode_batch_requests(LCalls):
+    """
+    :param LCalls: a list of [(cmd as bytes, encoded arguments), ...]
+    :return: the arguments to send to BATCH_CMD
+    """
+    LOut = []
+    for cmd, args in LCalls:
+        LOut.append(_request_packer.pack(len(cmd), len(args)))
+        LOut.append(cmd)
+        LOut.append(args)
+    return b''.join(LOut)
+
+
+def decode_batch_requests(data):
+    """
+    :param data: the arguments BATCH_CMD was called with
+    :return: a list of [(cmd as str, encoded arguments as bytes), ...]
+    """
+    view = memoryview(data)
+    LCalls = []
+    offset = 0
+
+    while offset < len(view):
+        cmd_len, args_len = _request_packer.unpack_from(view, offset)
+        offset += _request_packer.size
+        cmd = bytes(view[offset:offset+cmd_len]).decode('ascii')
+        offset += cmd_len
+        LCalls.append((cmd, bytes(view[offset:offset+args_len])))
+        offset += args_len
+    return LCalls
+
+
+def encode_batch_responses(LResponses):
+    """
+    :param LResponses: a list of [(status, encoded result), ...]
+                       where status is b'+' for success, or
+                       b'-' if an exception occurred
+    :return: the result of BATCH_CMD
+    """
+    LOut = []
+    for status, result in LResponses:
+        LOut.append(_response_packer.pack(status, len(result)))
+        LOut.append(result)
+    return b''.join(LOut)
+
+
+def decode_batch_responses(data):
+    """
+    :param data: the result of BATCH_CMD
+    :return: a list of [(status, encoded result as bytes), ...]
+             in the same order as the calls were sent
+    """
+    view = memoryview(data)
+    LResponses = []
+    offset = 0
+
+    while offset < len(view):
+        status, result_len = _response_packer.unpack_from(view, offset)
+        offset += _response_packer.size
+        LResponses.append((status, bytes(view[offset:offset+result_len])))
+        offset += result_len
+    return LResponses
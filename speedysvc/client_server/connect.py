@@ -4,27 +4,177 @@ from speedysvc.hybrid_lock import NoSuchSemaphoreException, SemaphoreDestroyedEx
 from speedysvc.compression.compression_types import snappy_compression
 from speedysvc.client_server.shared_memory.SHMClient import SHMClient
 from speedysvc.client_server.network.NetworkClient import NetworkClient
+from speedysvc.client_server.network.GatewayClient import GatewayClient
+from speedysvc.client_server.network.UDPClient import UDPClient
+from speedysvc.client_server.network.consts import DEFAULT_GATEWAY_PORT
+from speedysvc.client_server.network.PooledNetworkClient import \
+    PooledNetworkClient, LEAST_OUTSTANDING
+from speedysvc.client_server.wrappers.BatchingClient import BatchingClient
+from speedysvc.client_server.wrappers.HedgingClient import HedgingClient
+from speedysvc.client_server.wrappers.FailoverClient import FailoverClient
+
+
+def _parse_tcp_address(address, port):
+    """
+    Get the (host, port) from a "tcp://address:port" address,
+    with `port` used if the ":port" part isn't provided
+    """
+    ip = address.partition('//')[-1]
+    if ':' in ip:
+        # Assume a service is on a different port if there's a colon.
+        # This code should hopefully be forwards-compatible with ipv6
+        # format, but don't have a ipv6-enabled network to test on
+        # currently
+        ip, _, port = ip.rpartition(':')
+        ip = ip.strip('[]')
+        port = int(port)
+    return ip, port
 
 
 def connect(server_methods, address='shm://',
-            compression_inst=snappy_compression):
+            compression_inst=snappy_compression,
+            connections_per_address=None,
+            load_balancing=LEAST_OUTSTANDING,
+            batch_window_secs=None,
+            max_batch_size=32,
+            hedge_percentile=None,
+            hedge_budget=0.05,
+            failover=False,
+            failover_call_timeout_secs=None):
     """
     Connect to either a shared memory or tcp server.
 
     :param server_methods: a class (doesn't have to be instantiated)
                            derived from ServerMethodsBase.
     :param address: either a single or multiple addresses.
-                    addresses can be either "shm://" or "tcp://address:port",
-                    with the ":port" optional, and dervied from server_methods
+                    addresses can be either "shm://", "tcp://address:port",
+                    with the ":port" optional, and dervied from server_methods,
+                    or "unix:///path/to/socket" for a Unix domain socket,
+                    or "gateway://address:port" to call the service through
+                    the gateway of a host, with the ":port" optional,
+                    or "udp://address:port" to send calls to methods
+                    decorated with @oneway without waiting for a response.
                     Keeps trying each address/protocol in sequence.
                     Only raises an exception if the last one fails.
                     Otherwise just prints the traceback to stderr.
     :param compression_inst: an instance of one of NullCompression,
                              SnappyCompression or ZLibCompression.
                              SHMClient doesn't use compression, it's
-                             only relevant for NetworkClient (tcp).
-    :return: either an SHMClient or NetworkClient
+                             only relevant for NetworkClient (tcp/unix).
+                             NullCompression is usually faster over
+                             Unix domain sockets.
+    :param connections_per_address: if provided, rather than using only the
+                                    first address which can be connected to,
+                                    keep this many connections open to every
+                                    "tcp://" address, and spread calls between
+                                    them using a PooledNetworkClient.
+    :param load_balancing: how a PooledNetworkClient chooses which host to
+                           send each call to: either LEAST_OUTSTANDING or
+                           EWMA_LATENCY. Only used if connections_per_address
+                           is provided.
+    :param batch_window_secs: if provided, wrap the client in a
+                              BatchingClient, so that calls made from
+                              different threads within this many seconds
+                              of each other (e.g. 0.0002) are sent to the
+                              server together as a single call. For
+                              udp:// addresses, calls within this many
+                              seconds are sent in the same datagram.
+    :param max_batch_size: the maximum number of calls to send together.
+                           Only used if batch_window_secs is provided.
+    :param hedge_percentile: if provided, connect to every address rather
+                             than only the first, and use a HedgingClient.
+                             Calls are sent to the first address, but if
+                             they take longer than this percentile (e.g.
+                             0.95) of recent calls, they're also sent to the
+                             next address, using whichever responds first.
+                             Only use this if all methods are safe to call
+                             twice.
+    :param hedge_budget: the maximum fraction of extra calls hedging
+                         can make. Only used if hedge_percentile is
+                         provided.
+    :param failover: if True, connect to every address rather than only
+                     the first, and use a FailoverClient. Heartbeats are
+                     sent to every address, with calls sent to the one
+                     which responds fastest. If it fails, calls are sent
+                     to the next fastest straight away, switching back
+                     once it recovers.
+    :param failover_call_timeout_secs: if provided, calls which take longer
+                                       than this many seconds are also sent
+                                       to the next fastest address. Only use
+                                       this if all methods are safe to call
+                                       twice. Only used if failover is True.
+    :return: either an SHMClient, NetworkClient, GatewayClient, UDPClient,
+             PooledNetworkClient, BatchingClient, HedgingClient
+             or FailoverClient
     """
+    if failover:
+        assert connections_per_address is None and hedge_percentile is None, \
+            "failover can't be combined with pooling or hedging"
+        client = FailoverClient(
+            server_methods,
+            address if isinstance(address, (list, tuple)) else (address,),
+            lambda address: _connect_client(
+                server_methods, address, compression_inst,
+                None, LEAST_OUTSTANDING,
+                # Failures need to be raised, so
+                # calls can be sent to other addresses
+                reconnect=False
+            ),
+            call_timeout_secs=failover_call_timeout_secs
+        )
+    elif hedge_percentile is not None:
+        assert connections_per_address is None, \
+            "Calls can't be hedged between pooled connections"
+        client = _connect_hedging_client(
+            server_methods, address, compression_inst,
+            hedge_percentile, hedge_budget
+        )
+    else:
+        client = _connect_client(
+            server_methods, address, compression_inst,
+            connections_per_address, load_balancing,
+            batch_window_secs
+        )
+    if batch_window_secs is not None and not isinstance(client, UDPClient):
+        client = BatchingClient(
+            client,
+            batch_window_secs=batch_window_secs,
+            max_batch_size=max_batch_size
+        )
+    return client
+
+
+def _connect_hedging_client(server_methods, address, compression_inst,
+                            hedge_percentile, hedge_budget):
+    if not isinstance(address, (list, tuple)):
+        addresses = (address,)
+    else:
+        addresses = address
+
+    LClients = []
+    for x, address in enumerate(addresses):
+        try:
+            LClients.append(_connect_client(
+                server_methods, address, compression_inst,
+                None, LEAST_OUTSTANDING
+            ))
+        except Exception:
+            # Hedging is still useful with the addresses which
+            # can be connected to, so long as there are any
+            if x == len(addresses)-1 and not LClients:
+                raise
+            traceback.print_exc()
+
+    return HedgingClient(
+        LClients,
+        percentile=hedge_percentile,
+        budget=hedge_budget
+    )
+
+
+def _connect_client(server_methods, address, compression_inst,
+                    connections_per_address, load_balancing,
+                    batch_window_secs=None, reconnect=True):
     port = server_methods.port
     name = server_methods.name
 
@@ -33,14 +183,28 @@ def connect(server_methods, address='shm://',
     else:
         addresses = address
 
+    if connections_per_address is not None:
+        for address in addresses:
+            if not address.startswith('tcp://'):
+                raise Exception(
+                    f"Only tcp:// addresses can be pooled: {address}"
+                )
+
+        return PooledNetworkClient(
+            server_methods,
+            [_parse_tcp_address(address, port) for address in addresses],
+            connections_per_address=connections_per_address,
+            load_balancing=load_balancing,
+            compression_inst=compression_inst
+        )
+
     for x, address in enumerate(addresses):
         last_address = x == len(addresses)-1
 
         try:
-            # Currently, only local shared memory and tcp is supported, but I'm using a
-            # protocol scheme to allow for later adding other protocols. udp and
-            # ssh-tunnelled tcp are protocols I'd like to add, because of latency and
-            # security respectively.
+            # I'm using a protocol scheme to allow for later adding other
+            # protocols. ssh-tunnelled tcp is a protocol I'd like to add,
+            # for security.
 
             if address.startswith('shm://'):
                 # TODO: Allow for prefixes to SHM so that
@@ -48,19 +212,31 @@ def connect(server_methods, address='shm://',
                 return SHMClient(server_methods)
 
             elif address.startswith('tcp://'):
-                ip = address.partition('//')[-1]
-                if ':' in ip:
-                    # Assume a service is on a different port if there's a colon.
-                    # This code should hopefully be forwards-compatible with ipv6
-                    # format, but don't have a ipv6-enabled network to test on
-                    # currently
-                    ip, _, port = ip.rpartition(':')
-                    ip = ip.strip('[]')
-                    port = int(port)
-
+                ip, port = _parse_tcp_address(address, server_methods.port)
                 return NetworkClient(server_methods,
                                      host=ip, port=port,
-                                     compression_inst=compression_inst)
+                                     compression_inst=compression_inst,
+                                     reconnect=reconnect)
+
+            elif address.startswith('gateway://'):
+                ip, port = _parse_tcp_address(address, DEFAULT_GATEWAY_PORT)
+                return GatewayClient(server_methods,
+                                     host=ip, port=port,
+                                     compression_inst=compression_inst,
+                                     reconnect=reconnect)
+
+            elif address.startswith('udp://'):
+                ip, port = _parse_tcp_address(address, server_methods.port)
+                return UDPClient(server_methods,
+                                 host=ip, port=port,
+                                 batch_window_secs=batch_window_secs)
+
+            elif address.startswith('unix://'):
+                # e.g. unix:///tmp/my_service.sock -> /tmp/my_service.sock
+                return NetworkClient(server_methods,
+                                     unix_socket_path=address[len('unix://'):],
+                                     compression_inst=compression_inst,
+                                     reconnect=reconnect)
             else:
                 raise Exception("Unknown protocol scheme: %s" % address)
 
@@ -0,0 +1,96 @@
+from _thread import allocate_lock
+from speedysvc.toolkit.documentation.copydoc import copydoc
+
+from speedysvc.client_server.base_classes.ClientProviderBase import ClientProviderBase
+from speedysvc.client_server.network.NetworkClient import NetworkClient
+from speedysvc.client_server.network.GatewayServer import GatewayServerMethods
+from speedysvc.client_server.network.consts import DEFAULT_GATEWAY_PORT
+from speedysvc.client_server.shared_memory.CacheVersions import get_cache_versions
+from speedysvc.compression.compression_types import zlib_compression
+
+
+_DConnections = {}
+_lock = allocate_lock()
+
+
+def get_gateway_connection(host, port, compression_inst, reconnect=True):
+    """
+    Get the connection to the gateway at `host`:`port`, which
+    is shared between all GatewayClients in this process
+    """
+    key = (host, port, compression_inst.typecode, reconnect)
+    with _lock:
+        connection = _DConnections.get(key)
+        if connection is None or connection.closed:
+            connection = _DConnections[key] = NetworkClient(
+                GatewayServerMethods(port),
+                host=host, port=port,
+                compression_inst=compression_inst,
+                reconnect=reconnect
+            )
+        return connection
+
+
+class GatewayClient(ClientProviderBase):
+    def __init__(self,
+                 server_methods,
+                 host='127.0.0.1', port=DEFAULT_GATEWAY_PORT,
+                 compression_inst=zlib_compression,
+                 reconnect=True):
+        """
+        A client which calls a service through the GatewayServer of
+        the host it's on. All GatewayClients in a process connected
+        to the same gateway share a single connection, so calls to
+        many different services only need one socket.
+
+        :param server_methods:
+        :param host: the host of the gateway
+        :param port: the port of the gateway (not of the service)
+        :param compression_inst: an instance of one of NullCompression,
+                                 SnappyCompression or ZLibCompression.
+        :param reconnect: as with NetworkClient
+        """
+        ClientProviderBase.__init__(self, server_methods)
+        self.host = host
+        self.gateway_port = port
+        self.connection = get_gateway_connection(
+            host, port, compression_inst, reconnect
+        )
+        self.cmd_prefix = f'{server_methods.port}/'.encode('ascii')
+
+    def get_address(self):
+        """
+        :return: the address connected to, for error messages
+        """
+        return f"gateway://{self.host}:{self.gateway_port}"
+
+    def get_cache_versions(self):
+        if self.host in ('127.0.0.1', 'localhost', '::1'):
+            return get_cache_versions(self.port)
+        return None
+
+    def get_num_outstanding(self):
+        """
+        :return: the number of requests sent over the shared
+                 connection which haven't received a response yet
+        """
+        return self.connection.get_num_outstanding()
+
+    def close(self):
+        # The connection is shared with other clients, so is left open
+        pass
+
+    @copydoc(ClientProviderBase.send)
+    def send(self, fn, data):
+        return self.submit(fn, data).result()
+
+    def submit(self, fn, data):
+        """
+        Send the command `fn` to the service, without waiting for
+        the response.
+
+        :return: a concurrent.futures.Future, as with NetworkClient
+        """
+        return self.connection.submit(
+            fn, data, cmd=self.cmd_prefix + fn.__name__.encode('ascii')
+        )
@@ -0,0 +1,161 @@
+from threading import local
+from _thread import allocate_lock
+
+from speedysvc.client_server.network.NetworkServer import NetworkServer
+from speedysvc.client_server.network.consts import DEFAULT_GATEWAY_PORT
+from speedysvc.client_server.network.http_protocol import HTTPError
+from speedysvc.client_server.shared_memory.SHMClient import SHMClient
+from speedysvc.client_server.batch_encoding import BATCH_CMD, decode_batch_requests
+from speedysvc.client_server.ping import PING_CMD
+from speedysvc.serialisation.MarshalSerialisation import MarshalSerialisation
+from speedysvc.serialisation.PickleSerialisation import PickleSerialisation
+
+
+def debug(*s):
+    if False:
+        print(*s)
+
+
+class GatewayServerMethods:
+    name = 'gateway'
+
+    def __init__(self, port=DEFAULT_GATEWAY_PORT):
+        """
+        Stands in for the server methods of a gateway, as
+        NetworkServer/NetworkClient need its name and port
+        """
+        self.port = port
+
+
+class GatewayServer(NetworkServer):
+    def __init__(self,
+                 tcp_bind_address='127.0.0.1',
+                 port=DEFAULT_GATEWAY_PORT,
+                 **kw):
+        """
+        A NetworkServer which forwards requests to any of the services
+        added with `add_service`, rather than just a single service.
+        This allows clients to call many services over a single
+        connection on a single port (using GatewayClient), rather than
+        needing to connect to each service's own port.
+
+        The command of each request is prefixed by the port (or name)
+        of the service, e.g. b"5555/echo". HTTP clients can call
+        `POST /<service name or port>/<method>` in the same way.
+
+        :param tcp_bind_address: the address to listen on
+        :param port: the port to listen on
+        :param kw: passed on to NetworkServer
+        """
+        self.DServicesByPort = {}
+        self.DServicesByName = {}
+        self.SAllowInsecurePorts = set()
+        self.services_lock = allocate_lock()
+        self.__local = local()
+
+        NetworkServer.__init__(
+            self, GatewayServerMethods(port),
+            tcp_bind_address=tcp_bind_address,
+            # Each service is checked separately
+            force_insecure_serialisation=True,
+            call_directly=True,
+            **kw
+        )
+
+    def add_service(self, server_methods,
+                    allow_insecure_serialisation=False):
+        """
+        Allow clients of the gateway to call a service
+
+        :param server_methods: the server methods class of the service
+        :param allow_insecure_serialisation: allow calling methods which
+                                             use pickle/marshal serialisation
+        """
+        with self.services_lock:
+            self.DServicesByPort[server_methods.port] = server_methods
+            self.DServicesByName[server_methods.name] = server_methods
+            if allow_insecure_serialisation:
+                self.SAllowInsecurePorts.add(server_methods.port)
+            else:
+                self.SAllowInsecurePorts.discard(server_methods.port)
+
+    def remove_service(self, server_methods):
+        """
+        Stop clients of the gateway from calling a service
+        """
+        with self.services_lock:
+            self.DServicesByPort.pop(server_methods.port, None)
+            self.DServicesByName.pop(server_methods.name, None)
+            self.SAllowInsecurePorts.discard(server_methods.port)
+
+    #=========================================================#
+    #                    Route Requests                       #
+    #=========================================================#
+
+    def handle_fn(self, cmd, args):
+        service, _, method = cmd.partition(b'/')
+        service = service.decode('ascii')
+
+        server_methods = self.__get_server_methods(service)
+        if server_methods is None:
+            raise KeyError(f"Service {service} isn't served by this gateway")
+
+        if not server_methods.port in self.SAllowInsecurePorts:
+            if method.decode('ascii') == BATCH_CMD:
+                for batch_method, _ in decode_batch_requests(args):
+                    self.__check_security(server_methods, batch_method)
+            elif method.decode('ascii') != PING_CMD:
+                self.__check_security(server_methods, method.decode('ascii'))
+
+        return self.__get_shm_client(server_methods).send(method, args)
+
+    def route_http_request(self, http_request):
+        if http_request.method != 'POST':
+            raise HTTPError(405)
+
+        LPath = http_request.path.strip('/').split('/')
+        if len(LPath) != 2:
+            raise HTTPError(404)
+        service, method = LPath
+
+        server_methods = self.__get_server_methods(service)
+        if server_methods is None:
+            raise HTTPError(404, f"Service {service} isn't served by this gateway")
+
+        fn = getattr(server_methods, method, None)
+        self.check_http_fn(http_request, fn)
+        return f'{server_methods.port}/{method}'.encode('ascii'), fn
+
+    def __get_server_methods(self, service):
+        """
+        :param service: the port (as a string) or name of a service
+        :return: the server methods class, or None if not found
+        """
+        if service.isdigit():
+            return self.DServicesByPort.get(int(service))
+        return self.DServicesByName.get(service)
+
+    def __check_security(self, server_methods, method):
+        fn = getattr(server_methods, method)
+        if fn.serialiser in (PickleSerialisation, MarshalSerialisation):
+            raise PermissionError(
+                f"Pickle/marshal serialisation of {server_methods.name}.{method} "
+                f"disallowed via the gateway for security reasons"
+            )
+
+    def __get_shm_client(self, server_methods):
+        """
+        Each request thread keeps its own SHMClient to each service,
+        so that calls to different services don't wait for each other
+        """
+        DSHMClients = getattr(self.__local, 'DSHMClients', None)
+        if DSHMClients is None:
+            DSHMClients = self.__local.DSHMClients = {}
+
+        shm_client = DSHMClients.get(server_methods.port)
+        if shm_client is None or shm_client.server_methods is not server_methods:
+            debug(f"Gateway: connecting to {server_methods.name}:{server_methods.port}")
+            # Spinlocks are counterproductive, as with NetworkServer
+            shm_client = DSHMClients[server_methods.port] = \
+                SHMClient(server_methods, use_spinlock=False)
+        return shm_client
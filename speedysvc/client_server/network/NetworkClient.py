@@ -1,106 +1,296 @@
 import time
 import warnings
 import socket
-from _thread import allocate_lock
+from _thread import allocate_lock, start_new_thread
+from concurrent.futures import Future
 from os import getpid
 from speedysvc.toolkit.documentation.copydoc import copydoc
 
 from speedysvc.client_server.base_classes.ClientProviderBase import ClientProviderBase
 from speedysvc.client_server.network.consts import len_packer, response_packer
+from speedysvc.client_server.network.framing import RecvBuffer, send_buffers
+from speedysvc.client_server.shared_memory.CacheVersions import get_cache_versions
 from speedysvc.compression.compression_types import zlib_compression
 
 
+class ConnectionLostError(ConnectionError):
+    """
+    Raised for calls which were sent (or attempted) on a
+    connection which was lost, if reconnecting is disabled.
+    This is never raised by the server itself, so it can be
+    told apart from exceptions raised by RPC methods.
+    """
+    pass
+
+
 class NetworkClient(ClientProviderBase):
     def __init__(self,
                  server_methods,
                  host='127.0.0.1', port=None,
-                 compression_inst=zlib_compression):
+                 compression_inst=zlib_compression,
+                 reconnect=True,
+                 unix_socket_path=None):
         """
+        A client which connects to a NetworkServer over TCP,
+        or over a Unix domain socket if `unix_socket_path`
+        is provided (in which case `host`/`port` are ignored).
+
+        Each request is sent with a request ID, so many threads
+        (or coroutines, using `submit`) can have calls outstanding
+        on the same connection at once. The server can respond to
+        them in any order.
 
         :param server_methods:
         :param host:
+        :param reconnect: whether to keep trying to reconnect (and resend
+                          requests) if the connection is lost. If False,
+                          outstanding and later calls raise a
+                          ConnectionLostError instead, which is useful
+                          when there are other servers to fall back to.
+                          Requests which hadn't got a response are
+                          resent, even if the server had already run
+                          them, so only leave this on if the methods
+                          called are safe to run twice.
+        :param unix_socket_path: the path of the socket created by a
+                                 NetworkServer with the same parameter
         """
         self.host = host
-        self.port = port
-        self.lock = allocate_lock()
-        ClientProviderBase.__init__(self, server_methods)
+        self.unix_socket_path = unix_socket_path
+        self.reconnect = reconnect
+        # (Note this sets self.port to the port of
+        #  server_methods if one isn't provided)
+        ClientProviderBase.__init__(self, server_methods, port)
         self.compression_inst = compression_inst
+
+        # Only one thread can write to the socket at a time, but
+        # responses are read by a separate thread, so other threads
+        # don't need to wait for a previous call to complete
+        self.send_lock = allocate_lock()
+        self.DPending = {}
+        self.last_request_id = 0
+        self.connected = False
+        self.closed = False
+
         self.__connect()
+        start_new_thread(self.__recv_loop, ())
 
     def __connect(self):
-        self.conn_to_server = conn_to_server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        conn_to_server.setsockopt(socket.SOL_TCP, socket.TCP_NODELAY, 1)
+        if self.unix_socket_path:
+            self.conn_to_server = conn_to_server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.conn_to_server = conn_to_server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            conn_to_server.setsockopt(socket.SOL_TCP, socket.TCP_NODELAY, 1)
+            conn_to_server.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
         conn_to_server.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
         conn_to_server.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
-        conn_to_server.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
 
-        port = (
-            self.port
-            if self.port is not None
-            else self.server_methods.port
-        )
-        conn_to_server.connect((self.host, port))
-        conn_to_server.send(
+        if self.unix_socket_path:
+            conn_to_server.connect(self.unix_socket_path)
+        else:
+            conn_to_server.connect((self.host, self.port))
+        conn_to_server.sendall(
             self.compression_inst.typecode
         )
+        self.connected = True
 
     def __del__(self):
-        self.conn_to_server.close()
+        self.close()
+
+    def close(self):
+        """
+        Close the connection, and stop the thread
+        which receives responses from the server.
+        Later calls raise ConnectionLostError.
+        """
+        self.closed = True
+        self.connected = False
+        try:
+            # Wake up the receive thread (closing the socket
+            # alone doesn't), so that it exits
+            self.conn_to_server.shutdown(socket.SHUT_RDWR)
+        except (AttributeError, socket.error):
+            pass
+        try:
+            self.conn_to_server.close()
+        except AttributeError:
+            pass
+
+        # Fail any calls which are still waiting. (The receive thread
+        # pops requests from DPending, so they're swapped out first, so
+        # that only one thread sets the result of each)
+        DPending, self.DPending = getattr(self, 'DPending', {}), {}
+        for future, fn, _ in DPending.values():
+            if future.set_running_or_notify_cancel():
+                future.set_exception(ConnectionLostError(
+                    f"Connection to {self.get_address()} was closed"
+                ))
+
+    def get_address(self):
+        """
+        :return: the address connected to, for error messages
+        """
+        if self.unix_socket_path:
+            return f"unix://{self.unix_socket_path}"
+        return f"{self.host}:{self.port}"
+
+    def get_cache_versions(self):
+        if self.unix_socket_path or self.host in ('127.0.0.1', 'localhost', '::1'):
+            # The service is on this host, so
+            # its shared memory can be read
+            return get_cache_versions(self.server_methods.port)
+        return None
+
+    def get_num_outstanding(self):
+        """
+        :return: the number of requests sent which
+                 haven't received a response yet
+        """
+        return len(self.DPending)
 
     @copydoc(ClientProviderBase.send)
     def send(self, fn, data):
-        with self.lock:
-            return self._send(fn, data)
+        return self.submit(fn, data).result()
+
+    def submit(self, fn, data, cmd=None):
+        """
+        Send the command `fn` to the RPC server, without
+        waiting for the response.
 
-    def _send(self, fn, data):
+        :param cmd: the command to send, if not the name of `fn`
+                    (GatewayClient prefixes it with the service)
+
+        :return: a concurrent.futures.Future, which will be set to the
+                 decoded return value (or exception) of the call. Use
+                 `asyncio.wrap_future` to await it from a coroutine.
+        """
         actually_compressed, data = \
             self.compression_inst.compress(fn.serialiser.dumps(data))
-        cmd = fn.__name__.encode('ascii')
-        prefix = len_packer.pack(int(actually_compressed), len(data), len(cmd))
+        if cmd is None:
+            cmd = fn.__name__.encode('ascii')
+        future = Future()
+
+        with self.send_lock:
+            self.last_request_id = request_id = \
+                (self.last_request_id + 1) % 0xFFFFFFFF
+            prefix = len_packer.pack(
+                request_id, int(actually_compressed), len(data), len(cmd)
+            )
+            # Sent using scatter-gather IO, so that large
+            # payloads don't need to be copied to be sent
+            LBuffers = [prefix, cmd, data]
+            self.DPending[request_id] = (future, fn, LBuffers)
+
+            if self.closed:
+                # (Checked after adding it to DPending, so
+                #  if close() is called in the meantime, it
+                #  either fails the call, or it's failed here)
+                self.DPending.pop(request_id, None)
+                raise ConnectionLostError(
+                    f"Connection to {self.get_address()} was closed"
+                )
+            elif not self.connected and not self.reconnect:
+                del self.DPending[request_id]
+                raise ConnectionLostError(
+                    f"Connection to {self.get_address()} was lost"
+                )
+            elif self.connected:
+                try:
+                    send_buffers(self.conn_to_server, LBuffers)
+                except socket.error:
+                    # The receive thread will reconnect, and
+                    # resend any requests which are still pending
+                    self.__connection_lost()
+        return future
+
+    def __connection_lost(self):
+        self.connected = False
+        try:
+            # Make sure the receive thread wakes up
+            self.conn_to_server.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
 
+    #=========================================================#
+    #                   Receive Responses                     #
+    #=========================================================#
+
+    def __recv_loop(self):
         displayed_reconnect_msg = False
-        while True:
+
+        while not self.closed:
             # Try to keep reconnecting if
             # connection no longer functioning
             try:
-                self.conn_to_server.send(prefix + cmd + data)
-
-                def recv(amount):
-                    # Note string concatenation is slower in earlier versions
-                    # of python, but should be faster than list concat in later
-                    # versions after 3.
-                    r = b''
-                    while len(r) != amount:
-                        add_me = self.conn_to_server.recv(amount)
-                        if not add_me:
-                            raise ConnectionResetError()
-                        r += add_me
-                    return r
-
-                actually_compressed, data_len, status = \
-                    response_packer.unpack(recv(response_packer.size))
-                data = recv(data_len)
-                break
-
+                self.__recv_responses()
             except (socket.error, ConnectionResetError):
-                if not displayed_reconnect_msg:
-                    displayed_reconnect_msg = True
-                    warnings.warn(
-                        f"Client [pid {getpid()}]: "
-                        f"TCP connection to service "
-                        f"{self.server_methods.name} reset - "
-                        f"the service may need to be checked/restarted!"
-                    )
-
-                while True:
-                    try:
-                        import time
-                        time.sleep(1)
+                pass
+
+            if self.closed:
+                return
+            with self.send_lock:
+                self.__connection_lost()
+
+                if not self.reconnect:
+                    # Fail any calls which are waiting, and give up
+                    self.closed = True
+                    for future, fn, _ in self.DPending.values():
+                        if future.set_running_or_notify_cancel():
+                            future.set_exception(ConnectionLostError(
+                                f"Connection to {self.get_address()} was lost"
+                            ))
+                    self.DPending = {}
+                    self.conn_to_server.close()
+                    return
+
+            if not displayed_reconnect_msg:
+                displayed_reconnect_msg = True
+                warnings.warn(
+                    f"Client [pid {getpid()}]: "
+                    f"Connection to service "
+                    f"{self.server_methods.name} reset - "
+                    f"the service may need to be checked/restarted!"
+                )
+
+            while not self.closed:
+                try:
+                    time.sleep(1)
+                    with self.send_lock:
                         self.__connect()
-                    except (ConnectionRefusedError, ConnectionError):
-                        continue
-                    break
 
+                        # Resend requests which didn't get
+                        # a response before the connection reset
+                        for request_id in sorted(self.DPending):
+                            send_buffers(self.conn_to_server, self.DPending[request_id][2])
+                except (ConnectionRefusedError, ConnectionError, socket.error):
+                    self.connected = False
+                    continue
+                break
+
+    def __recv_responses(self):
+        conn_to_server = self.conn_to_server
+        recv_buffer = RecvBuffer()
+
+        while not self.closed:
+            request_id, actually_compressed, data_len, status = \
+                recv_buffer.read_header(conn_to_server, response_packer)
+            data = recv_buffer.read_exactly(conn_to_server, data_len)
+
+            # The request may no longer be waiting, if it was cancelled
+            pending = self.DPending.pop(request_id, None)
+            if pending is None:
+                continue
+            future, fn, _ = pending
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                future.set_result(
+                    self.__decode_response(fn, actually_compressed, status, data)
+                )
+            except Exception as exc:
+                future.set_exception(exc)
+
+    def __decode_response(self, fn, actually_compressed, status, data):
         if actually_compressed:
             data = self.compression_inst.decompress(data)
 
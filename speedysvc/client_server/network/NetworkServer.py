@@ -1,40 +1,215 @@
+import os
 import time
 import socket
-from _thread import start_new_thread
+import selectors
+from queue import Queue
+from collections import deque
+from _thread import start_new_thread, allocate_lock
 
 from speedysvc.client_server.shared_memory.SHMClient import SHMClient
 from speedysvc.client_server.base_classes.ServerProviderBase import ServerProviderBase
+from speedysvc.client_server.admission import ServiceBusyError
+from speedysvc.client_server.ping import PING_CMD
 from speedysvc.client_server.network.consts import len_packer, response_packer
+from speedysvc.client_server.network.framing import \
+    RecvBuffer, send_buffers_nonblocking, LARGE_FRAME_SIZE
+from speedysvc.client_server.network.http_protocol import \
+    HTTP_FIRST_BYTES, MAX_HEAD_SIZE, MAX_BODY_SIZE, CONTINUE_RESPONSE, HTTPError, \
+    HTTPRequest, HTTPConnectionState, encode_response, encode_error
 from speedysvc.compression.NullCompression import NullCompression
 from speedysvc.serialisation.MarshalSerialisation import MarshalSerialisation
 from speedysvc.serialisation.PickleSerialisation import PickleSerialisation
 from speedysvc.compression import compression_types
 
 
+def debug(*s):
+    if False:
+        print(*s)
+
+
+class _Connection:
+    def __init__(self, conn, address):
+        """
+        The state of a single client socket, as seen by
+        the event loop. Incoming bytes are read into a
+        reusable buffer with recv_into, and outgoing
+        responses are queued until the socket is writable.
+        """
+        self.conn = conn
+        self.address = address
+        self.compression_inst = None
+
+        self.recv_buffer = RecvBuffer()
+        # [request_id, actually_compressed, cmd_len, body, view, filled]
+        # for a frame too large for recv_buffer, which is being
+        # received directly into its own bytearray
+        self.large_frame = None
+        # An HTTPConnectionState, if the client
+        # sent an HTTP request rather than a typecode
+        self.http = None
+
+        self.LSend = deque()
+        self.send_bytes = 0
+        self.send_lock = allocate_lock()
+
+        self.in_flight = 0
+        self.reading = True
+        self.registered = True
+        self.closed = False
+
+
 class NetworkServer(ServerProviderBase):
     def __init__(self,
                  server_methods,
                  tcp_bind_address='127.0.0.1',
-                 force_insecure_serialisation=False):
+                 force_insecure_serialisation=False,
+                 shm_pool_size=4,
+                 max_pipelined_requests=16,
+                 max_buffered_bytes=4*1024*1024,
+                 max_http_body_size=MAX_BODY_SIZE,
+                 unix_socket_path=None,
+                 reuse_port=False,
+                 call_directly=False,
+                 max_concurrency=None,
+                 max_queued=None,
+                 num_workers=1):
         """
         Create a network TCP/IP server which can be used in
         combination with a ServerMethods subclass, and one
         of MultiProcessManager/InProcessManager
+
+        All sockets are served from a single event loop thread.
+        Requests are forwarded to the worker processes through
+        a small pool of SHMClients, rather than creating a new
+        thread and SHM connection for every TCP connection.
+
+        Clients in other languages can also connect with HTTP/1.1,
+        and call methods with `POST /<service name or port>/<method>`
+        (see http_protocol).
+
+        :param shm_pool_size: the number of SHM connections (and
+                              threads) used for forwarding requests
+                              to the worker processes (or, if
+                              call_directly is set, the number of
+                              threads which call the methods)
+        :param max_pipelined_requests: the maximum number of requests
+                                       from a single client which can be
+                                       processed at once. Responses are
+                                       sent back as soon as they're done,
+                                       tagged with the request ID, so may
+                                       be out of order.
+        :param max_buffered_bytes: stop reading from a client if
+                                   more than this many response bytes
+                                   are waiting to be sent to it
+        :param max_http_body_size: HTTP requests with a larger
+                                   Content-Length are rejected with
+                                   413 before their body is received,
+                                   and the connection is closed
+        :param unix_socket_path: if provided, listen on a Unix domain
+                                 socket at this path instead of TCP. This
+                                 uses the same protocol, but avoids the
+                                 overhead of the TCP stack for clients on
+                                 the same host which can't use shared
+                                 memory (e.g. in containers which don't
+                                 share /dev/shm with the service).
+        :param reuse_port: bind the port with SO_REUSEPORT, so that
+                           several processes (e.g. each worker process)
+                           can listen on it at once, with the kernel
+                           balancing connections between them
+        :param call_directly: call the methods of `server_methods` in
+                              this process, rather than forwarding
+                              requests to the worker processes. This
+                              should only be used from inside a worker
+                              process, with `server_methods` being the
+                              instance which the worker serves.
+        :param max_concurrency: the maximum number of requests to
+                                forward to the workers (or call) at
+                                once, or None for no limit
+        :param max_queued: the maximum number of requests which can be
+                           waiting to be forwarded, on top of that.
+                           Requests over the limits (or the limits of
+                           methods with @concurrency_limit) are rejected
+                           with ServiceBusyError as soon as they're
+                           received, without being queued.
+        :param num_workers: the number of worker processes requests are
+                            forwarded to. max_concurrency, max_queued and
+                            the limits of methods are per worker, so are
+                            multiplied by this.
         """
         if not force_insecure_serialisation:
             self.__check_security()
 
-        sock = self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.setsockopt(socket.SOL_TCP, socket.TCP_NODELAY, 1)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.unix_socket_path = unix_socket_path
+        if unix_socket_path:
+            if os.path.exists(unix_socket_path):
+                # Remove the socket left behind
+                # by a previous copy of the service
+                os.unlink(unix_socket_path)
+            sock = self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.bind(unix_socket_path)
+        else:
+            sock = self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            if reuse_port:
+                assert hasattr(socket, 'SO_REUSEPORT'), \
+                    "SO_REUSEPORT isn't supported on this platform"
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind((tcp_bind_address, server_methods.port))
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
-        sock.bind((tcp_bind_address, server_methods.port))
-        sock.listen(0)
+        sock.listen(128)
+        sock.setblocking(False)
+
+        ServerProviderBase.__init__(
+            self, server_methods, max_concurrency, max_queued, num_workers
+        )
+        self.shm_pool_size = shm_pool_size
+        self.max_pipelined_requests = max_pipelined_requests
+        self.max_buffered_bytes = max_buffered_bytes
+        self.max_http_body_size = max_http_body_size
+        self.call_directly = call_directly
+        self.shut_me_down = False
+        self.listening = True
+
+        # Worker threads let the event loop know there are
+        # responses to send by writing to this socket pair
+        self.__wakeup_recv, self.__wakeup_send = socket.socketpair()
+        self.__wakeup_recv.setblocking(False)
+        self.__wakeup_send.setblocking(False)
+        self.__SPendingConns = set()
+        self.__pending_lock = allocate_lock()
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(sock, selectors.EVENT_READ, None)
+        self.selector.register(self.__wakeup_recv, selectors.EVENT_READ, None)
+
+        self.request_queue = Queue()
+        for x in range(shm_pool_size):
+            start_new_thread(self.__request_loop, ())
+        start_new_thread(self.__event_loop, ())
+
+    def shutdown(self, timeout=30):
+        """
+        Stop accepting connections and reading new requests, then
+        wait for the requests which were already received to finish.
+        Clients will reconnect (and resend any requests which didn't
+        get a response) once this process exits, to another process
+        if the port is shared using reuse_port.
+
+        :param timeout: the maximum number of seconds to wait
+        """
+        self.shut_me_down = True
+        try:
+            self.__wakeup_send.send(b'\0')
+        except BlockingIOError:
+            pass
 
-        ServerProviderBase.__init__(self, server_methods)
-        start_new_thread(self.__listen_for_conns_loop, ())
+        t_from = time.time()
+        while self.request_queue.unfinished_tasks and \
+                time.time() - t_from < timeout:
+            time.sleep(0.05)
 
     def __check_security(self):
         for name in dir(self):
@@ -50,91 +225,633 @@ class NetworkServer(ServerProviderBase):
                         "depending on your use case."
                     )
 
-    def __listen_for_conns_loop(self):
-        server = self.sock
-        #print("Multithreaded server: waiting for connections...")
+    #=========================================================#
+    #                       Event Loop                        #
+    #=========================================================#
 
+    def __event_loop(self):
         while True:
-            server.listen(4)
-            conn, (ip, port) = server.accept()
+            for key, events in self.selector.select():
+                try:
+                    if key.fileobj is self.sock:
+                        self.__accept()
+                    elif key.fileobj is self.__wakeup_recv:
+                        self.__handle_wakeup()
+                    else:
+                        connection = key.data
+                        if events & selectors.EVENT_WRITE:
+                            self.__write(connection)
+                        if events & selectors.EVENT_READ and not connection.closed:
+                            self.__read(connection)
+                except:
+                    import traceback
+                    traceback.print_exc()
+
+    def __accept(self):
+        try:
+            conn, address = self.sock.accept()
+        except BlockingIOError:
+            return
+
+        if not self.unix_socket_path:
+            # If this setting isn't set, then there's a high
+            # probability of there being much higher latency
+            conn.setsockopt(socket.SOL_TCP, socket.TCP_NODELAY, 1)
+            conn.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
+        conn.setblocking(False)
+
+        connection = _Connection(conn, address)
+        self.selector.register(conn, selectors.EVENT_READ, connection)
+
+    def __handle_wakeup(self):
+        try:
+            while self.__wakeup_recv.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+        with self.__pending_lock:
+            SPendingConns = self.__SPendingConns
+            self.__SPendingConns = set()
+
+        for connection in SPendingConns:
+            if not connection.closed:
+                self.__write(connection)
+
+        if self.shut_me_down and self.listening:
+            self.__stop_listening()
+
+    def __stop_listening(self):
+        self.listening = False
+        self.selector.unregister(self.sock)
+        self.sock.close()
+
+        for key in list(self.selector.get_map().values()):
+            if isinstance(key.data, _Connection):
+                # Stop reading from the connection
+                self.__update_events(key.data)
+
+    def __close(self, connection):
+        if connection.closed:
+            return
+        connection.closed = True
+        if connection.registered:
+            self.selector.unregister(connection.conn)
+            connection.registered = False
+        connection.conn.close()
+
+    def __update_events(self, connection):
+        """
+        Apply backpressure: only read more requests from a client
+        if it doesn't already have too many requests in progress,
+        and isn't too far behind reading the responses sent to it.
+        """
+        if connection.closed:
+            return
+
+        connection.reading = (
+            not self.shut_me_down and
+            connection.in_flight < self.max_pipelined_requests and
+            connection.send_bytes < self.max_buffered_bytes and
+            not (connection.http and connection.http.closing)
+        )
+        events = 0
+        if connection.reading:
+            events |= selectors.EVENT_READ
+        if connection.LSend:
+            events |= selectors.EVENT_WRITE
+
+        if events and connection.registered:
+            self.selector.modify(connection.conn, events, connection)
+        elif events:
+            self.selector.register(connection.conn, events, connection)
+            connection.registered = True
+        elif connection.registered:
+            # Can't register for no events, so
+            # temporarily stop listening altogether
+            self.selector.unregister(connection.conn)
+            connection.registered = False
+
+    def __read(self, connection):
+        if not connection.reading:
+            # Backpressure was applied after select() returned
+            return
+        elif connection.large_frame is not None:
+            self.__read_large_frame(connection)
+            return
+
+        recv_buffer = connection.recv_buffer
+        if not recv_buffer.start and recv_buffer.end == len(recv_buffer.buffer):
+            # No room until the frames already received have been processed
+            return
+
+        try:
+            recv_buffer.recv_some(connection.conn)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            # Including ConnectionResetError if the client disconnected
+            self.__close(connection)
+            return
+        self.__process_frames(connection)
+
+    def __read_large_frame(self, connection):
+        large_frame = connection.large_frame
+        request_id, actually_compressed, cmd_len, body, view, filled = large_frame
+
+        try:
+            amount = connection.conn.recv_into(view[filled:])
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self.__close(connection)
+            return
+
+        if not amount:
+            self.__close(connection)
+            return
+
+        large_frame[-1] = filled = filled + amount
+        if filled == len(body):
+            connection.large_frame = None
+            self.__submit_request(
+                connection, request_id, actually_compressed,
+                bytes(view[:cmd_len]), view[cmd_len:]
+            )
+            self.__process_frames(connection)
+
+    def __process_frames(self, connection):
+        recv_buffer = connection.recv_buffer
+
+        if connection.http is not None:
+            self.__process_http_requests(connection)
+            return
+        elif connection.compression_inst is None:
+            if not recv_buffer.available():
+                return
+            elif recv_buffer.buffer[recv_buffer.start] in HTTP_FIRST_BYTES:
+                connection.http = HTTPConnectionState()
+                self.__process_http_requests(connection)
+                return
+
+            # Client tells the server whether to use
+            # compression, as currently implemented
+            compression_typecode = recv_buffer.consume(1)
+            try:
+                connection.compression_inst = \
+                    compression_types.get_by_type_code(compression_typecode)
+            except KeyError:
+                self.__close(connection)
+                return
+
+        while connection.in_flight < self.max_pipelined_requests and \
+                connection.large_frame is None and \
+                recv_buffer.available() >= len_packer.size:
+
+            request_id, actually_compressed, data_len, cmd_len = len_packer.unpack_from(
+                recv_buffer.buffer, recv_buffer.start
+            )
+            body_len = cmd_len + data_len
+
+            if body_len > LARGE_FRAME_SIZE:
+                # Receive large payloads directly into their own
+                # buffer, so they don't need to be copied out of
+                # the reusable buffer afterwards
+                recv_buffer.unpack(len_packer)
+                body, filled = recv_buffer.start_large_body(body_len)
+                view = memoryview(body)
+
+                if filled < body_len:
+                    connection.large_frame = [
+                        request_id, actually_compressed, cmd_len, body, view, filled
+                    ]
+                    break
+
+                self.__submit_request(
+                    connection, request_id, actually_compressed,
+                    bytes(view[:cmd_len]), view[cmd_len:]
+                )
+                continue
+
+            if recv_buffer.available() < len_packer.size + body_len:
+                # Make sure the rest of the frame will fit in the buffer
+                recv_buffer.ensure_capacity(len_packer.size + body_len)
+                break
+
+            recv_buffer.unpack(len_packer)
+            cmd = recv_buffer.consume(cmd_len)
+            args = recv_buffer.consume(data_len)
+            self.__submit_request(
+                connection, request_id, actually_compressed, cmd, args
+            )
+
+        self.__update_events(connection)
+
+    def __submit_request(self, connection, request_id,
+                         actually_compressed, cmd, args, http_request=None):
+        try:
+            LLimits = self.__admit_request(cmd, http_request)
+        except ServiceBusyError as exc:
+            # Reject it straight away, rather than
+            # queueing it behind the other requests
+            with connection.send_lock:
+                if http_request is not None:
+                    self.__add_http_response(
+                        connection, request_id,
+                        encode_error(exc, http_request.keep_alive),
+                        not http_request.keep_alive
+                    )
+                else:
+                    for buffer in self.__encode_exception(request_id, exc):
+                        connection.LSend.append(memoryview(buffer))
+                        connection.send_bytes += len(buffer)
+            return
+
+        with connection.send_lock:
+            connection.in_flight += 1
+        self.request_queue.put((
+            connection, request_id, actually_compressed, cmd, args,
+            http_request, time.time(), LLimits
+        ))
+
+    def __admit_request(self, cmd, http_request):
+        """
+        Count a request towards the concurrency limits of the
+        service and method. Requests waiting in request_queue
+        count as in progress, as this is called from the event
+        loop, so mustn't wait for a free slot.
+
+        :return: the limits to release once it's been handled
+        :raise: ServiceBusyError if it's over the limits
+        """
+        cmd = bytes(cmd).decode('ascii', errors='replace')
+        if cmd == PING_CMD:
+            return ()
+        elif http_request is not None:
+            fn = http_request.fn
+        else:
+            fn = getattr(self.server_methods, cmd, None)
+        return self.admission_control.acquire(cmd, fn, wait=False)
+
+    def __process_http_requests(self, connection):
+        recv_buffer = connection.recv_buffer
+        http = connection.http
+
+        while connection.in_flight < self.max_pipelined_requests and \
+                not http.closing and recv_buffer.available():
+
+            head_end = recv_buffer.buffer.find(
+                b'\r\n\r\n', recv_buffer.start, recv_buffer.end
+            )
+            if head_end == -1:
+                if recv_buffer.available() >= MAX_HEAD_SIZE:
+                    self.__send_http_error(connection, HTTPError(431), False)
+                break
+
+            try:
+                http_request = HTTPRequest(
+                    bytes(recv_buffer.view[recv_buffer.start:head_end])
+                )
+            except HTTPError as exc:
+                # Can't tell where the next request starts
+                self.__send_http_error(connection, exc, False)
+                break
+
+            if http_request.content_length > self.max_http_body_size:
+                # Before any memory is allocated for the body
+                self.__send_http_error(connection, HTTPError(413), False)
+                break
+
+            request_len = head_end + 4 - recv_buffer.start + http_request.content_length
+            if recv_buffer.available() < request_len:
+                recv_buffer.ensure_capacity(request_len)
+                if http_request.expects_continue() and not http.sent_continue \
+                        and not connection.in_flight:
+                    # Tell the client to send the body, if it's
+                    # waiting to be told (e.g. curl does this)
+                    http.sent_continue = True
+                    with connection.send_lock:
+                        connection.LSend.append(memoryview(CONTINUE_RESPONSE))
+                        connection.send_bytes += len(CONTINUE_RESPONSE)
+                break
+
+            recv_buffer.start = head_end + 4
+            args = recv_buffer.consume(http_request.content_length)
+            http.sent_continue = False
+            if not http_request.keep_alive:
+                http.closing = True
+
+            try:
+                http_request.cmd, http_request.fn = \
+                    self.route_http_request(http_request)
+            except HTTPError as exc:
+                self.__send_http_error(connection, exc, http_request.keep_alive)
+                continue
+
+            self.__submit_request(
+                connection, http.new_request_id(),
+                False, http_request.cmd, args, http_request
+            )
+
+        self.__update_events(connection)
+
+    def __send_http_error(self, connection, exc, keep_alive):
+        if not keep_alive:
+            connection.http.closing = True
+        with connection.send_lock:
+            self.__add_http_response(
+                connection, connection.http.new_request_id(),
+                encode_error(exc, keep_alive), not keep_alive
+            )
+
+    def __add_http_response(self, connection, request_id, LBuffers, close):
+        # (connection.send_lock must be held)
+        for buffer in connection.http.add_response(request_id, LBuffers, close):
+            connection.LSend.append(memoryview(buffer))
+            connection.send_bytes += len(buffer)
+
+    def route_http_request(self, http_request):
+        """
+        Find the method an HTTP request is for
+
+        :return: (the command to send, the method)
+        :raise: HTTPError if the request can't be routed
+        """
+        if http_request.method != 'POST':
+            raise HTTPError(405)
+
+        LPath = http_request.path.strip('/').split('/')
+        if len(LPath) == 2 and LPath[0] in (self.name, str(self.port)):
+            method = LPath[1]
+        elif len(LPath) == 1:
+            method = LPath[0]
+        else:
+            raise HTTPError(404)
+
+        fn = getattr(self.server_methods, method, None)
+        self.check_http_fn(http_request, fn)
+        return method.encode('ascii'), fn
+
+    def check_http_fn(self, http_request, fn):
+        """
+        Make sure `fn` is an RPC method which can be called over HTTP
+
+        :raise: HTTPError if it isn't
+        """
+        if fn is None or not hasattr(fn, 'serialiser'):
+            raise HTTPError(404)
+        elif fn.serialiser in (PickleSerialisation, MarshalSerialisation):
+            # Only Python can use these, and they aren't safe
+            raise HTTPError(415, "Pickle/marshal methods can't be called over HTTP")
+
+        content_type = http_request.get_content_type()
+        if content_type is not None and content_type != fn.serialiser.mimetype:
+            raise HTTPError(
+                415, f"Content-Type should be {fn.serialiser.mimetype}"
+            )
+
+    def __write(self, connection):
+        with connection.send_lock:
+            while connection.LSend:
+                try:
+                    # Send as many of the queued responses
+                    # as possible in a single call
+                    amount = send_buffers_nonblocking(
+                        connection.conn, connection.LSend
+                    )
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError:
+                    connection.LSend.clear()
+                    connection.send_bytes = 0
+                    self.__close(connection)
+                    return
+                connection.send_bytes -= amount
+
+            if connection.http and connection.http.close_after_send and \
+                    not connection.LSend:
+                # The response to "Connection: close" has been sent
+                self.__close(connection)
+                return
+
+        self.__update_events(connection)
+        if connection.reading and connection.recv_buffer.available():
+            # Requests may have been received while
+            # the last response was being processed
+            self.__process_frames(connection)
+
+    #=========================================================#
+    #               Forward Requests to Workers               #
+    #=========================================================#
+
+    def __request_loop(self):
+        if self.call_directly:
+            # Already in the worker process
+            shm_client = None
+        else:
             # If we're using tcp sockets, spinlocks can
             # actually be counterproductive and harm performance
             # as we'd be waiting too long too often
             shm_client = SHMClient(self.server_methods, use_spinlock=False)
-            start_new_thread(self.run, (conn, shm_client,))
 
-    def run(self, conn, shm_client):
-        # TODO: Provide basic support for REST-based RPC
-        #       if the client starts with an HTTP header! =============================================================s
+        while True:
+            item = self.request_queue.get()
+            if shm_client is None:
+                fn = self.get_async_method(item[3])
+                if fn is not None:
+                    # Finished from the worker's event loop, rather than
+                    # this thread waiting for the coroutine to finish
+                    self.__start_async_request(fn, *item)
+                    continue
 
-        conn.setblocking(True)
+            try:
+                self.__handle_queued_request(shm_client, *item)
+            finally:
+                # Lets shutdown() know when all the
+                # requests which were received are done
+                self.request_queue.task_done()
 
-        # If this setting isn't set, then there's a high
-        # probability of there being much higher latency
-        conn.setsockopt(socket.SOL_TCP, socket.TCP_NODELAY, 1)
-        conn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
-        conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
-        conn.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
-
-        def recv(amount):
-            # Note string concatenation is slower in earlier versions
-            # of python, but should be faster than list concat in later
-            # versions after 3.
-            r = b''
-            while len(r) != amount:
-                i = conn.recv(amount)
-                if i:
-                    r += i
+    def __handle_queued_request(self, shm_client,
+                                connection, request_id, actually_compressed,
+                                cmd, args, http_request, t_queued, LLimits):
+        self.load_stats.add_queue_wait(time.time() - t_queued)
+        try:
+            if connection.closed:
+                return
+
+            if http_request is not None:
+                LBuffers = self.handle_http_request(shm_client, http_request, args)
+            else:
+                LBuffers = self.handle_request(
+                    shm_client, connection.compression_inst,
+                    request_id, actually_compressed, cmd, args
+                )
+        finally:
+            # Free the slot before the response is sent, otherwise the
+            # client's next call could be rejected as the service or
+            # method would still look busy (as SHMServer does)
+            self.admission_control.release(LLimits)
+        self.__send_response(connection, request_id, http_request, LBuffers)
+
+    def __start_async_request(self, fn,
+                              connection, request_id, actually_compressed,
+                              cmd, args, http_request, t_queued, LLimits):
+        """
+        Start calling the async method `fn` (when call_directly is set),
+        sending the response once its coroutine finishes
+        """
+        self.load_stats.add_queue_wait(time.time() - t_queued)
+
+        def callback(send_data, exc):
+            # Free the slot before the response is sent
+            # (see __handle_queued_request)
+            self.admission_control.release(LLimits)
+            try:
+                if exc is not None and not isinstance(exc, ServiceBusyError):
+                    import traceback
+                    traceback.print_exception(type(exc), exc, exc.__traceback__)
+
+                if http_request is not None:
+                    if exc is None:
+                        LBuffers = encode_response(
+                            200, fn.serialiser.mimetype,
+                            send_data, http_request.keep_alive
+                        )
+                    else:
+                        LBuffers = encode_error(exc, http_request.keep_alive)
+                elif exc is None:
+                    LBuffers = self.__encode_result(
+                        connection.compression_inst, request_id, send_data
+                    )
                 else:
-                    raise ConnectionResetError()
-            return r
+                    LBuffers = self.__encode_exception(request_id, exc)
+                self.__send_response(connection, request_id, http_request, LBuffers)
+            finally:
+                self.request_queue.task_done()
+
+        if connection.closed:
+            self.admission_control.release(LLimits)
+            self.request_queue.task_done()
+            return
 
-        # Client tells the server whether to use
-        # compression, as currently implemented
         try:
-            compression_inst = compression_types.get_by_type_code(recv(1))
-        except ConnectionResetError:
+            if actually_compressed:
+                args = connection.compression_inst.decompress(args)
+        except Exception as exc:
+            callback(None, exc)
             return
+        self.call_async_method(fn, args, callback)
 
-        while True:
-            try:
-                actually_compressed, data_len, cmd_len = \
-                    len_packer.unpack(recv(len_packer.size))
-                cmd = recv(cmd_len)
-                args = recv(data_len)
-            except ConnectionResetError:
-                return
+    def __send_response(self, connection, request_id, http_request, LBuffers):
+        """
+        Queue the encoded response to a request to be
+        sent by the event loop, and wake it up
+        """
+        if connection.closed:
+            return
+
+        if http_request is not None:
+            with connection.send_lock:
+                self.__add_http_response(
+                    connection, request_id, LBuffers,
+                    not http_request.keep_alive
+                )
+                connection.in_flight -= 1
+        else:
+            with connection.send_lock:
+                for buffer in LBuffers:
+                    connection.LSend.append(memoryview(buffer))
+                    connection.send_bytes += len(buffer)
+                connection.in_flight -= 1
+
+        with self.__pending_lock:
+            self.__SPendingConns.add(connection)
+        try:
+            self.__wakeup_send.send(b'\0')
+        except BlockingIOError:
+            # Already has data waiting, so the
+            # event loop will be woken up anyway
+            pass
+
+    def handle_http_request(self, shm_client, http_request, args):
+        """
+        Send a single HTTP request to the worker processes (or call
+        the method directly if `shm_client` is None). The body is
+        already encoded with the method's serialiser, so is sent
+        as-is, and the response is encoded the same way.
+
+        :return: the encoded HTTP response, as a list of buffers
+        """
+        try:
+            if shm_client is None:
+                send_data = self.handle_fn(http_request.cmd, args)
+            else:
+                send_data = shm_client.send(http_request.cmd, args)
+            return encode_response(
+                200, http_request.fn.serialiser.mimetype,
+                send_data, http_request.keep_alive
+            )
+        except Exception as exc:
+            if not isinstance(exc, ServiceBusyError):
+                import traceback
+                traceback.print_exc()
+            return encode_error(exc, http_request.keep_alive)
 
+    def handle_request(self, shm_client, compression_inst,
+                       request_id, actually_compressed, cmd, args):
+        """
+        Send a single request to the worker processes (or call
+        the method directly if `shm_client` is None), returning
+        the encoded response as a list of buffers (the header
+        and the data), so that the data doesn't need to be
+        copied to add the header
+        """
+        try:
             if actually_compressed:
                 args = compression_inst.decompress(args)
 
-            try:
+            if shm_client is None:
+                send_data = self.handle_fn(cmd, args)
+            else:
                 send_data = shm_client.send(cmd, args)
-                actually_compressed, send_data = \
-                    compression_inst.compress(send_data)
-                send_data = (
-                    response_packer.pack(
-                        actually_compressed,
-                        len(send_data),
-                        b'+'
-                    ) + send_data
-                )
-            except Exception as exc:
-                # Just send a basic Exception instance for now, but would be nice
-                # if could recreate some kinds of exceptions on the other end
+            return self.__encode_result(compression_inst, request_id, send_data)
+        except Exception as exc:
+            if not isinstance(exc, ServiceBusyError):
                 import traceback
                 traceback.print_exc()
-                send_data = repr(exc).encode('utf-8')
-                send_data = (
-                    # Won't compress exceptions, for now
-                    response_packer.pack(
-                        False,
-                        len(send_data),
-                        b'-'
-                    ) + send_data
-                )
+            return self.__encode_exception(request_id, exc)
+
+    def __encode_result(self, compression_inst, request_id, send_data):
+        actually_compressed, send_data = \
+            compression_inst.compress(send_data)
+        return [
+            response_packer.pack(
+                request_id,
+                actually_compressed,
+                len(send_data),
+                b'+'
+            ),
+            send_data
+        ]
 
-            conn.send(send_data)
+    def __encode_exception(self, request_id, exc):
+        # Just send a basic Exception instance for now, but would be nice
+        # if could recreate some kinds of exceptions on the other end
+        # Prefix with the status, the same as SHMServer does, as
+        # _handle_exception on the client expects it to be there
+        send_data = b'-' + repr(exc).encode('utf-8')
+        return [
+            # Won't compress exceptions, for now
+            response_packer.pack(
+                request_id,
+                False,
+                len(send_data),
+                b'-'
+            ),
+            send_data
+        ]
 
 
 if __name__ == '__main__':
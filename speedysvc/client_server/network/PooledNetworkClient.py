@@ -0,0 +1,280 @@
+import time
+import random
+from _thread import allocate_lock, start_new_thread
+from speedysvc.toolkit.documentation.copydoc import copydoc
+
+from speedysvc.client_server.base_classes.ClientProviderBase import ClientProviderBase
+from speedysvc.client_server.network.NetworkClient import NetworkClient, ConnectionLostError
+from speedysvc.compression.compression_types import zlib_compression
+
+
+LEAST_OUTSTANDING = 'least_outstanding'
+EWMA_LATENCY = 'ewma_latency'
+
+
+def debug(*s):
+    if False:
+        print(*s)
+
+
+class _Backend:
+    def __init__(self, host, port):
+        """
+        The connections to, and statistics for, a single
+        host which is running a copy of the service.
+        """
+        self.host = host
+        self.port = port
+        self.LClients = []
+        self.ewma_latency = None
+        self.ejected = False
+        self.last_error = None
+
+    def get_num_outstanding(self):
+        return sum(client.get_num_outstanding() for client in self.LClients)
+
+    def get_client(self):
+        """
+        :return: the open connection with the fewest calls
+                 in progress, or None if they're all closed
+        """
+        LClients = [client for client in self.LClients if not client.closed]
+        if not LClients:
+            return None
+        return min(LClients, key=lambda client: client.get_num_outstanding())
+
+
+class PooledNetworkClient(ClientProviderBase):
+    def __init__(self,
+                 server_methods,
+                 addresses,
+                 connections_per_address=2,
+                 load_balancing=LEAST_OUTSTANDING,
+                 compression_inst=zlib_compression,
+                 ewma_decay=0.2,
+                 probe_every_secs=5.0,
+                 retry_on_connection_lost=False):
+        """
+        A client which keeps `connections_per_address` connections to
+        each of several hosts running the same service, spreading
+        calls between them.
+
+        Hosts which can't be connected to, or whose connection is
+        lost, are ejected from the pool. A background thread then
+        periodically tries to reconnect to them, adding them back
+        to the pool once it succeeds.
+
+        :param server_methods:
+        :param addresses: a list of (host, port) tuples. If port is None,
+                          the port of server_methods is used.
+        :param connections_per_address: the number of connections
+                                        to keep open to each host
+        :param load_balancing: either LEAST_OUTSTANDING, to prefer the host
+                               with the fewest calls in progress, or
+                               EWMA_LATENCY, to prefer the host which has
+                               (recently) responded the fastest.
+        :param compression_inst: an instance of one of NullCompression,
+                                 SnappyCompression or ZLibCompression.
+        :param ewma_decay: the weight given to the latest call when
+                           updating the average latency of a host,
+                           between 0.0 and 1.0
+        :param probe_every_secs: how often to try to reconnect
+                                 to ejected hosts
+        :param retry_on_connection_lost: whether to send a call to
+                                         another host if the connection
+                                         is lost while it's in progress,
+                                         rather than raising
+                                         ConnectionLostError. The first
+                                         host may have already run it, so
+                                         only use this for methods which
+                                         are safe to run twice. (Calls
+                                         which couldn't be sent at all are
+                                         always tried on another host.)
+        """
+        assert load_balancing in (LEAST_OUTSTANDING, EWMA_LATENCY), \
+            f"Unknown load balancing method: {load_balancing}"
+        assert 0.0 < ewma_decay <= 1.0, \
+            "ewma_decay should be between 0.0 (non-inclusive) and 1.0"
+        ClientProviderBase.__init__(self, server_methods)
+
+        self.connections_per_address = connections_per_address
+        self.load_balancing = load_balancing
+        self.compression_inst = compression_inst
+        self.ewma_decay = ewma_decay
+        self.probe_every_secs = probe_every_secs
+        self.retry_on_connection_lost = retry_on_connection_lost
+        self.lock = allocate_lock()
+        self.closed = False
+
+        self.LBackends = [
+            _Backend(host, port if port is not None else server_methods.port)
+            for host, port in addresses
+        ]
+        for backend in self.LBackends:
+            self.__connect_backend(backend)
+
+        if not any(not backend.ejected for backend in self.LBackends):
+            # Same as NetworkClient, raise an exception
+            # if the service can't be connected to at all
+            raise self.LBackends[-1].last_error
+        start_new_thread(self.__probe_loop, ())
+
+    def close(self):
+        """
+        Close all connections, and stop probing ejected hosts
+        """
+        self.closed = True
+        for backend in self.LBackends:
+            for client in backend.LClients:
+                client.close()
+
+    def get_num_outstanding(self):
+        """
+        :return: the number of calls in progress over all hosts
+        """
+        return sum(backend.get_num_outstanding() for backend in self.LBackends)
+
+    #=========================================================#
+    #                      Send Commands                      #
+    #=========================================================#
+
+    @copydoc(ClientProviderBase.send)
+    def send(self, fn, data):
+        while True:
+            if self.closed:
+                raise ConnectionLostError(
+                    f"Client for service {self.server_methods.name} was closed"
+                )
+            backend = self.__choose_backend()
+            client = backend.get_client()
+            if client is None:
+                # All the connections to the host were lost
+                self.__eject_backend(backend, ConnectionLostError(
+                    f"Connections to {backend.host}:{backend.port} were lost"
+                ))
+                continue
+
+            t_from = time.time()
+            try:
+                future = client.submit(fn, data)
+            except ConnectionLostError:
+                # The call wasn't sent, as the connection was lost just
+                # beforehand, so it's safe to use another connection
+                continue
+
+            try:
+                result = future.result()
+            except ConnectionLostError as exc:
+                # Try again with a different host (if there is one)
+                self.__eject_backend(backend, exc)
+                if self.retry_on_connection_lost:
+                    continue
+                raise
+            except Exception:
+                # Exceptions raised by the service still
+                # indicate the host is responding
+                self.__update_latency(backend, time.time() - t_from)
+                raise
+
+            self.__update_latency(backend, time.time() - t_from)
+            return result
+
+    def __choose_backend(self):
+        LBackends = [
+            backend for backend in self.LBackends
+            if not backend.ejected
+        ]
+        if not LBackends:
+            raise ConnectionLostError(
+                f"No hosts for service {self.server_methods.name} "
+                f"can be connected to"
+            )
+
+        # Shuffle, so that ties aren't always
+        # resolved in favour of the first host
+        random.shuffle(LBackends)
+
+        if self.load_balancing == LEAST_OUTSTANDING:
+            return min(LBackends, key=lambda backend: backend.get_num_outstanding())
+        else:
+            # Hosts which haven't been timed yet are tried first.
+            # Outstanding calls are counted so that a single fast
+            # host isn't sent all the calls
+            return min(LBackends, key=lambda backend: (
+                0.0 if backend.ewma_latency is None
+                else backend.ewma_latency * (backend.get_num_outstanding() + 1)
+            ))
+
+    def __update_latency(self, backend, latency):
+        with self.lock:
+            if backend.ewma_latency is None:
+                backend.ewma_latency = latency
+            else:
+                backend.ewma_latency = (
+                    self.ewma_decay * latency +
+                    (1.0 - self.ewma_decay) * backend.ewma_latency
+                )
+
+    #=========================================================#
+    #                Eject/Re-probe Backends                  #
+    #=========================================================#
+
+    def __connect_backend(self, backend):
+        """
+        (Re)connect any connections to `backend` which were lost
+        :return: True if the backend was connected to successfully
+        """
+        LClients = [
+            client for client in backend.LClients
+            if not client.closed
+        ]
+        try:
+            while len(LClients) < self.connections_per_address:
+                LClients.append(NetworkClient(
+                    self.server_methods,
+                    host=backend.host, port=backend.port,
+                    compression_inst=self.compression_inst,
+                    reconnect=False
+                ))
+        except OSError as exc:
+            backend.ejected = True
+            backend.last_error = exc
+            for client in LClients:
+                client.close()
+            return False
+
+        backend.LClients = LClients
+        backend.ejected = False
+        return True
+
+    def __eject_backend(self, backend, exc):
+        with self.lock:
+            if backend.ejected:
+                return
+            debug(f"PooledNetworkClient: ejecting {backend.host}:{backend.port}: {exc}")
+            backend.ejected = True
+            backend.last_error = exc
+            backend.ewma_latency = None
+
+            for client in backend.LClients:
+                client.close()
+
+    def __probe_loop(self):
+        while not self.closed:
+            time.sleep(self.probe_every_secs)
+
+            for backend in self.LBackends:
+                if self.closed:
+                    return
+
+                try:
+                    if backend.ejected:
+                        if self.__connect_backend(backend):
+                            debug(f"PooledNetworkClient: {backend.host}:{backend.port} is back")
+                    elif any(client.closed for client in backend.LClients):
+                        # Replace individual connections which were lost
+                        if not self.__connect_backend(backend):
+                            self.__eject_backend(backend, backend.last_error)
+                except:
+                    import traceback
+                    traceback.print_exc()
@@ -0,0 +1,146 @@
+import time
+import socket
+from _thread import allocate_lock, start_new_thread
+
+from speedysvc.client_server.base_classes.ClientProviderBase import ClientProviderBase
+from speedysvc.client_server.network.consts import \
+    MAX_UDP_DATAGRAM_SIZE, DEFAULT_UDP_DATAGRAM_SIZE
+from speedysvc.client_server.batch_encoding import encode_batch_requests
+
+
+def debug(*s):
+    if False:
+        print(*s)
+
+
+class UDPClient(ClientProviderBase):
+    def __init__(self,
+                 server_methods,
+                 host='127.0.0.1', port=None,
+                 batch_window_secs=None,
+                 max_datagram_size=DEFAULT_UDP_DATAGRAM_SIZE):
+        """
+        A client which sends calls to methods decorated with @oneway
+        to a UDPServer, without waiting for (or getting) a response.
+        `send` always returns None, even if the call was lost.
+
+        :param server_methods:
+        :param host:
+        :param port: defaults to the port of server_methods
+        :param batch_window_secs: if provided, calls are held for up to
+                                  this many seconds, so that several can
+                                  be sent in a single datagram. Otherwise
+                                  each call is sent straight away.
+        :param max_datagram_size: the maximum size of batched datagrams.
+                                  Calls larger than this are sent on
+                                  their own.
+        """
+        ClientProviderBase.__init__(self, server_methods, port)
+        self.host = host
+        self.batch_window_secs = batch_window_secs
+        self.max_datagram_size = max_datagram_size
+
+        # Connecting means the address doesn't need
+        # to be looked up every time a datagram is sent
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.connect((host, self.port))
+
+        self.lock = allocate_lock()
+        self.LPending = []
+        self.pending_size = 0
+        self.closed = False
+
+        if batch_window_secs is not None:
+            start_new_thread(self.__flush_loop, ())
+
+    def __del__(self):
+        self.close()
+
+    def get_address(self):
+        """
+        :return: the address sent to, for error messages
+        """
+        return f"udp://{self.host}:{self.port}"
+
+    def close(self):
+        """
+        Send any calls which are being held for
+        batching, and close the socket
+        """
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        self.sock.close()
+
+    def send(self, fn, data):
+        """
+        Send the call to `fn` to the server without waiting.
+
+        :return: None
+        """
+        if not getattr(fn, 'oneway', False):
+            raise TypeError(
+                f"{fn.__name__} must be decorated with "
+                f"@oneway to be called over udp://"
+            )
+
+        message = encode_batch_requests([
+            (fn.__name__.encode('ascii'), fn.serialiser.dumps(data))
+        ])
+        if len(message) > MAX_UDP_DATAGRAM_SIZE:
+            raise ValueError(
+                f"Call to {fn.__name__} is {len(message)} bytes, but UDP "
+                f"datagrams can be at most {MAX_UDP_DATAGRAM_SIZE} bytes"
+            )
+
+        if self.batch_window_secs is None:
+            self.__send_datagram(message)
+            return None
+
+        datagram = None
+        with self.lock:
+            if self.LPending and \
+                    self.pending_size + len(message) > self.max_datagram_size:
+                # Send what's already waiting, as
+                # this call won't fit in with it
+                datagram = b''.join(self.LPending)
+                self.LPending = []
+                self.pending_size = 0
+
+            self.LPending.append(message)
+            self.pending_size += len(message)
+
+        if datagram is not None:
+            self.__send_datagram(datagram)
+        return None
+
+    def flush(self):
+        """
+        Send any calls which are being held for batching
+        """
+        with self.lock:
+            if not self.LPending:
+                return
+            datagram = b''.join(self.LPending)
+            self.LPending = []
+            self.pending_size = 0
+        self.__send_datagram(datagram)
+
+    def __flush_loop(self):
+        while not self.closed:
+            time.sleep(self.batch_window_secs)
+            try:
+                self.flush()
+            except OSError:
+                if self.closed:
+                    return
+                raise
+
+    def __send_datagram(self, datagram):
+        try:
+            self.sock.send(datagram)
+        except ConnectionRefusedError:
+            # The server wasn't listening when an earlier datagram was
+            # sent. Calls over UDP can be lost anyway, so carry on.
+            debug(f"UDPClient: {self.get_address()} refused connection")
@@ -0,0 +1,104 @@
+import socket
+import traceback
+from queue import Queue, Full
+from _thread import start_new_thread
+
+from speedysvc.client_server.shared_memory.SHMClient import SHMClient
+from speedysvc.client_server.base_classes.ServerProviderBase import ServerProviderBase
+from speedysvc.client_server.network.consts import MAX_UDP_DATAGRAM_SIZE
+from speedysvc.client_server.batch_encoding import BATCH_CMD, decode_batch_requests
+from speedysvc.serialisation.MarshalSerialisation import MarshalSerialisation
+from speedysvc.serialisation.PickleSerialisation import PickleSerialisation
+
+
+def debug(*s):
+    if False:
+        print(*s)
+
+
+class UDPServer(ServerProviderBase):
+    def __init__(self,
+                 server_methods,
+                 udp_bind_address='127.0.0.1',
+                 force_insecure_serialisation=False,
+                 shm_pool_size=2,
+                 max_queued_datagrams=10000):
+        """
+        Receive calls to methods decorated with @oneway over UDP,
+        forwarding them to the worker processes. Each datagram
+        contains one or more calls, in the same encoding as the
+        batches sent by BatchingClient, so all the calls in a
+        datagram are forwarded with a single SHM call.
+
+        Nothing is sent back to clients, so there's no connection
+        state or acknowledgements, and datagrams can be lost.
+
+        :param udp_bind_address: the address to listen on. The port
+                                 is the same as the service's TCP port.
+        :param force_insecure_serialisation: allow calling methods
+                                             which use pickle/marshal
+        :param shm_pool_size: the number of SHM connections (and
+                              threads) used for forwarding datagrams
+        :param max_queued_datagrams: drop datagrams which are received
+                                     while this many are waiting to be
+                                     forwarded, rather than using more
+                                     and more memory
+        """
+        ServerProviderBase.__init__(self, server_methods)
+        self.force_insecure_serialisation = force_insecure_serialisation
+        self.num_dropped = 0
+
+        sock = self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # A large receive buffer reduces the number of
+        # datagrams lost when many arrive at once
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4*1024*1024)
+        sock.bind((udp_bind_address, server_methods.port))
+
+        self.datagram_queue = Queue(maxsize=max_queued_datagrams)
+        for x in range(shm_pool_size):
+            start_new_thread(self.__forward_loop, ())
+        start_new_thread(self.__recv_loop, ())
+
+    def __recv_loop(self):
+        while True:
+            try:
+                datagram = self.sock.recv(MAX_UDP_DATAGRAM_SIZE)
+            except OSError:
+                traceback.print_exc()
+                continue
+
+            try:
+                self.datagram_queue.put_nowait(datagram)
+            except Full:
+                self.num_dropped += 1
+
+    def __forward_loop(self):
+        # As with NetworkServer, spinlocks are counterproductive here
+        shm_client = SHMClient(self.server_methods, use_spinlock=False)
+        batch_cmd = BATCH_CMD.encode('ascii')
+
+        while True:
+            datagram = self.datagram_queue.get()
+            try:
+                for cmd, _ in decode_batch_requests(datagram):
+                    self.__check_method(cmd)
+
+                # The result of each call is ignored - any exceptions
+                # will have been logged by the worker process
+                shm_client.send(batch_cmd, datagram)
+            except Exception:
+                traceback.print_exc()
+
+    def __check_method(self, cmd):
+        fn = getattr(self.server_methods, cmd, None)
+        if not getattr(fn, 'oneway', False):
+            raise PermissionError(
+                f"{self.name}.{cmd} must be decorated with "
+                f"@oneway to be called over UDP"
+            )
+        elif fn.serialiser in (PickleSerialisation, MarshalSerialisation) and \
+                not self.force_insecure_serialisation:
+            raise PermissionError(
+                f"Pickle/marshal serialisation of {self.name}.{cmd} "
+                f"disallowed over UDP for security reasons"
+            )
@@ -1,4 +1,24 @@
 from struct import Struct
 
-len_packer = Struct('!Bii')
-response_packer = Struct('!Bic')
+# Request header:
+# request id, whether the data is compressed,
+# length of the data, length of the command
+len_packer = Struct('!IBii')
+
+# Response header:
+# request id (responses can be sent out of order),
+# whether the data is compressed, length of the data,
+# status [b'+' is success, b'-' is exception occurred]
+response_packer = Struct('!IBic')
+
+# The port a GatewayServer listens on by default (one
+# below the port of the web monitoring interface)
+DEFAULT_GATEWAY_PORT = 5154
+
+# The largest UDP datagram which can be sent over IPv4
+MAX_UDP_DATAGRAM_SIZE = 65507
+
+# Batched UDP messages are kept under this size by default,
+# so datagrams fit in a typical ethernet MTU without
+# being fragmented (losing any fragment loses them all)
+DEFAULT_UDP_DATAGRAM_SIZE = 1400
@@ -0,0 +1,204 @@
+import socket
+
+
+# The maximum number of buffers to send in a single sendmsg() call.
+# POSIX only guarantees 16, but Linux allows 1024.
+IOV_MAX = 1024
+
+# Bodies of frames larger than this are received directly into
+# their own bytearray, rather than into (and then copied out of)
+# the connection's reusable buffer
+LARGE_FRAME_SIZE = 65536
+
+_has_sendmsg = hasattr(socket.socket, 'sendmsg')
+
+
+def send_buffers(sock, LBuffers):
+    """
+    Send several buffers (e.g. a header, command and payload) on a
+    blocking socket, using scatter-gather IO where available so
+    they don't need to be concatenated first. Unlike socket.send,
+    this keeps sending until everything has been sent.
+
+    :param sock: a blocking socket
+    :param LBuffers: a list of bytes-like objects
+    """
+    if not _has_sendmsg:
+        # e.g. Windows. Join small buffers, as TCP_NODELAY
+        # would otherwise send each one as a separate packet
+        if sum(len(i) for i in LBuffers) <= LARGE_FRAME_SIZE:
+            sock.sendall(b''.join(LBuffers))
+        else:
+            for buffer in LBuffers:
+                sock.sendall(buffer)
+        return
+
+    LBuffers = [memoryview(i).cast('B') for i in LBuffers if len(i)]
+    while LBuffers:
+        amount = sock.sendmsg(LBuffers[:IOV_MAX])
+        _advance(LBuffers, amount)
+
+
+def send_buffers_nonblocking(sock, DBuffers):
+    """
+    Send as much of a deque of memoryviews as the
+    socket will accept without blocking, removing
+    whatever was sent from the deque.
+
+    :return: the number of bytes sent
+    :raise: BlockingIOError if nothing could be sent
+    """
+    if _has_sendmsg:
+        LBuffers = [
+            DBuffers[x] for x in range(min(len(DBuffers), IOV_MAX))
+        ]
+        amount = sock.sendmsg(LBuffers)
+    else:
+        amount = sock.send(DBuffers[0])
+
+    _advance(DBuffers, amount)
+    return amount
+
+
+def _advance(LBuffers, amount):
+    """
+    Remove `amount` bytes from the start of a list/deque of
+    memoryviews, without copying any partially-sent buffer
+    """
+    while LBuffers:
+        buffer = LBuffers[0]
+        if amount >= len(buffer):
+            # (Empty buffers, e.g. the body of an empty
+            #  response, are removed even if amount is 0)
+            amount -= len(buffer)
+            del LBuffers[0]
+        else:
+            if amount:
+                LBuffers[0] = buffer[amount:]
+            break
+
+
+class RecvBuffer:
+    def __init__(self, size=LARGE_FRAME_SIZE):
+        """
+        A reusable buffer for reading frames from a socket with
+        recv_into, so that a new bytes object isn't created (and
+        concatenated) for every recv() call.
+
+        Data in the buffer is between `start` and `end`.
+        """
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+    def available(self):
+        return self.end - self.start
+
+    def ensure_capacity(self, amount):
+        """
+        Make sure there's at least `amount` bytes of room after
+        `start`, compacting or growing the buffer as needed.
+        """
+        if self.start and (
+            len(self.buffer) - self.start < amount or
+            self.start == self.end
+        ):
+            # Move the unprocessed data to the start of the buffer
+            remaining = self.end - self.start
+            self.view[:remaining] = self.view[self.start:self.end]
+            self.start = 0
+            self.end = remaining
+
+        if len(self.buffer) < amount:
+            self.view.release()
+            new_buffer = bytearray(amount)
+            new_buffer[:self.end] = self.buffer[:self.end]
+            self.buffer = new_buffer
+            self.view = memoryview(new_buffer)
+
+    def recv_some(self, sock):
+        """
+        Receive however much data is available (up to
+        the free space in the buffer) with a single call.
+
+        :return: the number of bytes received
+        :raise: ConnectionResetError if the socket was closed
+        """
+        if self.end == len(self.buffer):
+            # Make room after the data which has already been received
+            # (e.g. a partial header at the very end of the buffer)
+            self.ensure_capacity(self.available() + 1)
+        amount = sock.recv_into(self.view[self.end:])
+        if not amount:
+            raise ConnectionResetError()
+        self.end += amount
+        return amount
+
+    def unpack(self, struct):
+        """
+        Decode and remove a header using the
+        `struct.Struct` instance `struct`
+        """
+        r = struct.unpack_from(self.buffer, self.start)
+        self.start += struct.size
+        return r
+
+    def consume(self, amount):
+        """
+        Return a copy of the next `amount` bytes, so
+        that the buffer can be reused straight away
+        """
+        from_ = self.start
+        self.start += amount
+        return bytes(self.view[from_:self.start])
+
+    def start_large_body(self, amount):
+        """
+        Create a dedicated buffer for a frame body of `amount` bytes,
+        moving into it anything which has already been received.
+
+        :return: (the new bytearray, the number of bytes already in it)
+        """
+        body = bytearray(amount)
+        filled = min(amount, self.available())
+        body[:filled] = self.view[self.start:self.start+filled]
+        self.start += filled
+        return body, filled
+
+    #=========================================================#
+    #                  Blocking Socket Reads                  #
+    #=========================================================#
+
+    def read_exactly(self, sock, amount):
+        """
+        Block until `amount` bytes have been received.
+        Small amounts are returned as a copy of the reusable
+        buffer; large amounts are received directly into
+        a new bytearray, so they're only written once.
+        """
+        if amount > LARGE_FRAME_SIZE:
+            body, filled = self.start_large_body(amount)
+            view = memoryview(body)
+            while filled < amount:
+                add_amount = sock.recv_into(view[filled:])
+                if not add_amount:
+                    raise ConnectionResetError()
+                filled += add_amount
+            view.release()
+            return body
+
+        self.ensure_capacity(amount)
+        while self.available() < amount:
+            self.recv_some(sock)
+        return self.consume(amount)
+
+    def read_header(self, sock, struct):
+        """
+        Block until a header encoded with the `struct.Struct`
+        instance `struct` has been received, and decode it
+        """
+        self.ensure_capacity(struct.size)
+        while self.available() < struct.size:
+            self.recv_some(sock)
+        return self.unpack(struct)
@@ -0,0 +1,190 @@
+# A minimal HTTP/1.1 implementation, so that clients in other languages
+# can call services with `POST /<service>/<method>`. It only supports
+# what's needed for RPC (Content-Length bodies, keep-alive and
+# pipelining), so that requests can be handled in NetworkServer's
+# event loop, without the overhead of a general web framework.
+
+from speedysvc.client_server.admission import ServiceBusyError
+
+
+# The first byte of requests for all HTTP methods, which
+# don't clash with the compression typecodes (N/S/Z) which
+# speedysvc clients send when they connect
+HTTP_FIRST_BYTES = frozenset(b'CDGHOPT')
+
+MAX_HEAD_SIZE = 65536
+# The largest request body, by default. This is the largest
+# data length a frame of the binary protocol can have.
+MAX_BODY_SIZE = 2**31 - 1
+
+DStatusText = {
+    100: 'Continue',
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Content Too Large',
+    415: 'Unsupported Media Type',
+    431: 'Request Header Fields Too Large',
+    500: 'Internal Server Error',
+    501: 'Not Implemented',
+    503: 'Service Unavailable',
+    505: 'HTTP Version Not Supported',
+}
+
+CONTINUE_RESPONSE = b'HTTP/1.1 100 Continue\r\n\r\n'
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message=None):
+        """
+        An error which is sent to the client as an HTTP
+        response, rather than raised by an RPC method
+        """
+        self.status = status
+        self.message = message or DStatusText[status]
+        Exception.__init__(self, self.message)
+
+
+class HTTPRequest:
+    __slots__ = ('method', 'path', 'version', 'DHeaders',
+                 'keep_alive', 'content_length', 'cmd', 'fn')
+
+    def __init__(self, head):
+        """
+        Parse the head (request line and headers, without
+        the final blank line) of an HTTP request.
+
+        :param head: bytes
+        :raise: HTTPError if the request is invalid/unsupported
+        """
+        try:
+            LLines = head.decode('latin-1').split('\r\n')
+            self.method, self.path, self.version = LLines[0].split(' ')
+        except ValueError:
+            raise HTTPError(400, "Invalid request line")
+
+        if self.version not in ('HTTP/1.1', 'HTTP/1.0'):
+            raise HTTPError(505)
+
+        self.DHeaders = DHeaders = {}
+        for line in LLines[1:]:
+            key, sep, value = line.partition(':')
+            if not sep:
+                raise HTTPError(400, "Invalid header line")
+            DHeaders[key.strip().lower()] = value.strip()
+
+        connection = DHeaders.get('connection', '').lower()
+        if self.version == 'HTTP/1.1':
+            self.keep_alive = connection != 'close'
+        else:
+            self.keep_alive = connection == 'keep-alive'
+
+        if 'transfer-encoding' in DHeaders:
+            raise HTTPError(501, "Chunked request bodies aren't supported")
+        try:
+            self.content_length = int(DHeaders.get('content-length', '0'))
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length")
+        if self.content_length < 0:
+            raise HTTPError(400, "Invalid Content-Length")
+
+        # Set once the request has been routed
+        self.cmd = None
+        self.fn = None
+
+    def get_content_type(self):
+        """
+        :return: the mimetype of the body, without any
+                 parameters (e.g. "; charset=utf-8"),
+                 or None if it wasn't provided
+        """
+        content_type = self.DHeaders.get('content-type')
+        if content_type is None:
+            return None
+        return content_type.partition(';')[0].strip().lower()
+
+    def expects_continue(self):
+        return self.DHeaders.get('expect', '').lower() == '100-continue'
+
+
+class HTTPConnectionState:
+    def __init__(self):
+        """
+        The state of a single HTTP client connection. Pipelined
+        requests can be handled at the same time, but HTTP requires
+        responses to be sent in the order of the requests, so
+        responses which are ready early are held back here.
+        """
+        self.last_request_id = 0
+        self.next_response_id = 1
+        self.DResponses = {}
+
+        # Whether a request with "Connection: close" was received,
+        # so no more requests should be read, and whether its
+        # response has been queued to be sent
+        self.closing = False
+        self.close_after_send = False
+
+        # Whether "100 Continue" has been sent for the request
+        # whose body is currently being received
+        self.sent_continue = False
+
+    def new_request_id(self):
+        self.last_request_id += 1
+        return self.last_request_id
+
+    def add_response(self, request_id, LBuffers, close):
+        """
+        Hold a response until all the responses before it are ready
+
+        :return: the buffers of the responses which can now be sent
+        """
+        self.DResponses[request_id] = (LBuffers, close)
+
+        LSend = []
+        while self.next_response_id in self.DResponses:
+            LBuffers, close = self.DResponses.pop(self.next_response_id)
+            LSend.extend(LBuffers)
+            self.next_response_id += 1
+            if close:
+                self.close_after_send = True
+                # Any later responses won't be sent
+                self.DResponses.clear()
+                break
+        return LSend
+
+
+def encode_response(status, content_type, body, keep_alive, DExtraHeaders=None):
+    """
+    :return: a list of buffers (the head, then the body),
+             so the body doesn't need to be copied
+    """
+    LHead = [
+        f'HTTP/1.1 {status} {DStatusText[status]}',
+        f'Content-Type: {content_type}',
+        f'Content-Length: {len(body)}',
+        'Connection: keep-alive' if keep_alive else 'Connection: close',
+    ]
+    if DExtraHeaders:
+        LHead.extend(f'{k}: {v}' for k, v in DExtraHeaders.items())
+    return [('\r\n'.join(LHead) + '\r\n\r\n').encode('latin-1'), body]
+
+
+def encode_error(exc, keep_alive):
+    """
+    Encode an HTTPError, or an exception raised by an RPC method
+    (as a 500 error, or 503 if the service was too busy to handle
+    the call) with the same text as speedysvc clients get
+    """
+    if isinstance(exc, HTTPError):
+        status, body = exc.status, exc.message.encode('utf-8')
+    elif isinstance(exc, ServiceBusyError):
+        status, body = 503, repr(exc).encode('utf-8')
+    else:
+        status, body = 500, repr(exc).encode('utf-8')
+
+    DExtraHeaders = {'Allow': 'POST'} if status == 405 else None
+    return encode_response(
+        status, 'text/plain; charset=utf-8', body, keep_alive, DExtraHeaders
+    )
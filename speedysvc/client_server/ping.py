@@ -0,0 +1,18 @@
+from speedysvc.serialisation.RawSerialisation import RawSerialisation
+
+
+# Clients can call this reserved method name over any transport
+# (apart from udp) to check a service is responding, and measure
+# the round trip time, without calling any of its actual methods
+PING_CMD = '__ping__'
+
+
+def ping_fn(data):
+    """
+    Stands in for an RPC method when pinging,
+    and responds with an empty result
+    """
+    return b''
+
+ping_fn.__name__ = PING_CMD
+ping_fn.serialiser = RawSerialisation
@@ -0,0 +1,69 @@
+import zlib
+from struct import Struct
+from _thread import allocate_lock
+
+from speedysvc.client_server.shared_memory.shared_params import get_or_create_mmap
+
+
+version_packer = Struct('Q')
+
+# Methods are assigned to slots by hashing their name, rather than
+# needing the server and clients to agree on a list of methods. If
+# two methods share a slot, updating one invalidates both, which
+# is wasteful, but never returns stale results.
+NUM_SLOTS = 512
+
+_DCacheVersions = {}
+_lock = allocate_lock()
+
+
+def get_cache_versions(port):
+    """
+    Get the CacheVersions of the service on a given port,
+    which is shared between all users in a process
+    """
+    with _lock:
+        if not port in _DCacheVersions:
+            _DCacheVersions[port] = CacheVersions(port)
+        return _DCacheVersions[port]
+
+
+class CacheVersions:
+    MMAP_TEMPLATE = 'service_%(port)s_versions'
+
+    def __init__(self, port):
+        """
+        A version counter for each method of a service, in shared
+        memory. Servers increment a method's counter whenever the
+        data it returns changes, and clients on the same host
+        only use results they've cached while the counter is
+        the same as when the result was requested.
+
+        Checking the version only reads 8 bytes of shared memory,
+        so cached results can be returned without any round trip
+        to the service.
+        """
+        self.port = port
+        self.mmap = get_or_create_mmap(
+            (self.MMAP_TEMPLATE % dict(port=port)).encode('ascii'),
+            NUM_SLOTS * version_packer.size
+        )
+
+    def __get_offset(self, method_name):
+        return (zlib.crc32(method_name.encode('utf-8')) % NUM_SLOTS) * version_packer.size
+
+    def get_version(self, method_name):
+        return version_packer.unpack_from(self.mmap, self.__get_offset(method_name))[0]
+
+    def bump_version(self, method_name):
+        """
+        Invalidate all results cached by clients for `method_name`.
+        If several processes bump the same method at once, the
+        counter may only be incremented once, but any change to
+        it invalidates the results.
+        """
+        offset = self.__get_offset(method_name)
+        version = version_packer.unpack_from(self.mmap, offset)[0]
+        version_packer.pack_into(
+            self.mmap, offset, (version + 1) % 0xFFFFFFFFFFFFFFFF
+        )
@@ -0,0 +1,281 @@
+import os
+import mmap
+import socket
+import secrets
+from struct import Struct
+from threading import Condition
+from _thread import start_new_thread
+
+
+# Sent before the token on the side channel, to either ask for
+# an offered file descriptor, or to hand over a file descriptor
+_GET = b'G'
+_PUT = b'P'
+token_packer = Struct('!Q')
+# struct ucred: the pid, uid and gid of the process at the other end
+ucred_packer = Struct('3i')
+
+# Only Linux has memfd_create, and abstract Unix socket addresses
+memfd_supported = (
+    hasattr(os, 'memfd_create') and
+    hasattr(socket, 'send_fds') and
+    hasattr(socket, 'AF_UNIX') and
+    hasattr(socket, 'SO_PEERCRED')
+)
+
+
+def debug(*s):
+    if False:
+        print(*s)
+
+
+def get_memfd_address(port, pid, qid):
+    """
+    Get the (abstract namespace) Unix socket address an SHMClient with
+    a given pid/qid listens on, so that server workers can send it file
+    descriptors. Abstract addresses don't need to be cleaned up from the
+    filesystem if the client exits without calling __del__.
+    """
+    return f'\0speedysvc_memfd_{port}_{pid}_{qid}'
+
+
+def new_memfd_token():
+    """
+    Get a random token to offer or push a file descriptor with. Abstract
+    Unix socket addresses can be connected to by any local process, so
+    tokens mustn't be guessable, as well as the peers being checked.
+    """
+    return secrets.randbits(64)
+
+
+def check_peer(sock, pid=None):
+    """
+    Make sure the process at the other end of a Unix socket is run by
+    the same user as this one (as the SHM resources are only accessible
+    by it), and, if `pid` is given, is that process.
+
+    :raise: PermissionError if not
+    """
+    peer_pid, peer_uid, _ = ucred_packer.unpack(sock.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, ucred_packer.size
+    ))
+    if peer_uid != os.getuid():
+        raise PermissionError(
+            f"Process {peer_pid} on the memfd channel "
+            f"is run by a different user ({peer_uid})"
+        )
+    if pid is not None and peer_pid != pid:
+        raise PermissionError(
+            f"Process {peer_pid} is listening on the memfd "
+            f"channel, rather than client process {pid}"
+        )
+
+
+def new_memfd(data):
+    """
+    Copy `data` into a new anonymous memory-backed file.
+    This is the only time the data is copied: the other
+    process maps the file, rather than reading from it.
+
+    :param data: a bytes-like object
+    :return: the file descriptor
+    """
+    fd = os.memfd_create('speedysvc', os.MFD_CLOEXEC)
+    try:
+        # Writing is considerably faster than assigning to a new
+        # mapping of the file, which page faults for every page
+        view = memoryview(data).cast('B')
+        written = 0
+        while written < len(view):
+            written += os.write(fd, view[written:])
+    except:
+        os.close(fd)
+        raise
+    return fd
+
+
+def get_file_payload(o):
+    """
+    Allow an already open file (anything with a fileno() method) to
+    be sent in place of raw bytes, so that e.g. large audio files can
+    be handed to another process without reading them into memory.
+
+    :param o: the raw data to send, or a list/tuple of length
+              1 containing it, as allowed by RawSerialisation
+    :return: (a duplicate of the file descriptor, the file size)
+             or None if `o` isn't a file
+    """
+    if isinstance(o, (list, tuple)) and len(o) == 1:
+        o = o[0]
+    if not hasattr(o, 'fileno'):
+        return None
+
+    fd = os.dup(o.fileno())
+    return fd, os.fstat(fd).st_size
+
+
+def map_fd(fd, size):
+    """
+    Map a file descriptor received from the other process as read-only,
+    closing the file descriptor (the mapping keeps the memory alive).
+    """
+    try:
+        return mmap.mmap(fd, size, access=mmap.ACCESS_READ)
+    finally:
+        os.close(fd)
+
+
+def push_fd(address, pid, token, fd):
+    """
+    Send file descriptor `fd` to the MemFDChannel at `address`, which
+    should have been created by process `pid`. The channel doesn't
+    need to accept the connection first, so this doesn't wait for
+    the other process.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(address)
+        check_peer(sock, pid)
+        socket.send_fds(sock, [_PUT + token_packer.pack(token)], [fd])
+
+
+def fetch_fd(address, pid, token):
+    """
+    Get the file descriptor offered with `token` by the
+    MemFDChannel at `address`, created by process `pid`.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(address)
+        check_peer(sock, pid)
+        sock.sendall(_GET + token_packer.pack(token))
+        _, LFds, _, _ = socket.recv_fds(sock, 1, 1)
+
+    if not LFds:
+        raise FileNotFoundError(
+            f"File descriptor for token {token} is no longer offered"
+        )
+    return LFds[0]
+
+
+class MemFDChannel:
+    def __init__(self, address):
+        """
+        A Unix socket side channel for passing file descriptors of
+        large payloads (with SCM_RIGHTS) to and from an SHMClient,
+        rather than copying the payloads through the shared mmap.
+
+        The client offers request payloads for server workers to
+        fetch, as the client doesn't know which worker will take
+        the request. Server workers push response payloads back
+        before handing the lock back to the client.
+
+        Tokens are random (see new_memfd_token()), and connections
+        from processes run by other users are refused.
+
+        :param address: from get_memfd_address()
+        """
+        self.address = address
+        self.DOffered = {}
+        self.DReceived = {}
+        self.condition = Condition()
+        self.closed = False
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(address)
+        self.sock.listen(16)
+        start_new_thread(self.__serve_loop, ())
+
+    def close(self):
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+        with self.condition:
+            for fd in list(self.DOffered.values()) + list(self.DReceived.values()):
+                os.close(fd)
+            self.DOffered.clear()
+            self.DReceived.clear()
+
+    def offer(self, token, fd):
+        """
+        Allow server workers to fetch `fd` using `token`,
+        until withdraw() is called. The channel takes
+        ownership of (and will close) the file descriptor.
+        """
+        with self.condition:
+            self.DOffered[token] = fd
+
+    def withdraw(self, token):
+        with self.condition:
+            fd = self.DOffered.pop(token, None)
+        if fd is not None:
+            os.close(fd)
+
+    def wait_for_pushed(self, token, timeout=30):
+        """
+        Wait for the file descriptor pushed with `token`.
+        It will normally already have been sent by the time
+        the server hands the lock back to the client.
+
+        :return: the file descriptor
+        """
+        with self.condition:
+            if not self.condition.wait_for(
+                lambda: token in self.DReceived, timeout
+            ):
+                raise TimeoutError(
+                    f"File descriptor for token {token} wasn't received"
+                )
+            fd = self.DReceived.pop(token)
+
+            # Any others are from calls which were abandoned
+            for stale_fd in self.DReceived.values():
+                os.close(stale_fd)
+            self.DReceived.clear()
+        return fd
+
+    def __serve_loop(self):
+        while not self.closed:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                if self.closed:
+                    return
+                raise
+
+            try:
+                with conn:
+                    check_peer(conn)
+                    conn.settimeout(5)
+                    msg, LFds, _, _ = socket.recv_fds(
+                        conn, 1 + token_packer.size, 1
+                    )
+                    if len(msg) != 1 + token_packer.size:
+                        # e.g. a worker which closed the connection
+                        # as this process wasn't the one it expected
+                        for fd in LFds:
+                            os.close(fd)
+                        continue
+                    token, = token_packer.unpack(msg[1:])
+
+                    if msg[:1] == _PUT:
+                        with self.condition:
+                            self.DReceived[token] = LFds[0]
+                            self.condition.notify_all()
+
+                    elif msg[:1] == _GET:
+                        with self.condition:
+                            fd = self.DOffered.get(token)
+                        if fd is None:
+                            conn.sendall(b'-')
+                        else:
+                            socket.send_fds(conn, [b'+'], [fd])
+                    else:
+                        debug(f"MemFDChannel: unknown command {msg[:1]}")
+            except PermissionError as exc:
+                debug(f"MemFDChannel: refused connection: {exc}")
+            except:
+                import traceback
+                traceback.print_exc()
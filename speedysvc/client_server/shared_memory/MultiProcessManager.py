@@ -12,9 +12,13 @@ from os import getpid
 from warnings import warn
 from multiprocessing import cpu_count
 
-from speedysvc.kill_pid_and_children import kill_pid_and_children
+from speedysvc.kill_pid_and_children import kill_pid_and_children, wait_for_pid
 from speedysvc.logger.std_logging.LoggerClient import LoggerClient
 from speedysvc.client_server.network.NetworkServer import NetworkServer
+from speedysvc.client_server.network.UDPServer import UDPServer
+from speedysvc.client_server.shared_memory.Zygote import Zygote
+from speedysvc.client_server.shared_memory.autoscaling import get_autoscaler
+from speedysvc.client_server.shared_memory.affinity import get_cpu_sets
 from speedysvc.client_server.shared_memory.SHMResourceManager import \
     SHMResourceManager, CONNECT_TO_EXISTING
 from speedysvc.hybrid_lock import SemaphoreDestroyedException, NoSuchSemaphoreException
@@ -47,15 +51,30 @@ class MultiProcessServer:
                  import_from, section, server_methods,
                  tcp_bind=None,
                  tcp_allow_insecure_serialisation=False,
+                 tcp_reuseport=False,
+                 unix_bind=None,
+                 udp_bind=None,
 
                  min_proc_num=1,
                  max_proc_num=cpu_count(),
                  max_proc_mem_bytes=None,
+                 worker_max_requests=None,
+                 worker_max_rss_bytes=None,
+                 worker_max_age_secs=None,
+                 zygote=False,
+                 cpu_affinity=None,
+                 max_concurrency=None,
+                 max_queued=None,
 
                  new_proc_cpu_pc=0.3,
                  new_proc_avg_over_secs=20,
                  kill_proc_avg_over_secs=240,
+                 autoscaler='cpu',
+                 autoscaler_options=None,
+                 drain_timeout_secs=60,
+                 worker_start_timeout_secs=120,
 
+                 start_quorum=None,
                  wait_until_completed=True
                  ):
         """
@@ -65,7 +84,7 @@ class MultiProcessServer:
         It also creates new children if the combined CPU usage is above
         a certain threshold for a given time period. It also removes
         children if they are below a combined CPU usage amount over
-        a given period.
+        a given period. (Or based on other stats, see `autoscaler`)
         Optionally also removed child processes if combined RAM usage
         exceeds a certain amount.
 
@@ -77,6 +96,19 @@ class MultiProcessServer:
 
         :param tcp_bind:
         :param tcp_allow_insecure_serialisation:
+        :param tcp_reuseport: if True, each worker process listens on
+                              tcp_bind itself using SO_REUSEPORT, and
+                              calls the methods directly. This avoids
+                              TCP requests going through this process
+                              before being sent to a worker over shared
+                              memory. Only supported on Linux/BSD.
+        :param unix_bind: the path of a Unix domain socket to also
+                          serve the service on, using the same protocol
+                          as tcp. tcp_allow_insecure_serialisation
+                          applies to this as well.
+        :param udp_bind: the address to also receive calls to
+                         @oneway methods on over UDP, using the
+                         same port number as tcp
 
         :param min_proc_num: the minimum number of worker processes.
                              If the number of children falls below this
@@ -84,7 +116,48 @@ class MultiProcessServer:
         :param max_proc_num: the maximum number of worker processes
         :param max_proc_mem_bytes: The maximum amount of memory all
                                    worker processes as a whole are
-                                   allowed to occupy in bytes.
+                                   allowed to occupy in bytes. If it's
+                                   exceeded, the worker using the most
+                                   memory is recycled.
+        :param worker_max_requests: recycle each worker after it has
+                                    handled around this many calls. The
+                                    counts are sent to this process every
+                                    few seconds, so workers may handle
+                                    a few more than this.
+        :param worker_max_rss_bytes: recycle workers whose resident memory
+                                     exceeds this many bytes (e.g. due to
+                                     memory leaks)
+        :param worker_max_age_secs: recycle workers after they've
+                                    been running this many seconds
+
+                                    Workers are recycled one at a time,
+                                    by starting a replacement and waiting
+                                    until it's ready before draining the
+                                    old worker, so there may be one more
+                                    than max_proc_num workers meanwhile.
+        :param zygote: if True, fork new workers from a Zygote process,
+                       which has already imported the module and called
+                       the server methods class's `preload()` hook. This
+                       means workers start much faster (which matters
+                       most when starting workers due to high load), and
+                       share the preloaded data copy-on-write.
+                       Not supported on Windows.
+        :param cpu_affinity: pin each worker to a set of CPUs. Either
+                             "numa", to pin each worker to the CPUs of a
+                             NUMA node, or the sets of CPUs as a string
+                             separated by semicolons (e.g. "0-7;8-15") or
+                             a list of sets. Workers are spread evenly
+                             between the sets. Only supported on Linux.
+        :param max_concurrency: the maximum number of calls each worker
+                                handles at once, or None for no limit.
+                                Calls over the limit wait for a free slot.
+        :param max_queued: the maximum number of calls which can wait for
+                           a free slot in each worker. Any more calls are
+                           rejected with ServiceBusyError straight away.
+                           Requests received over the network by this
+                           process are also rejected once the whole
+                           service (max_proc_num workers) would be
+                           over the limits.
 
         :param new_proc_cpu_pc: The combined CPU percentage between 0.0 and
                                 1.0, above which to start a new child worker.
@@ -94,8 +167,32 @@ class MultiProcessServer:
         :param kill_proc_avg_over_secs: The time period over which to average
                                         the combined CPU percentage when
                                         removing existing children.
-        :param wait_until_completed: Whether to block until at least one
-                                     child worker has been created.
+        :param autoscaler: decides when to add or remove workers. Either
+                           "cpu" (the default, which uses the new_proc_*
+                           and kill_proc_* parameters above), "load" (which
+                           uses the number of calls in progress, how long
+                           they wait and take etc, see LoadAutoscaler) or
+                           the import path of an AutoscalerBase subclass.
+                           Decisions are logged, and shown in the web
+                           monitor.
+        :param autoscaler_options: a dict of keyword arguments
+                                   to create the autoscaler with
+        :param drain_timeout_secs: the maximum time to wait for workers
+                                   which are being removed to finish the
+                                   requests they're handling, before
+                                   killing them
+        :param worker_start_timeout_secs: the maximum time to wait for new
+                                          workers to start during a rolling
+                                          restart, before giving up and
+                                          keeping the old workers
+
+        :param start_quorum: the number of the min_proc_num workers (which
+                             are all started at the same time) which need
+                             to be ready before the service is treated as
+                             started. Defaults to all of them. The others
+                             carry on starting in the background.
+        :param wait_until_completed: Whether to block until start_quorum
+                                     child workers have started.
                                      Useful if other services will depend on
                                      this one, but can increase service load
                                      times.
@@ -111,21 +208,50 @@ class MultiProcessServer:
 
         self.tcp_bind = tcp_bind
         self.tcp_allow_insecure_serialisation = tcp_allow_insecure_serialisation
+        self.tcp_reuseport = tcp_reuseport
+        self.unix_bind = unix_bind
+        self.udp_bind = udp_bind
 
         self.min_proc_num = min_proc_num
         self.max_proc_num = max_proc_num
         self.max_proc_mem_bytes = max_proc_mem_bytes
-
-        self.new_proc_cpu_pc = new_proc_cpu_pc
-        self.new_proc_avg_over_secs = new_proc_avg_over_secs
-        self.kill_proc_avg_over_secs = kill_proc_avg_over_secs
-
+        self.worker_max_requests = worker_max_requests
+        self.worker_max_rss_bytes = worker_max_rss_bytes
+        self.worker_max_age_secs = worker_max_age_secs
+
+        if zygote and sys.platform == 'win32':
+            warn("Zygote processes aren't supported on Windows")
+            zygote = False
+        self.use_zygote = zygote
+        self.zygote = None
+        # Whether to start workers in a new interpreter, rather
+        # than forking them from this process (which has the
+        # version of the code from when the service started)
+        self.spawn_workers = sys.platform == 'win32'
+
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_queued
+
+        # [set of CPUs, ...] or None, and {pid: index of set, ...}
+        self.LCPUSets = get_cpu_sets(cpu_affinity)
+        self.DCPUSetsByPID = {}
+        # {pid: the time the worker was started, ...}
+        self.DStartTimesByPID = {}
+
+        if autoscaler == 'cpu':
+            autoscaler_options = dict(autoscaler_options or {})
+            autoscaler_options.setdefault('new_proc_cpu_pc', new_proc_cpu_pc)
+            autoscaler_options.setdefault('new_proc_avg_over_secs', new_proc_avg_over_secs)
+            autoscaler_options.setdefault('kill_proc_avg_over_secs', kill_proc_avg_over_secs)
+        self.autoscaler = get_autoscaler(autoscaler, autoscaler_options)
+        self.drain_timeout_secs = drain_timeout_secs
+        self.worker_start_timeout_secs = worker_start_timeout_secs
+
+        if start_quorum is None:
+            start_quorum = min_proc_num
+        self.start_quorum = max(1, min(start_quorum, min_proc_num))
         self.wait_until_completed = wait_until_completed
 
-        assert 0.0 < new_proc_cpu_pc < 1.0, \
-            "The overall percentage CPU usage before starting a new " \
-            "process should be between 0.0 and 1.0 non-inclusive"
-
         # Get the SHMResourceManager to clean up
         # any previously created server processes
         # TODO: Also add capability to clean up previous MultiProcessManager's!
@@ -139,6 +265,10 @@ class MultiProcessServer:
 
         # Collect data periodically
         self.LPIDs = []
+        # Held while changing LPIDs, DCPUSetsByPID or DStartTimesByPID,
+        # as workers are added and removed by both the monitor thread
+        # and the thread which stops the service
+        self.pids_lock = _thread.allocate_lock()
         self.last_proc_op_time = 0
         self.shutting_down = False
         self.started_collecting_data = False
@@ -167,25 +297,129 @@ class MultiProcessServer:
             f"Can't start a service that isn't stopped (current status: {self.logger_client.get_service_status()})!"
         debug("SET SERVICE STATUS!")
         self.logger_client.set_service_status('starting')
+        self.shutting_down = False
 
-        for x in range(self.min_proc_num):
+        if self.use_zygote:
+            self.zygote = Zygote(
+                self.import_from, self.section, self.__get_worker_args()
+            )
+
+        # Fork all the initial workers at once, so that they start up
+        # concurrently, rather than waiting for each one in turn
+        debug("NEW CHILD PROCESSES!")
+        LNewPIDs = [self.new_child_process() for x in range(self.min_proc_num)]
+
+        if self.wait_until_completed:
             # Make sure the initial processes have booted up
             # from the main thread, so it can block as necessary
-            # (assuming wait_until_completed is set)
-            debug("NEW CHILD PROCESS!")
-            self.new_child_process()
+            self.__wait_for_start_quorum(LNewPIDs)
+        else:
+            _thread.start_new_thread(self.__wait_for_start_quorum_in_thread, (LNewPIDs,))
 
-        if self.tcp_bind:
-            def start_network_server():
-                while not self.logger_client.get_service_status() == 'started':
-                    # Wait till the SHMServer can be connected to
-                    time.sleep(0.1)
-
-                self.network_server = NetworkServer(
-                    tcp_bind_address=self.tcp_bind,
-                    server_methods=self.server_methods,
-                    force_insecure_serialisation=self.tcp_allow_insecure_serialisation
+    def __wait_for_start_quorum_in_thread(self, LNewPIDs):
+        """
+        Wait for the start quorum in the background. If it can't be
+        reached, the workers have already been stopped, so exit this
+        process - otherwise nothing would notice the service failed to
+        start, as the main thread only waits for SIGINT.
+        """
+        try:
+            self.__wait_for_start_quorum(LNewPIDs)
+        except ChildProcessError:
+            import traceback
+            traceback.print_exc()
+            self.logger_client.shutdown()
+            os._exit(1)
+
+    def __wait_for_start_quorum(self, LNewPIDs):
+        """
+        Wait until start_quorum of the workers in `LNewPIDs` are ready
+        to handle calls, then mark the service as started, and start
+        serving over the network and monitoring the workers.
+
+        :raise: ChildProcessError if so many of the workers exit
+                while starting that the quorum can't be reached,
+                in which case the service is stopped
+        """
+        SStarting = set(LNewPIDs)
+        LStarted = []
+
+        while len(LStarted) < self.start_quorum:
+            for pid in self.logger_client.get_started_workers(sorted(SStarting)):
+                SStarting.remove(pid)
+                LStarted.append(pid)
+
+            for pid in list(SStarting):
+                if (
+                    not psutil.pid_exists(pid) or
+                    psutil.Process(pid).status() == psutil.STATUS_ZOMBIE
+                ):
+                    warn(f"Worker {pid} of service {self.name} "
+                         f"exited while starting")
+                    SStarting.remove(pid)
+
+            if len(LStarted) + len(SStarting) < self.start_quorum:
+                self.logger_client.error(
+                    f"Only {len(LStarted)} of {len(LNewPIDs)} workers started, "
+                    f"which is fewer than the {self.start_quorum} needed - "
+                    f"stopping the service"
                 )
+                self.shutting_down = True
+                self.__drain_child_processes(self.LPIDs[:])
+                if self.zygote is not None:
+                    self.zygote.close()
+                    self.zygote = None
+                self.logger_client.set_service_status('stopped')
+                raise ChildProcessError(
+                    f"Too many workers of service {self.name} exited while starting"
+                )
+            elif len(LStarted) < self.start_quorum:
+                time.sleep(0.05)
+
+        debug(f"{self.server_methods.name} parent: {len(LStarted)} "
+              f"of {len(LNewPIDs)} children signaled they've initialised OK")
+        self.logger_client.set_service_status('started')
+
+        if not self.started_collecting_data:
+            # The service time series data should only start
+            # once the processes have started up
+            self.started_collecting_data = True
+            self.logger_client.start_collecting()
+
+        # Workers serve TCP themselves when using SO_REUSEPORT
+        tcp_bind = None if self.tcp_reuseport else self.tcp_bind
+
+        # Requests forwarded to the workers are limited by the capacity
+        # of the service as a whole, for both the service's limits
+        # and those of methods with @concurrency_limit
+        DLimits = {
+            'max_concurrency': self.max_concurrency,
+            'max_queued': self.max_queued,
+            'num_workers': self.max_proc_num,
+        }
+
+        if tcp_bind or self.unix_bind or self.udp_bind:
+            def start_network_server():
+                if tcp_bind:
+                    self.network_server = NetworkServer(
+                        tcp_bind_address=tcp_bind,
+                        server_methods=self.server_methods,
+                        force_insecure_serialisation=self.tcp_allow_insecure_serialisation,
+                        **DLimits
+                    )
+                if self.unix_bind:
+                    self.unix_network_server = NetworkServer(
+                        unix_socket_path=self.unix_bind,
+                        server_methods=self.server_methods,
+                        force_insecure_serialisation=self.tcp_allow_insecure_serialisation,
+                        **DLimits
+                    )
+                if self.udp_bind:
+                    self.udp_server = UDPServer(
+                        udp_bind_address=self.udp_bind,
+                        server_methods=self.server_methods,
+                        force_insecure_serialisation=self.tcp_allow_insecure_serialisation
+                    )
 
             _thread.start_new_thread(start_network_server, ())
 
@@ -202,28 +436,90 @@ class MultiProcessServer:
         self.logger_client.set_service_status('stopping')
 
         while self.LPIDs:
-            self.remove_child_process()
+            # (The monitor thread may have started a worker
+            #  before it noticed the service is stopping)
+            self.__drain_child_processes(self.LPIDs[:])
+        if self.zygote is not None:
+            self.zygote.close()
+            self.zygote = None
         self.logger_client.set_service_status('stopped')
         self.logger_client.shutdown()
 
+    def __get_worker_args(self):
+        """
+        :return: the keyword arguments for _service_worker,
+                 other than the server methods
+        """
+        return {
+            'tcp_bind': self.tcp_bind,
+            'tcp_allow_insecure_serialisation': self.tcp_allow_insecure_serialisation,
+            'tcp_reuseport': self.tcp_reuseport,
+            'max_concurrency': self.max_concurrency,
+            'max_queued': self.max_queued,
+        }
+
+    def __fork_from_zygote(self, DExtraArgs):
+        """
+        Fork a new worker from the zygote,
+        restarting the zygote if it has exited
+
+        :return: the PID of the new worker
+        """
+        try:
+            return self.zygote.fork_worker(DExtraArgs)
+        except ChildProcessError:
+            warn(f"Zygote process for service {self.name} "
+                 f"doesn't exist any more - restarting it")
+            self.zygote.close()
+            self.zygote = Zygote(
+                self.import_from, self.section, self.__get_worker_args()
+            )
+            return self.zygote.fork_worker(DExtraArgs)
+
+    def __choose_cpu_set(self):
+        """
+        :return: the index of the CPU set with the fewest
+                 workers, to spread them between NUMA nodes
+        """
+        LNumWorkers = [0] * len(self.LCPUSets)
+        for x in self.DCPUSetsByPID.values():
+            LNumWorkers[x] += 1
+        return LNumWorkers.index(min(LNumWorkers))
+
     def new_child_process(self):
         """
-        Create a new worker process
+        Create a new worker process, without waiting for it to start
+        (see is_worker_started in LoggerServer)
+
+        :return: the PID of the new worker
         """
         DEnv = os.environ.copy()
         DEnv["PATH"] = "/usr/sbin:/sbin:" + DEnv["PATH"]
-        DArgs = {
-            'import_from': self.import_from,
-            'section': self.section,
-        }
-
-        if sys.platform != 'win32':
+        DArgs = self.__get_worker_args()
+        DArgs['import_from'] = self.import_from
+        DArgs['section'] = self.section
+
+        # Arguments which are different for each worker
+        DExtraArgs = {}
+        if self.LCPUSets:
+            with self.pids_lock:
+                cpu_set = self.__choose_cpu_set()
+            DExtraArgs['cpu_affinity'] = sorted(self.LCPUSets[cpu_set])
+        DArgs.update(DExtraArgs)
+
+        if self.zygote is not None:
+            pid = self.__fork_from_zygote(DExtraArgs)
+        elif not self.spawn_workers:
             from speedysvc.client_server.shared_memory._service_worker import _service_worker
             from os import fork
 
             pid = fork()
 
             if pid == 0:  # in child
+                # Don't run this process's SIGINT handler if the
+                # worker is interrupted before it's set its own
+                signal.signal(signal.SIGINT, signal.default_int_handler)
+
                 # Note that the server_methods needs to be after to fork()
                 # in order to make sure any module-level SHMClients report
                 # correct values with getpid(), and so we won't waste
@@ -233,7 +529,22 @@ class MultiProcessServer:
                     importlib.import_module(DArgs.pop('import_from')),
                     DArgs.pop('section')
                 )
-                _service_worker(**DArgs)
+                # This may have been forked from the monitor thread,
+                # so make sure SystemExit from the worker's SIGINT
+                # handler actually exits, rather than being caught
+                exit_code = 0
+                try:
+                    _service_worker(**DArgs)
+                except SystemExit:
+                    pass
+                except:
+                    import traceback
+                    traceback.print_exc()
+                    exit_code = 1
+                finally:
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                    os._exit(exit_code)
         else:
             proc = subprocess.Popen([
                 sys.executable, '-m',
@@ -244,54 +555,177 @@ class MultiProcessServer:
 
         self.logger_client.add_pid(pid)
         self.last_proc_op_time = time.time()
-        self.LPIDs.append(pid)
+        with self.pids_lock:
+            self.LPIDs.append(pid)
+            self.DStartTimesByPID[pid] = time.time()
+            if self.LCPUSets:
+                self.DCPUSetsByPID[pid] = cpu_set
+        return pid
+
+    def remove_child_process(self, pid=None):
+        """
+        Remove process with `pid` if specified;
+        otherwise remove a random process.
 
-        def start_collecting_data():
-            while not self.logger_client.get_service_status() == 'started':
-                time.sleep(0.1)
+        The worker is drained: it stops taking new requests, finishes
+        the ones it's handling, then exits, while the other workers
+        carry on serving clients. If it doesn't exit within
+        drain_timeout_secs, it's killed.
+        """
+        if pid is None:
+            with self.pids_lock:
+                pid = random.choice(self.LPIDs)
+        self.__drain_child_processes([pid])
 
-            if not self.started_collecting_data:
-                # The service time series data should only start
-                # once the process has started up
-                self.started_collecting_data = True
-                self.logger_client.start_collecting()
+    def rolling_restart(self):
+        """
+        Replace the workers with ones running the current version of the
+        service's code, without interrupting clients. A new worker is
+        started and waited on until it's ready, then an old worker is
+        drained, one at a time, so the service never has fewer workers
+        than before. The new workers use the same SHM resources, so
+        clients carry on as normal.
+
+        If the zygote is used, a new zygote is started first (which
+        imports the new code), otherwise the new workers are started
+        in new interpreters, as this process has the old code imported.
+
+        If a new worker doesn't start (e.g. the new code raises an
+        exception), the restart stops, and the remaining old
+        workers are kept.
+
+        :return: True if all the workers were replaced, otherwise False
+        """
+        LOldPIDs = self.LPIDs[:]
+        old_zygote = self.zygote
+        old_spawn_workers = self.spawn_workers
 
-        if self.wait_until_completed:
-            debug(f"{self.server_methods.name} parent: Waiting for child to initialise...")
-            while not self.logger_client.get_service_status() == 'started':
-                time.sleep(0.1)
-            debug(f"{self.server_methods.name} parent: child signaled it has initialised OK")
+        self.logger_client.set_restart_status('restarting')
+        self.logger_client.info(
+            f"Rolling restart: replacing {len(LOldPIDs)} workers"
+        )
 
-            start_collecting_data()
-        else:
-            _thread.start_new_thread(start_collecting_data, ())
+        try:
+            if old_zygote is not None:
+                self.zygote = Zygote(
+                    self.import_from, self.section, self.__get_worker_args()
+                )
+            else:
+                self.spawn_workers = True
+
+            for old_pid in LOldPIDs:
+                self.__replace_worker(old_pid)
+        except Exception as exc:
+            if old_zygote is not None:
+                self.zygote.close()
+                self.zygote = old_zygote
+            self.spawn_workers = old_spawn_workers
+
+            num_replaced = len([i for i in LOldPIDs if i not in self.LPIDs])
+            self.logger_client.error(
+                f"Rolling restart failed after replacing {num_replaced} of "
+                f"{len(LOldPIDs)} workers - keeping the remaining old "
+                f"workers: {exc!r}"
+            )
+            self.logger_client.set_restart_status('failed')
+            return False
+
+        if old_zygote is not None:
+            old_zygote.close()
+        self.logger_client.info(
+            f"Rolling restart: replaced {len(LOldPIDs)} workers"
+        )
+        self.logger_client.set_restart_status('restarted')
+        return True
 
-    def remove_child_process(self, pid=None):
+    def __replace_worker(self, old_pid):
         """
-        Remove process with `pid` if specified;
-        otherwise remove the most recently-created process
+        Start a new worker and wait until it's ready, then drain
+        the worker with `old_pid`, so the service never has
+        fewer workers ready to handle calls than before.
+
+        :raise: ChildProcessError or TimeoutError if the new worker
+                doesn't start, in which case it's removed and the old
+                worker is kept
         """
+        new_pid = self.new_child_process()
+        try:
+            self.__wait_for_worker_started(new_pid)
+        except:
+            if new_pid in self.LPIDs:
+                self.remove_child_process(new_pid)
+            raise
 
-        # Lock the service, to make sure we don't
-        # terminate it halfway through a call!
-        LLocks = self.__get_L_locks()
-        self.__lock_locks(LLocks)
+        if old_pid in self.LPIDs:
+            # (Unless it's exited in the meantime)
+            self.remove_child_process(old_pid)
 
-        try:
-            if pid is None:
-                pid = random.choice(self.LPIDs)
+    def __wait_for_worker_started(self, pid):
+        """
+        Wait until the worker with `pid` is ready to handle calls
+
+        :raise: ChildProcessError if it exits before it's ready
+        :raise: TimeoutError if it isn't ready
+                within worker_start_timeout_secs
+        """
+        timeout_at = time.time() + self.worker_start_timeout_secs
+        while not self.logger_client.is_worker_started(pid):
+            if (
+                not psutil.pid_exists(pid) or
+                psutil.Process(pid).status() == psutil.STATUS_ZOMBIE
+            ):
+                raise ChildProcessError(f"New worker {pid} exited while starting")
+            elif time.time() > timeout_at:
+                raise TimeoutError(
+                    f"New worker {pid} didn't start within "
+                    f"{self.worker_start_timeout_secs} seconds"
+                )
+            time.sleep(0.1)
 
-            self.last_proc_op_time = time.time()
-            self.LPIDs.remove(pid)
+    def __drain_child_processes(self, LPIDs):
+        """
+        Drain the workers in `LPIDs` at the same time,
+        killing any which don't exit in time. Workers which
+        have already been removed (e.g. by the monitor thread
+        while the service is stopping) are skipped.
+        """
+        self.last_proc_op_time = time.time()
+        LDraining = []
+
+        with self.pids_lock:
+            LRemoved = []
+            for pid in LPIDs:
+                if pid not in self.LPIDs:
+                    continue
+                self.LPIDs.remove(pid)
+                self.DCPUSetsByPID.pop(pid, None)
+                self.DStartTimesByPID.pop(pid, None)
+                LRemoved.append(pid)
+
+        for pid in LRemoved:
             try:
                 self.logger_client.remove_pid(pid)
             except:
                 pass
 
             if psutil.pid_exists(pid):
-                kill_pid_and_children(pid)
-        finally:
-            self.__unlock_locks(LLocks)
+                try:
+                    # Workers drain on SIGINT (see _service_worker)
+                    os.kill(pid, signal.SIGINT)
+                    LDraining.append(pid)
+                except ProcessLookupError:
+                    pass
+
+        timeout_at = time.time() + self.drain_timeout_secs
+        for pid in LDraining:
+            try:
+                wait_for_pid(pid, timeout=max(timeout_at-time.time(), 0.01))
+            except TimeoutError:
+                warn(f"Worker {pid} of service {self.name} didn't drain "
+                     f"within {self.drain_timeout_secs} seconds - killing it")
+                if psutil.pid_exists(pid):
+                    kill_pid_and_children(pid, sigint_timeout=0.01)
+                self.__release_locks_held_by(pid)
 
     #========================================================#
     #                  Process Monitoring                    #
@@ -325,6 +759,11 @@ class MultiProcessServer:
                  resources" is set in child SHMServers)
         * Respawn in case of crashes
         """
+        if self.logger_client.get_restart_status() == 'requested':
+            # Requested using the web monitor or speedysvc.restart
+            self.rolling_restart()
+            return
+
         for pid in self.LPIDs[:]:
             try:
                 if not psutil.pid_exists(pid):
@@ -337,137 +776,145 @@ class MultiProcessServer:
                     if proc.status() == psutil.STATUS_ZOMBIE:
                         # Process no longer exists except on process table.
                         warn(f"MultiProcessManager PID {pid} for service {self.name} is a zombie - it may have crashed!")
-                        os.waitpid(pid, 0)
+                        try:
+                            os.waitpid(pid, 0)
+                        except ChildProcessError:
+                            # Forked by the zygote, which reaps it
+                            pass
                         self.remove_child_process(pid)
             except:
                 import traceback
                 traceback.print_exc()
 
-        if len(self.LPIDs) < self.min_proc_num:
+        if self.shutting_down:
+            # Don't replace the workers which are being stopped
+            return
+        elif len(self.LPIDs) < self.min_proc_num:
             # Start a new worker process if there aren't enough
             #debug(f"{self.server_methods.name}: Adding worker process due to minimum processes not satisfied")
             self.new_child_process()
             time.sleep(MONITOR_PROCESS_EVERY_SECS)
             return
 
-        DNewProcAvg = self.logger_client.get_average_over(
-            time.time() - self.new_proc_avg_over_secs, time.time()
-        )
-        DRemoveProcAvg = self.logger_client.get_average_over(
-            time.time() - self.kill_proc_avg_over_secs, time.time()
-        )
-        DLastRecord = self.logger_client.get_last_record()
-        time_since_last_op = time.time()-self.last_proc_op_time
-        #debug(f"{self.server_methods.name} DNEWPROCAVG:", DNewProcAvg)
+        recycle = self.__get_worker_to_recycle()
+        if recycle is not None:
+            # Replace one worker at a time which is over its limits
+            pid, reason = recycle
+            self.logger_client.info(f"Recycling worker {pid}: {reason}")
+            try:
+                self.__replace_worker(pid)
+            except (ChildProcessError, TimeoutError) as exc:
+                self.logger_client.error(
+                    f"Couldn't recycle worker {pid} as its "
+                    f"replacement didn't start: {exc!r}"
+                )
+            return
 
-        if not DNewProcAvg or not DRemoveProcAvg:
-            #debug("NOT DNewProcAvg/DRemoveProcAvg!!!!")
-            time.sleep(MONITOR_PROCESS_EVERY_SECS)
+        time_since_last_op = time.time()-self.last_proc_op_time
+        DDecision = self.autoscaler.decide(
+            self.logger_client, len(self.LPIDs),
+            self.min_proc_num, self.max_proc_num,
+            time_since_last_op
+        )
+        if DDecision is None:
             return
 
-        if (
-            self.max_proc_mem_bytes is not None and
-            DLastRecord['physical_mem'] > self.max_proc_mem_bytes  # What about virtual memory?? ==============
-        ):
-            # Reap processes until we don't exceed
-            # the maximum amount of memory
-            #debug(f"{self.server_methods.name}: Removing process due to memory exceeded")
-            self.remove_child_process()
+        # Log the decision, so it can be audited
+        self.logger_client.info(
+            f"Autoscaler: {DDecision['from_workers']}->{DDecision['to_workers']} "
+            f"workers: {DDecision['reason']}"
+        )
+        self.logger_client.add_scaling_decision(DDecision)
 
-        elif (
-            time_since_last_op > self.new_proc_avg_over_secs and
-            (DNewProcAvg['cpu_usage_pc'] / DNewProcAvg['num_processes']) >
-                (self.new_proc_cpu_pc * 100.0) and
-            len(self.LPIDs) < self.max_proc_num
-        ):
-            # Start a new worker process if the CPU usage is higher
-            # than a certain amount over the provided period
-            # new_proc_avg_over_secs
-            #debug(f"{self.server_methods.name}: Adding worker process due to CPU higher than "
-            #      f"{int(self.new_proc_cpu_pc*100)}% over {self.new_proc_avg_over_secs} seconds")
+        if DDecision['to_workers'] > len(self.LPIDs):
             self.new_child_process()
-
-        elif (
-            time_since_last_op > self.kill_proc_avg_over_secs and
-            DRemoveProcAvg['cpu_usage_pc'] < (self.new_proc_cpu_pc * 100.0) and
-            len(self.LPIDs) > self.min_proc_num
-        ):
-            # Reduce the number of workers if they aren't being
-            # used over an extended period
-            #debug(f"{self.server_methods.name}: Removing process due to CPU lower than "
-            #      f"{int(self.new_proc_cpu_pc*100)}% over {self.kill_proc_avg_over_secs} seconds")
+        else:
             self.remove_child_process()
 
+    def __get_worker_to_recycle(self):
+        """
+        :return: (pid, reason) of the worker which has gone the
+                 furthest over its limits, or None if none have
+        """
+        LOver = []  # [(amount over the limit, pid, reason), ...]
+        LPIDs = self.LPIDs[:]
+
+        if self.worker_max_age_secs is not None:
+            for pid in LPIDs:
+                age = time.time() - self.DStartTimesByPID.get(pid, time.time())
+                if age > self.worker_max_age_secs:
+                    LOver.append((
+                        age / self.worker_max_age_secs, pid,
+                        f"running for {age:.0f} seconds"
+                    ))
+
+        if self.worker_max_requests is not None:
+            for pid, num_requests in self.logger_client.get_num_requests_by_pid():
+                if pid in LPIDs and num_requests > self.worker_max_requests:
+                    LOver.append((
+                        num_requests / self.worker_max_requests, pid,
+                        f"handled {num_requests} calls"
+                    ))
+
+        if self.worker_max_rss_bytes is not None or \
+                self.max_proc_mem_bytes is not None:
+            DRSS = {}
+            for pid in LPIDs:
+                try:
+                    DRSS[pid] = psutil.Process(pid).memory_info().rss
+                except psutil.NoSuchProcess:
+                    pass
+
+            if self.worker_max_rss_bytes is not None:
+                for pid, rss in DRSS.items():
+                    if rss > self.worker_max_rss_bytes:
+                        LOver.append((
+                            rss / self.worker_max_rss_bytes, pid,
+                            f"using {rss // 1024 // 1024}MB of memory"
+                        ))
+
+            DLastRecord = self.logger_client.get_last_record()
+            if (
+                self.max_proc_mem_bytes is not None and
+                DLastRecord and DRSS and
+                DLastRecord['physical_mem'] > self.max_proc_mem_bytes
+            ):
+                # Recycle the largest worker, rather than
+                # reducing the number of workers
+                pid = max(DRSS, key=lambda pid: DRSS[pid])
+                LOver.append((
+                    DLastRecord['physical_mem'] / self.max_proc_mem_bytes, pid,
+                    f"using the most memory ({DRSS[pid] // 1024 // 1024}MB) "
+                    f"of the workers, which are using "
+                    f"{DLastRecord['physical_mem'] // 1024 // 1024}MB combined"
+                ))
+
+        if not LOver:
+            return None
+        _, pid, reason = max(LOver)
+        return pid, reason
+
     #========================================================#
-    #              Acquire/Release Server Locks              #
+    #           Release Locks Held by Killed Workers         #
     #========================================================#
 
-    def __get_L_locks(self):
+    def __release_locks_held_by(self, pid):
         """
-
-        :return:
+        Unlock any client locks a worker which was killed before it
+        finished draining was holding, so the requests it was handling
+        are picked up by the other workers rather than the clients
+        waiting forever
         """
-        L = []
-        for pid, qid in self.resource_manager.get_client_pids():
+        for client_pid, qid in self.resource_manager.get_client_pids():
             try:
-                client_lock = self.resource_manager.get_lock(pid, qid, CONNECT_TO_EXISTING)
-                L.append(client_lock)
+                lock = self.resource_manager.get_lock(client_pid, qid, CONNECT_TO_EXISTING)
+                if lock.get_pid_holding_lock() == pid:
+                    warn(f"Releasing lock for client {client_pid}:{qid} of service "
+                         f"{self.name} held by killed worker {pid}")
+                    lock.unlock()
             except (NoSuchSemaphoreException,
                     SemaphoreDestroyedException):
                 pass
-        return L
-
-    def __lock_locks(self, LLocks):
-        """
-
-        :param LLocks:
-        :return:
-        """
-        for lock in LLocks:
-            try:
-                # Unlock locks which are held by dead PIDs!
-                should_clean_up = False
-                pid = lock.get_pid_holding_lock()
-                if pid == -1:
-                    continue  # HACK!!!! ======================================================================================================
-
-                if not psutil.pid_exists(pid):
-                    should_clean_up = True
-                else:
-                    try:
-                        proc = psutil.Process(pid)
-                        if proc.status() == psutil.STATUS_ZOMBIE:
-                            should_clean_up = True
-                    except:
-                        pass
-
-                if should_clean_up:
-                    try: lock.unlock()
-                    except: pass
-
-                lock.lock()
-            except SemaphoreDestroyedException:
-                pass
-            except:
-                pass
-                #import traceback
-                #traceback.print_exc()
-
-    def __unlock_locks(self, LLocks):
-        """
-
-        :param LLocks:
-        :return:
-        """
-        for lock in LLocks:
-            try:
-                lock.unlock()
-            except SemaphoreDestroyedException:
-                pass
-            except:
-                pass
-                #import traceback
-                #traceback.print_exc()
 
 
 if __name__ == '__main__':
@@ -12,3 +12,20 @@ class SHMBase:
     # length of response [0-4GB]
     response_serialiser = Struct('!cI')
 
+    # Flags which can be set in the command length of requests
+    # (which are otherwise only up to 255): whether the client can
+    # receive large responses via memfd, and whether the arguments
+    # were sent via memfd, in which case they're memfd_serialiser.
+    # Responses sent via memfd have status b'M'.
+    MEMFD_ACCEPTED = 0x8000
+    MEMFD_ARGS = 0x4000
+    MEMFD_FLAGS = MEMFD_ACCEPTED | MEMFD_ARGS
+
+    # Encoder for payloads sent via memfd:
+    # token to get the file descriptor using,
+    # length of the payload
+    memfd_serialiser = Struct('!QQ')
+
+    # Payloads of at least this size are sent via memfd,
+    # if the client enabled it
+    memfd_threshold = 16 * 1024 * 1024
@@ -1,3 +1,4 @@
+import math
 import time
 import atexit
 import _thread
@@ -7,6 +8,10 @@ from speedysvc.serialisation.RawSerialisation import RawSerialisation
 from speedysvc.client_server.shared_memory.SHMBase import SHMBase
 from speedysvc.client_server.shared_memory.shared_params import INVALID, SERVER, CLIENT
 from speedysvc.client_server.shared_memory.SHMResourceManager import SHMResourceManager
+from speedysvc.client_server.shared_memory.CacheVersions import get_cache_versions
+from speedysvc.client_server.shared_memory.MemFDChannel import MemFDChannel, \
+    memfd_supported, get_memfd_address, new_memfd, new_memfd_token, \
+    get_file_payload, map_fd
 from speedysvc.client_server.base_classes.ClientProviderBase import ClientProviderBase
 
 
@@ -28,6 +33,15 @@ class ResendError(Exception):
     pass
 
 
+class ResponseTimeoutError(TimeoutError):
+    """
+    Raised if the server didn't respond within the timeout given to
+    send(). The server may still be handling the call (and respond
+    later), so the client can't be used for other calls after this.
+    """
+    pass
+
+
 def debug(*s):
     if False:
         print(*s)
@@ -35,8 +49,21 @@ def debug(*s):
 
 class SHMClient(ClientProviderBase, SHMBase):
     def __init__(self, server_methods, port=None,
-                 use_spinlock=True, use_in_process_lock=True):
-
+                 use_spinlock=True, use_in_process_lock=True,
+                 use_memfd=False, memfd_threshold=None):
+        """
+        :param use_memfd: whether to send payloads of at least
+                          `memfd_threshold` bytes (in either direction)
+                          via memfd over a Unix socket side channel, rather
+                          than copying them through the shared mmap. The
+                          payload is written once, and the other process
+                          maps it read-only. Raw methods then receive
+                          (and return to this client) a read-only
+                          memoryview, rather than bytes. Open files can
+                          also be passed to raw methods in place of bytes,
+                          to send them without reading them. Linux only.
+        :param memfd_threshold: defaults to SHMBase.memfd_threshold
+        """
         self.pid = getpid()
         self.use_spinlock = use_spinlock
         self._in_process_lock = _thread.allocate_lock()
@@ -57,6 +84,16 @@ class SHMClient(ClientProviderBase, SHMBase):
         self.cleaned_up = False
         self.use_in_process_lock = use_in_process_lock
 
+        self.memfd_channel = None
+        if use_memfd:
+            if not memfd_supported:
+                raise NotImplementedError("memfd is only supported on Linux")
+            if memfd_threshold is not None:
+                self.memfd_threshold = memfd_threshold
+            self.memfd_channel = MemFDChannel(
+                get_memfd_address(self.port, getpid(), self.qid)
+            )
+
         # Add a handler for when the program is exiting to reduce the probability of
         # resources being left over when __del__ isn't called in time
         atexit.register(self.__del__)
@@ -66,11 +103,16 @@ class SHMClient(ClientProviderBase, SHMBase):
         Clean up resources and tell server
         workers this qid no longer exists
         """
+        if getattr(self, 'memfd_channel', None) and not self.memfd_channel.closed:
+            self.memfd_channel.close()
         self.resource_manager.unlink_resources(getpid(), self.qid)
 
     def get_server_methods(self):
         return self.server_methods
 
+    def get_cache_versions(self):
+        return get_cache_versions(self.port)
+
     def send(self, cmd, args, timeout=-1):
         if self.use_in_process_lock:
             with self._in_process_lock:
@@ -99,6 +141,12 @@ class SHMClient(ClientProviderBase, SHMBase):
                     continue
 
     def _send(self, cmd, args, timeout=-1):
+        """
+        :param timeout: the maximum number of seconds to wait for the
+                        response (rounded up to whole seconds), or -1
+                        to wait indefinitely
+        :raise: ResponseTimeoutError if the timeout was exceeded
+        """
         if isinstance(cmd, bytes):
             # cmd -> a bytes object, most likely heartbeat or shutdown
             serialiser = RawSerialisation
@@ -111,9 +159,50 @@ class SHMClient(ClientProviderBase, SHMBase):
         # (I've put the encoding/decoding outside the critical area,
         #  so as to potentially allow for more remote commands from
         #  different threads)
-        args = serialiser.dumps(args)
-        encoded_request = \
-            self.request_serialiser.pack(len(cmd), len(args)) + cmd + args
+        if self.memfd_channel:
+            args, memfd_token, cmd_flags = self.__offer_memfd(serialiser, args)
+        else:
+            args = serialiser.dumps(args)
+            memfd_token, cmd_flags = None, 0
+
+        try:
+            return self.__send_encoded(serialiser, cmd, cmd_flags, args, timeout)
+        finally:
+            if memfd_token is not None:
+                # The server will have mapped it by now
+                self.memfd_channel.withdraw(memfd_token)
+
+    def __offer_memfd(self, serialiser, args):
+        """
+        Encode the arguments, offering them to the server
+        via memfd if they're large (or an open file)
+
+        :return: (the encoded arguments, the memfd token
+                  or None, the flags to add to the command length)
+        """
+        cmd_flags = self.MEMFD_ACCEPTED
+        file_payload = None
+        if serialiser == RawSerialisation:
+            file_payload = get_file_payload(args)
+
+        if file_payload is None:
+            args = serialiser.dumps(args)
+            if len(args) < self.memfd_threshold:
+                return args, None, cmd_flags
+            fd, size = new_memfd(args), len(args)
+        else:
+            fd, size = file_payload
+
+        memfd_token = new_memfd_token()
+        self.memfd_channel.offer(memfd_token, fd)
+        args = self.memfd_serialiser.pack(memfd_token, size)
+        return args, memfd_token, cmd_flags | self.MEMFD_ARGS
+
+    def __send_encoded(self, serialiser, cmd, cmd_flags, args, timeout=-1):
+        header = self.request_serialiser.pack(len(cmd) | cmd_flags, len(args))
+        # The parts are written to the mmap separately, so
+        # that large arguments aren't copied an extra time
+        request_len = len(header) + len(cmd) + len(args)
 
         # Next line must be in critical area!
         mmap = self.mmap
@@ -122,11 +211,14 @@ class SHMClient(ClientProviderBase, SHMBase):
             raise Exception()
 
         # Send the result to the server!
-        if len(encoded_request) >= len(mmap)-1:
-            mmap = self.mmap = self.__resize_mmap(mmap, encoded_request)
+        if request_len >= len(mmap)-1:
+            mmap = self.mmap = self.__resize_mmap(mmap, request_len)
 
-        assert len(mmap) > len(encoded_request), (len(mmap), len(encoded_request))
-        mmap[1:1+len(encoded_request)] = encoded_request
+        assert len(mmap) > request_len, (len(mmap), request_len)
+        offset = 1
+        for part in (header, cmd, args):
+            mmap[offset:offset+len(part)] = part
+            offset += len(part)
 
         # Wait for the server to begin processing
         mmap[0] = SERVER
@@ -137,11 +229,22 @@ class SHMClient(ClientProviderBase, SHMBase):
         # Make sure response state ok,
         # reconnecting to mmap if resized
         num_times = 0
+        if timeout != -1:
+            deadline = time.time() + timeout
 
         while True:
             if not num_times:
                 #debug("LOCKING CLIENT LOCK <- SERVER!", mmap[0] == SERVER, mmap[0] == CLIENT, cmd)
-                self.lock.lock(timeout=-1, spin=int(self.use_spinlock))
+                if timeout == -1:
+                    self.lock.lock(timeout=-1, spin=int(self.use_spinlock))
+                else:
+                    try:
+                        self.lock.lock(
+                            timeout=max(1, math.ceil(deadline - time.time())),
+                            spin=int(self.use_spinlock)
+                        )
+                    except TimeoutError:
+                        raise self.__response_timeout_error(timeout)
                 #debug("LOCKED!")
 
             if mmap[0] == CLIENT:
@@ -155,6 +258,8 @@ class SHMClient(ClientProviderBase, SHMBase):
             elif mmap[0] == SERVER:
                 # Server hasn't caught the request yet!
                 self.lock.unlock()
+                if timeout != -1 and time.time() > deadline:
+                    raise self.__response_timeout_error(timeout)
                 continue
             else:
                 raise Exception("Unknown state: %s" % chr(mmap[0]))
@@ -171,19 +276,34 @@ class SHMClient(ClientProviderBase, SHMBase):
             return serialiser.loads(response_data)
         elif response_status == b'-':
             self._handle_exception(response_data)
+        elif response_status == b'M':
+            # The server sent the result via memfd
+            memfd_token, memfd_size = self.memfd_serialiser.unpack(response_data)
+            fd = self.memfd_channel.wait_for_pushed(memfd_token)
+            response_map = map_fd(fd, memfd_size)
+
+            if serialiser == RawSerialisation:
+                return memoryview(response_map)
+            return serialiser.loads(response_map[:])
         else:
             raise Exception("Unknown status response %s" % response_status)
 
-    def __resize_mmap(self, mmap, encoded_request):
+    def __response_timeout_error(self, timeout):
+        return ResponseTimeoutError(
+            f"Service {self.server_methods.name} didn't "
+            f"respond within {timeout} seconds"
+        )
+
+    def __resize_mmap(self, mmap, request_len):
         """
 
         :param mmap:
-        :param encoded_request:
+        :param request_len:
         :return:
         """
         #debug(f"[pid {getpid()}:qid {self.qid}] "
         #      f"Client: Recreating memory map to be at "
-        #      f"least {len(encoded_request)} bytes")
+        #      f"least {request_len} bytes")
 
         old_mmap_size = len(mmap)
         old_mmap_statuscode = mmap[0]
@@ -196,14 +316,14 @@ class SHMClient(ClientProviderBase, SHMBase):
 
         # Assign the new mmap
         mmap = self.resource_manager.create_pid_mmap(
-            min_size=len(encoded_request) * 2, pid=getpid(), qid=self.qid
+            min_size=request_len * 2, pid=getpid(), qid=self.qid
         )
         assert len(mmap) > old_mmap_size, (old_mmap_size, len(mmap))
         mmap[0] = old_mmap_statuscode
         assert mmap[0] != INVALID
 
         #debug(f"Client: New mmap size is {len(mmap)} bytes "
-        #      f"for encoded_request length {len(encoded_request)}")
+        #      f"for request length {request_len}")
         return mmap
 
     def __reconnect_to_mmap(self, mmap):
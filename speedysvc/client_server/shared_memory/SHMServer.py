@@ -1,14 +1,22 @@
+import os
 import sys
 import time
 import traceback
 from os import getpid
-from _thread import start_new_thread
+from _thread import start_new_thread, allocate_lock
 
 from speedysvc.client_server.base_classes.ServerProviderBase import ServerProviderBase
 from speedysvc.serialisation.RawSerialisation import RawSerialisation
 from speedysvc.client_server.shared_memory.SHMBase import SHMBase
 from speedysvc.client_server.shared_memory.shared_params import INVALID, SERVER, CLIENT
 from speedysvc.client_server.shared_memory.SHMResourceManager import SHMResourceManager
+from speedysvc.client_server.shared_memory.MemFDChannel import \
+    get_memfd_address, new_memfd, new_memfd_token, get_file_payload, \
+    map_fd, push_fd, fetch_fd
+from speedysvc.client_server.batch_encoding import BATCH_CMD, batch_fn
+from speedysvc.client_server.ping import PING_CMD, ping_fn
+from speedysvc.client_server.admission import ServiceBusyError
+from speedysvc.client_server.shared_memory.affinity import get_numa_node
 from speedysvc.hybrid_lock import NoSuchSemaphoreException, SemaphoreDestroyedException, SemaphoreExistsException
 
 
@@ -43,17 +51,22 @@ def debug(*s):
 
 
 class SHMServer(SHMBase, ServerProviderBase):
-    def __init__(self, server_methods, use_spinlock=True):
+    def __init__(self, server_methods, use_spinlock=True,
+                 max_concurrency=None, max_queued=None):
         # NOTE: init_resources should only be called if creating from scratch -
         # if connecting to an existing socket, init_resources should be False!
-        ServerProviderBase.__init__(self, server_methods)
+        # max_concurrency/max_queued limit the calls this worker handles
+        # at once, with each client's calls being in their own thread
+        # (see AdmissionControl)
+        ServerProviderBase.__init__(
+            self, server_methods, max_concurrency, max_queued
+        )
 
         debug(f'{server_methods.name}:{server_methods.port}: Starting new SHMServer on port:',
               server_methods.port)
 
         self.port = server_methods.port
         self.shut_me_down = False
-        self.shutdown_ok = False
         self.use_spinlock = use_spinlock
 
         """
@@ -61,6 +74,10 @@ class SHMServer(SHMBase, ServerProviderBase):
          current processes which are associated with this service.
         """
         self.SPIDThreads = set()
+        self.num_threads = 0
+        self.num_threads_lock = allocate_lock()
+        # The NUMA node this worker is pinned to (if any)
+        self.numa_node = get_numa_node()
         self.resource_manager = SHMResourceManager(server_methods.port, server_methods.name)
         self.resource_manager.check_for_missing_pids()
         self.resource_manager.add_server_pid(getpid())
@@ -70,15 +87,21 @@ class SHMServer(SHMBase, ServerProviderBase):
             _monitor_pids_started[0] = True
             start_new_thread(_monitor_pids, ())
 
-    def shutdown(self):
+    def shutdown(self, timeout=30):
+        """
+        Drain this server: stop taking new requests, and wait for the
+        ones which are being handled to finish. Clients' requests will
+        be handled by the other worker processes in the meantime.
+
+        :param timeout: the maximum number of seconds to wait
+        """
         self.shut_me_down = True
 
-        while True:
+        t_from = time.time()
+        while self.num_threads and time.time() - t_from < timeout:
+            # Each client's thread returns before taking its next request
             try:
-                while not self.shutdown_ok:
-                    time.sleep(0.05)
-                    continue
-                break
+                time.sleep(0.05)
             except KeyboardInterrupt:
                 pass  # HACK!
 
@@ -118,6 +141,15 @@ class SHMServer(SHMBase, ServerProviderBase):
         Connect to the shared mmap space/client+server semaphores.
         Continuously poll for commands, responding as needed.
         """
+        with self.num_threads_lock:
+            self.num_threads += 1
+        try:
+            self.__serve_client(pid, qid)
+        finally:
+            with self.num_threads_lock:
+                self.num_threads -= 1
+
+    def __serve_client(self, pid, qid):
         try:
             mmap, lock = self.resource_manager.open_existing_resources(pid, qid)
         except (NoSuchSemaphoreException, FileNotFoundError):
@@ -130,6 +162,13 @@ class SHMServer(SHMBase, ServerProviderBase):
               f"thread for pid {pid} subid {qid}")
         do_spin = True
 
+        # Don't spin waiting for clients pinned to a different NUMA node.
+        # Workers on the client's node spin, so normally take its calls
+        # first, keeping its mmap (which is allocated on the node that
+        # first writes to it) and the data it's sent local to one node.
+        # Calls are still handled here if there's no worker free there.
+        spin_ok = not self.__is_remote_client(pid)
+
         while True:
             if not (pid, qid) in self.SPIDThreads:
                 # PID no longer exists, so don't continue to loop
@@ -140,14 +179,13 @@ class SHMServer(SHMBase, ServerProviderBase):
                 except KeyError:
                     pass
 
-                self.shutdown_ok = not len(self.SPIDThreads)
                 debug(f"Signal to shutdown SHMServer {self.name} "
                       f"in worker thread for pid {pid} subid {qid} caught: "
                       f"returning ({len(self.SPIDThreads)} remaining)")
                 return
 
             try:
-                do_spin, mmap = self.handle_command(mmap, lock, pid, qid, do_spin)
+                do_spin, mmap = self.handle_command(mmap, lock, pid, qid, do_spin and spin_ok)
             except SemaphoreDestroyedException:
                 # In this case, the lock was likely destroyed by the client
                 # and should propagate the error, rather than forever logging
@@ -162,10 +200,25 @@ class SHMServer(SHMBase, ServerProviderBase):
                 # AssertionError.
                 raise
 
+    def __is_remote_client(self, pid):
+        """
+        :return: whether the client with `pid` is pinned to
+                 a different NUMA node to this process
+        """
+        if self.numa_node is None:
+            return False
+        client_numa_node = get_numa_node(pid)
+        return client_numa_node is not None and client_numa_node != self.numa_node
+
     def handle_command(self, mmap, lock, pid, qid, do_spin):
         #debug("SERVER LOCK:", pid, qid, do_spin)
         try:
-            lock.lock(timeout=4, spin=int(do_spin and self.use_spinlock))
+            # Don't spin if this worker has no free slots for calls, so
+            # that workers which do are more likely to take the call
+            lock.lock(timeout=4, spin=int(
+                do_spin and self.use_spinlock and
+                not self.admission_control.is_saturated()
+            ))
             do_spin = True
         except TimeoutError:
             # Disable spinning for subsequent tries!
@@ -204,30 +257,76 @@ class SHMServer(SHMBase, ServerProviderBase):
             # Get the command+parameters
             size = self.request_serialiser.size
             cmd_len, args_len = self.request_serialiser.unpack(mmap[1:1 + self.request_serialiser.size])
+            memfd_flags = cmd_len & self.MEMFD_FLAGS
+            cmd_len &= ~self.MEMFD_FLAGS
             cmd = mmap[1+size : 1+size+cmd_len].decode('ascii')
             args = mmap[1+size+cmd_len : 1+size+cmd_len+args_len]
 
+            self.load_stats.started()
             try:
                 # Handle the command
-                fn = getattr(self.server_methods, cmd)
+                if cmd == BATCH_CMD:
+                    fn = batch_fn
+                elif cmd == PING_CMD:
+                    fn = ping_fn
+                else:
+                    fn = getattr(self.server_methods, cmd)
                 serialiser = fn.serialiser
-                if serialiser == RawSerialisation:
-                    result = serialiser.dumps(fn(args))
+                if memfd_flags & self.MEMFD_ARGS:
+                    args = self.__get_memfd_args(pid, qid, serialiser, args)
+
+                # Wait for a free slot if the service or method is at
+                # its concurrency limit, or reject the call straight
+                # away if too many calls are already waiting
+                LLimits = () if fn is ping_fn else \
+                    self.admission_control.acquire(cmd, fn)
+                try:
+                    if fn is batch_fn:
+                        # Several calls sent at once by a BatchingClient
+                        result = self.handle_batch(args)
+                        file_payload = None
+                    elif getattr(fn, 'singleflight', False) and \
+                            not memfd_flags & self.MEMFD_ARGS:
+                        result = self.call_method(fn, cmd, args)
+                        file_payload = None
+                    elif serialiser == RawSerialisation:
+                        result = self.call_fn(fn, args)
+                        if memfd_flags & self.MEMFD_ACCEPTED:
+                            # Files can be returned to clients which use memfd
+                            file_payload = get_file_payload(result)
+                        else:
+                            file_payload = None
+
+                        if file_payload is None:
+                            result = serialiser.dumps(result)
+                    else:
+                        result = serialiser.dumps(self.call_fn(fn, *serialiser.loads(args)))
+                        file_payload = None
+                finally:
+                    self.admission_control.release(LLimits)
+
+                if file_payload is not None or (
+                    memfd_flags & self.MEMFD_ACCEPTED and
+                    len(result) >= self.memfd_threshold
+                ):
+                    encoded = self.__push_memfd_result(pid, qid, result, file_payload)
                 else:
-                    result = serialiser.dumps(fn(*serialiser.loads(args)))
-
-                encoded = self.response_serialiser.pack(b'+', len(result)) + result
+                    encoded = self.response_serialiser.pack(b'+', len(result)) + result
 
             except Exception as exc:
-                # Output to stderr log for the service
-                sys.stderr.write(f"Service {self.name} error handling method: {fn}\n")
-                traceback.print_exc()
+                if not isinstance(exc, ServiceBusyError):
+                    # Output to stderr log for the service (but not for
+                    # rejected calls, which could be many under overload)
+                    sys.stderr.write(f"Service {self.name} error handling method: {fn}\n")
+                    traceback.print_exc()
 
                 # Just send a basic Exception instance for now, but would be nice
                 # if could recreate some kinds of exceptions on the other end
                 result = b'-' + repr(exc).encode('utf-8')
                 encoded = self.response_serialiser.pack(b'-', len(result)) + result
 
+            self.load_stats.finished(time.time() - t_from)
+
             # Resize the mmap as needed
             if len(encoded) >= len(mmap)-1:
                 mmap = self.__resize_mmap(pid, qid, mmap, encoded)
@@ -245,6 +344,43 @@ class SHMServer(SHMBase, ServerProviderBase):
             lock.unlock()
         return do_spin, mmap
 
+    def __get_memfd_args(self, pid, qid, serialiser, args):
+        """
+        Map the arguments the client sent via memfd read-only.
+        Raw methods are given a memoryview of the mapping,
+        so that the arguments aren't copied at all.
+        """
+        memfd_token, memfd_size = self.memfd_serialiser.unpack(args)
+        fd = fetch_fd(get_memfd_address(self.port, pid, qid), pid, memfd_token)
+        args_map = map_fd(fd, memfd_size)
+
+        if serialiser == RawSerialisation:
+            return memoryview(args_map)
+        return args_map[:]
+
+    def __push_memfd_result(self, pid, qid, result, file_payload):
+        """
+        Send the result to the client via memfd, before the lock is
+        handed back to it, so the client won't need to wait for it.
+
+        :return: the encoded response to put in the mmap
+        """
+        if file_payload is None:
+            fd, size = new_memfd(result), len(result)
+        else:
+            fd, size = file_payload
+
+        memfd_token = new_memfd_token()
+        try:
+            push_fd(get_memfd_address(self.port, pid, qid), pid, memfd_token, fd)
+        finally:
+            os.close(fd)
+
+        return (
+            self.response_serialiser.pack(b'M', self.memfd_serialiser.size) +
+            self.memfd_serialiser.pack(memfd_token, size)
+        )
+
     def __resize_mmap(self, pid, qid, mmap, encoded):
         #debug(
         #    f"[pid {pid}:qid {qid}] "
@@ -0,0 +1,59 @@
+from _thread import allocate_lock
+
+
+class _Flight:
+    __slots__ = ('result', 'exc', 'done_lock')
+
+    def __init__(self):
+        self.result = None
+        self.exc = None
+
+        # Released by the thread making the call once it's done
+        self.done_lock = allocate_lock()
+        self.done_lock.acquire()
+
+
+class SingleFlight:
+    def __init__(self):
+        """
+        Collapses identical calls which are in progress at the same
+        time, so that only the first one is actually made, and the
+        rest wait for, and share, its result (or exception).
+
+        This is only for calls which happen to overlap: results
+        aren't cached once the call completes.
+        """
+        self.lock = allocate_lock()
+        self.DInFlight = {}
+
+    def do(self, key, call):
+        """
+        :param key: a hashable key for the call, e.g. the
+                    method name and the encoded arguments
+        :param call: a function which makes the call
+        :return: the return value of `call`
+        """
+        with self.lock:
+            flight = self.DInFlight.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self.DInFlight[key] = _Flight()
+
+        if is_leader:
+            try:
+                flight.result = call()
+            except Exception as exc:
+                flight.exc = exc
+            finally:
+                with self.lock:
+                    del self.DInFlight[key]
+                flight.done_lock.release()
+        else:
+            # Wait for the first call, letting the
+            # next thread waiting on it continue too
+            flight.done_lock.acquire()
+            flight.done_lock.release()
+
+        if flight.exc is not None:
+            raise flight.exc
+        return flight.result
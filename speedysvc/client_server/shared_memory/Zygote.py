@@ -0,0 +1,216 @@
+import os
+import gc
+import sys
+import json
+import signal
+import struct
+import importlib
+import traceback
+import subprocess
+from sys import argv
+from _thread import allocate_lock
+
+
+_pid_packer = struct.Struct('!i')
+# Fork requests are the length of the JSON-encoded
+# keyword arguments for that worker, then the JSON
+_len_packer = struct.Struct('!I')
+
+
+def debug(*s):
+    if False:
+        print(*s)
+
+
+def _read_exactly(fd, amount):
+    """
+    Read `amount` bytes from a pipe, or less if it was closed
+    """
+    data = b''
+    while len(data) < amount:
+        add_data = os.read(fd, amount - len(data))
+        if not add_data:
+            break
+        data += add_data
+    return data
+
+
+class Zygote:
+    def __init__(self, import_from, section, DWorkerArgs):
+        """
+        A template worker process, which imports the service's module
+        and calls the server methods class's `preload()` hook (if it has
+        one) only once. New workers are forked from it, rather than from
+        the MultiProcessManager, so they start straight away without
+        repeating the imports/preloading, and share the pages which
+        were loaded copy-on-write.
+
+        The objects which were created while preloading are moved out of
+        the garbage collector's generations with gc.freeze(), so that the
+        collector doesn't write to (and so copy) the shared pages.
+
+        Note the zygote is a single-threaded process which waits for fork
+        requests over a pipe, so the module and `preload()` shouldn't start
+        threads or connect to other services - that should be left to the
+        server methods' constructor, which is run in each worker.
+
+        The zygote is started in a new interpreter rather than forked from
+        the MultiProcessManager (which has already imported the module), so
+        creating a new Zygote loads the current version of the service's
+        code, e.g. for a rolling restart.
+
+        :param import_from: the module to import the server methods from
+        :param section: the server methods class name
+        :param DWorkerArgs: the keyword arguments to pass on
+                            to _service_worker in each worker
+        """
+        assert sys.platform != 'win32', \
+            "Zygote processes require fork(), which isn't available on Windows"
+
+        self.import_from = import_from
+        self.section = section
+        self.DWorkerArgs = DWorkerArgs
+        self.lock = allocate_lock()
+
+        request_read, self.request_write = os.pipe()
+        self.response_read, response_write = os.pipe()
+
+        self.proc = subprocess.Popen([
+            sys.executable, '-m',
+            'speedysvc.client_server.shared_memory.Zygote',
+            json.dumps({
+                'import_from': import_from,
+                'section': section,
+                'DWorkerArgs': DWorkerArgs,
+                'request_read': request_read,
+                'response_write': response_write
+            })
+        ], pass_fds=(request_read, response_write))
+
+        os.close(request_read)
+        os.close(response_write)
+        self.pid = self.proc.pid
+
+    def fork_worker(self, DExtraArgs=None):
+        """
+        Ask the zygote to fork a new worker process
+
+        :param DExtraArgs: keyword arguments to pass on to _service_worker
+                           in this worker only, in addition to DWorkerArgs
+                           (e.g. the CPUs to pin it to)
+        :return: the PID of the new worker
+        :raise: ChildProcessError if the zygote process has exited
+        """
+        encoded = json.dumps(DExtraArgs or {}).encode('utf-8')
+        with self.lock:
+            try:
+                os.write(self.request_write, _len_packer.pack(len(encoded)) + encoded)
+                data = _read_exactly(self.response_read, _pid_packer.size)
+            except BrokenPipeError:
+                data = b''
+
+        if len(data) < _pid_packer.size:
+            raise ChildProcessError(
+                f"Zygote process {self.pid} for {self.section} has exited"
+            )
+        pid, = _pid_packer.unpack(data)
+        return pid
+
+    def close(self):
+        """
+        Stop the zygote process. Workers which have
+        already been forked are left running.
+        """
+        for fd in (self.request_write, self.response_read):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        # The zygote exits once the pipe is closed
+        self.proc.wait()
+
+
+#=========================================================#
+#                  In the Zygote Process                  #
+#=========================================================#
+
+
+def _serve(import_from, section, DWorkerArgs,
+           request_read, response_write):
+    # The workers are children of this process, so
+    # they need to be reaped when they exit, as the
+    # MultiProcessManager can't wait for them
+    signal.signal(signal.SIGCHLD, _reap_workers)
+
+    server_methods = getattr(
+        importlib.import_module(import_from),
+        section
+    )
+    if hasattr(server_methods, 'preload'):
+        debug(f"{server_methods.name} zygote: preloading")
+        server_methods.preload()
+
+    # Don't let the garbage collector touch (and so
+    # copy) anything which has been loaded so far
+    gc.collect()
+    gc.freeze()
+    debug(f"{server_methods.name} zygote [{os.getpid()}]: "
+          f"waiting for fork requests")
+
+    while True:
+        header = _read_exactly(request_read, _len_packer.size)
+        if len(header) < _len_packer.size:
+            # The MultiProcessManager has exited/closed the pipe
+            return
+        amount, = _len_packer.unpack(header)
+        DExtraArgs = json.loads(_read_exactly(request_read, amount))
+
+        pid = os.fork()
+        if pid == 0:  # in worker
+            os.close(request_read)
+            os.close(response_write)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+
+            from speedysvc.client_server.shared_memory._service_worker \
+                import _service_worker
+            exit_code = 0
+            try:
+                _service_worker(server_methods, preloaded=True,
+                                **DWorkerArgs, **DExtraArgs)
+            except SystemExit:
+                pass
+            except:
+                traceback.print_exc()
+                exit_code = 1
+            finally:
+                # Don't return to the zygote's loop
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(exit_code)
+
+        debug(f"{server_methods.name} zygote: forked worker {pid}")
+        os.write(response_write, _pid_packer.pack(pid))
+
+
+def _reap_workers(sig, frame):
+    while True:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if not pid:
+            return
+
+
+if __name__ == '__main__':
+    # Stop ctrl+c in the terminal from killing the zygote:
+    # it exits when the MultiProcessManager does
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    DArgs = json.loads(argv[-1])
+    try:
+        _serve(**DArgs)
+    except:
+        traceback.print_exc()
+        sys.exit(1)
@@ -1,3 +1,4 @@
+import os
 import sys
 import time
 import json
@@ -16,10 +17,45 @@ def debug(*s):
         print(*s)
 
 
-def _service_worker(server_methods):
+def _service_worker(server_methods,
+                    tcp_bind=None,
+                    tcp_allow_insecure_serialisation=False,
+                    tcp_reuseport=False,
+                    cpu_affinity=None,
+                    max_concurrency=None,
+                    max_queued=None,
+                    preloaded=False):
     """
     In child processes of MultiProcessManager
+
+    :param tcp_bind: the address to serve TCP clients on from this
+                     process. Only used if tcp_reuseport is set,
+                     otherwise the MultiProcessManager serves TCP.
+    :param tcp_allow_insecure_serialisation: allow pickle/marshal
+                                             serialisation over TCP
+    :param tcp_reuseport: listen on the service's port in every worker
+                          with SO_REUSEPORT, so that the kernel balances
+                          connections between the workers, which call
+                          the methods directly rather than requests
+                          going through the manager process first
+    :param cpu_affinity: a list of the CPUs to pin this process to, or None
+    :param max_concurrency: the maximum number of calls for this
+                            worker to handle at once, or None
+    :param max_queued: the maximum number of calls which can
+                       wait for a free slot in this worker
+    :param preloaded: whether the server methods class's `preload()`
+                      hook has already been called (by a Zygote)
     """
+    if cpu_affinity is not None:
+        # Before any threads are started, so they're all pinned
+        # (and preloaded data is allocated on this NUMA node)
+        debug(f"{server_methods.name} child: Pinning to CPUs {cpu_affinity}")
+        os.sched_setaffinity(0, cpu_affinity)
+
+    if not preloaded and hasattr(server_methods, 'preload'):
+        debug(f"{server_methods.name} child: Preloading")
+        server_methods.preload()
+
     debug(f"{server_methods.name} child: Creating logger client")
     logger_client = LoggerClient(server_methods)
     debug(f"{server_methods.name} child: Creating server methods")
@@ -28,15 +64,21 @@ def _service_worker(server_methods):
           f"Server methods created, starting implementations")
 
     L = []
-    L.append(SHMServer(server_methods=smi))
-
-    # Tell the logger server that a child has properly loaded:
-    # this helps to make sure if processes are loaded properly,
-    # if one depends on another.
-    logger_client.set_service_status('started')
-
-    debug(f"{server_methods.name} worker PID [{getpid()}]: "
-          f"Server methods created - listening for commands")
+    L.append(SHMServer(
+        server_methods=smi,
+        max_concurrency=max_concurrency,
+        max_queued=max_queued
+    ))
+    if tcp_bind and tcp_reuseport:
+        L.append(NetworkServer(
+            server_methods=smi,
+            tcp_bind_address=tcp_bind,
+            force_insecure_serialisation=tcp_allow_insecure_serialisation,
+            reuse_port=True,
+            call_directly=True,
+            max_concurrency=max_concurrency,
+            max_queued=max_queued
+        ))
 
     _handling_sigint = [False]
     def signal_handler(sig, frame):
@@ -56,6 +98,16 @@ def _service_worker(server_methods):
         sys.exit(0)
 
     signal.signal(signal.SIGINT, signal_handler)
+
+    # Tell the logger server that this worker has properly loaded.
+    # The MultiProcessManager marks the service as started once
+    # enough of its workers have (see start_quorum), which helps to
+    # make sure processes are loaded properly, if one depends on another.
+    logger_client.set_worker_started()
+
+    debug(f"{server_methods.name} worker PID [{getpid()}]: "
+          f"Server methods created - listening for commands")
+
     while True:
         if hasattr(signal, 'pause'):
             signal.pause()
@@ -0,0 +1,91 @@
+import os
+import glob
+from warnings import warn
+
+
+NODE_SYSFS_PATH = '/sys/devices/system/node'
+
+has_affinity = hasattr(os, 'sched_setaffinity')
+
+
+def parse_cpu_list(s):
+    """
+    Parse a list of CPUs in the format used by Linux
+    (e.g. in /sys or by taskset -c), e.g. "0-3,8,10-11"
+
+    :return: a set of CPU numbers
+    """
+    SCPUs = set()
+    for i in s.strip().split(','):
+        if not i.strip():
+            continue
+        from_, _, to = i.partition('-')
+        SCPUs.update(range(int(from_), int(to or from_)+1))
+    return SCPUs
+
+
+def get_numa_nodes():
+    """
+    :return: a list of sets of the CPUs in each NUMA node which this
+             process is allowed to use (e.g. if it was started with
+             taskset), leaving out nodes without any. If the NUMA
+             topology isn't available, all the CPUs are treated as
+             being in a single node.
+    """
+    SAllowed = os.sched_getaffinity(0)
+    LNodes = []
+
+    LPaths = glob.glob(f'{NODE_SYSFS_PATH}/node[0-9]*/cpulist')
+    LPaths.sort(key=lambda path: int(path.split('/')[-2][4:]))
+    for path in LPaths:
+        with open(path, 'r') as f:
+            SCPUs = parse_cpu_list(f.read()) & SAllowed
+        if SCPUs:
+            LNodes.append(SCPUs)
+    return LNodes or [SAllowed]
+
+
+def get_numa_node(pid=0):
+    """
+    :param pid: a process ID, or 0 for this process
+    :return: the index of the NUMA node in get_numa_nodes() which
+             the process is pinned to, or None if its CPU affinity
+             spans more than one node (or can't be found)
+    """
+    if not has_affinity:
+        return None
+    try:
+        SCPUs = os.sched_getaffinity(pid)
+    except OSError:
+        return None
+
+    LNodes = get_numa_nodes()
+    if len(LNodes) < 2:
+        return None
+    for x, SNodeCPUs in enumerate(LNodes):
+        if SCPUs <= SNodeCPUs:
+            return x
+    return None
+
+
+def get_cpu_sets(cpu_affinity):
+    """
+    :param cpu_affinity: None to not pin workers to CPUs, "numa" to pin
+                         each worker to the CPUs of a NUMA node, or the
+                         sets of CPUs to pin workers to, either as a list
+                         of sets or a string separated by semicolons,
+                         e.g. "0-7;8-15"
+    :return: a list of sets of CPUs, or None
+    """
+    if cpu_affinity in (None, '', 'none'):
+        return None
+    elif not has_affinity:
+        warn("Setting the CPU affinity of workers isn't "
+             "supported on this platform - ignoring")
+        return None
+    elif cpu_affinity == 'numa':
+        return get_numa_nodes()
+    elif isinstance(cpu_affinity, str):
+        return [parse_cpu_list(i) for i in cpu_affinity.split(';') if i.strip()]
+    else:
+        return [set(i) for i in cpu_affinity]
@@ -0,0 +1,298 @@
+import time
+import importlib
+
+
+SCALE_UP = 1
+NO_CHANGE = 0
+SCALE_DOWN = -1
+
+
+class AutoscalerBase:
+    def __init__(self,
+                 scale_up_after=1,
+                 scale_down_after=1,
+                 scale_up_cooldown_secs=20,
+                 scale_down_cooldown_secs=240):
+        """
+        Decides when MultiProcessServer should add or remove a worker.
+        Subclasses implement `get_pressure`, which looks at the service's
+        stats and says whether it has too few or too many workers. This
+        class adds the hysteresis and cooldowns, so the number of workers
+        doesn't flap when the load is close to a threshold.
+
+        :param scale_up_after: the number of times in a row `get_pressure`
+                               needs to return SCALE_UP before a worker
+                               is added
+        :param scale_down_after: the same, for removing a worker
+        :param scale_up_cooldown_secs: the minimum time since a worker was
+                                       last added or removed before
+                                       adding another
+        :param scale_down_cooldown_secs: the same, for removing a worker
+        """
+        self.scale_up_after = scale_up_after
+        self.scale_down_after = scale_down_after
+        self.scale_up_cooldown_secs = scale_up_cooldown_secs
+        self.scale_down_cooldown_secs = scale_down_cooldown_secs
+
+        self.num_up = 0
+        self.num_down = 0
+
+    def get_pressure(self, logger_client, num_workers):
+        """
+        Must be implemented by subclasses
+
+        :param logger_client: the LoggerClient of the service, which
+                              gives access to the CPU/memory usage
+                              (get_average_over/get_last_record) and
+                              the call stats (get_load_stats)
+        :param num_workers: the number of worker processes
+        :return: (SCALE_UP, SCALE_DOWN or NO_CHANGE,
+                  a string describing the reason,
+                  a dict of the stats the decision was based on)
+        """
+        raise NotImplementedError()
+
+    def decide(self, logger_client, num_workers,
+               min_proc_num, max_proc_num, time_since_last_op):
+        """
+        :param time_since_last_op: the number of seconds since a worker
+                                   was last added or removed for any
+                                   reason (including crashes)
+        :return: None if the number of workers shouldn't change,
+                 otherwise a dict (which can be encoded as json) with
+                 the keys 'time', 'from_workers', 'to_workers', 'reason'
+                 and 'stats'
+        """
+        pressure, reason, DStats = self.get_pressure(logger_client, num_workers)
+
+        # Only scale after the pressure has been in the
+        # same direction for several checks in a row
+        if pressure == SCALE_UP:
+            self.num_up += 1
+            self.num_down = 0
+        elif pressure == SCALE_DOWN:
+            self.num_down += 1
+            self.num_up = 0
+        else:
+            self.num_up = self.num_down = 0
+
+        if (
+            pressure == SCALE_UP and
+            num_workers < max_proc_num and
+            self.num_up >= self.scale_up_after and
+            time_since_last_op >= self.scale_up_cooldown_secs
+        ):
+            to_workers = num_workers + 1
+        elif (
+            pressure == SCALE_DOWN and
+            num_workers > min_proc_num and
+            self.num_down >= self.scale_down_after and
+            time_since_last_op >= self.scale_down_cooldown_secs
+        ):
+            to_workers = num_workers - 1
+        else:
+            return None
+
+        self.num_up = self.num_down = 0
+        return {
+            'time': time.time(),
+            'from_workers': num_workers,
+            'to_workers': to_workers,
+            'reason': reason,
+            'stats': DStats
+        }
+
+
+class CPUAutoscaler(AutoscalerBase):
+    def __init__(self,
+                 new_proc_cpu_pc=0.3,
+                 new_proc_avg_over_secs=20,
+                 kill_proc_avg_over_secs=240,
+                 **kw):
+        """
+        Add workers when the average CPU usage per worker is high, and
+        remove them when the combined CPU usage is low. This was the
+        only behaviour before autoscalers could be chosen, and is still
+        the default. It can't tell if services which are waiting on IO
+        are overloaded, which LoadAutoscaler can.
+
+        :param new_proc_cpu_pc: The combined CPU percentage between 0.0 and
+                                1.0, above which to start a new child worker.
+        :param new_proc_avg_over_secs: The time period over which to average
+                                       the combined CPU percentage when
+                                       creating new children.
+        :param kill_proc_avg_over_secs: The time period over which to average
+                                        the combined CPU percentage when
+                                        removing existing children.
+        """
+        assert 0.0 < new_proc_cpu_pc < 1.0, \
+            "The overall percentage CPU usage before starting a new " \
+            "process should be between 0.0 and 1.0 non-inclusive"
+
+        kw.setdefault('scale_up_cooldown_secs', new_proc_avg_over_secs)
+        kw.setdefault('scale_down_cooldown_secs', kill_proc_avg_over_secs)
+        AutoscalerBase.__init__(self, **kw)
+
+        self.new_proc_cpu_pc = new_proc_cpu_pc
+        self.new_proc_avg_over_secs = new_proc_avg_over_secs
+        self.kill_proc_avg_over_secs = kill_proc_avg_over_secs
+
+    def get_pressure(self, logger_client, num_workers):
+        DNewProcAvg = logger_client.get_average_over(
+            time.time() - self.new_proc_avg_over_secs, time.time()
+        )
+        DRemoveProcAvg = logger_client.get_average_over(
+            time.time() - self.kill_proc_avg_over_secs, time.time()
+        )
+        if not DNewProcAvg or not DRemoveProcAvg:
+            return NO_CHANGE, "no CPU stats yet", {}
+
+        cpu_per_worker = DNewProcAvg['cpu_usage_pc'] / DNewProcAvg['num_processes']
+        DStats = {
+            'cpu_per_worker': cpu_per_worker,
+            'cpu_combined': DRemoveProcAvg['cpu_usage_pc']
+        }
+        max_cpu = self.new_proc_cpu_pc * 100.0
+
+        if cpu_per_worker > max_cpu:
+            return SCALE_UP, (
+                f"CPU per worker {cpu_per_worker:.0f}% higher than "
+                f"{max_cpu:.0f}% over {self.new_proc_avg_over_secs} seconds"
+            ), DStats
+        elif DRemoveProcAvg['cpu_usage_pc'] < max_cpu:
+            return SCALE_DOWN, (
+                f"Combined CPU {DRemoveProcAvg['cpu_usage_pc']:.0f}% lower than "
+                f"{max_cpu:.0f}% over {self.kill_proc_avg_over_secs} seconds"
+            ), DStats
+        return NO_CHANGE, "", DStats
+
+
+class LoadAutoscaler(AutoscalerBase):
+    def __init__(self,
+                 max_concurrency_per_worker=1.0,
+                 max_queue_wait_secs=0.05,
+                 max_p95_latency_secs=None,
+                 max_rate_per_worker=None,
+                 scale_down_ratio=0.5,
+                 scale_up_after=2,
+                 scale_down_after=6,
+                 scale_up_cooldown_secs=10,
+                 scale_down_cooldown_secs=120,
+                 **kw):
+        """
+        Add workers based on the calls the service is handling, rather
+        than its CPU usage, so services which are saturated while mostly
+        waiting on IO (or locks) get more workers, too.
+
+        A worker is added when any of the limits are exceeded. A worker
+        is only removed when, with one less worker, every stat would be
+        below `scale_down_ratio` times its limit. The gap between the two
+        stops the number of workers flapping.
+
+        :param max_concurrency_per_worker: the maximum average number of
+                                           calls in progress in each
+                                           worker at once
+        :param max_queue_wait_secs: the maximum average time calls spend
+                                    waiting to be handled (only measured
+                                    for network clients, which queue for
+                                    a connection to the workers)
+        :param max_p95_latency_secs: if provided, the maximum time 95% of
+                                     calls should take, e.g. for an SLO
+        :param max_rate_per_worker: if provided, the maximum number of
+                                    calls per second each worker handles
+        :param scale_down_ratio: between 0.0 and 1.0, see above
+        """
+        AutoscalerBase.__init__(
+            self,
+            scale_up_after=scale_up_after,
+            scale_down_after=scale_down_after,
+            scale_up_cooldown_secs=scale_up_cooldown_secs,
+            scale_down_cooldown_secs=scale_down_cooldown_secs,
+            **kw
+        )
+        assert 0.0 < scale_down_ratio < 1.0, \
+            "scale_down_ratio should be between 0.0 and 1.0 non-inclusive"
+
+        self.max_concurrency_per_worker = max_concurrency_per_worker
+        self.max_queue_wait_secs = max_queue_wait_secs
+        self.max_p95_latency_secs = max_p95_latency_secs
+        self.max_rate_per_worker = max_rate_per_worker
+        self.scale_down_ratio = scale_down_ratio
+
+    def get_pressure(self, logger_client, num_workers):
+        DStats = logger_client.get_load_stats()
+        if not num_workers:
+            return NO_CHANGE, "no workers", DStats
+
+        # (name, the value with the current number of workers,
+        #  the value with one less worker, the limit)
+        LChecks = [(
+            'concurrency per worker',
+            DStats['concurrency'] / num_workers,
+            DStats['concurrency'] / max(num_workers - 1, 1),
+            self.max_concurrency_per_worker
+        )]
+        if DStats['queue_wait'] is not None:
+            # Assume removing a worker increases the wait
+            # in proportion to the concurrency increasing
+            LChecks.append((
+                'queue wait',
+                DStats['queue_wait'],
+                DStats['queue_wait'] * num_workers / max(num_workers - 1, 1),
+                self.max_queue_wait_secs
+            ))
+        if self.max_p95_latency_secs is not None and \
+                DStats['p95_latency'] is not None:
+            LChecks.append((
+                'p95 latency',
+                DStats['p95_latency'],
+                DStats['p95_latency'],
+                self.max_p95_latency_secs
+            ))
+        if self.max_rate_per_worker is not None:
+            LChecks.append((
+                'calls/sec per worker',
+                DStats['request_rate'] / num_workers,
+                DStats['request_rate'] / max(num_workers - 1, 1),
+                self.max_rate_per_worker
+            ))
+
+        for name, value, _, limit in LChecks:
+            if value > limit:
+                return SCALE_UP, (
+                    f"{name} {value:.3f} higher than {limit:.3f}"
+                ), DStats
+
+        if all(
+            value_one_less < limit * self.scale_down_ratio
+            for _, _, value_one_less, limit in LChecks
+        ):
+            return SCALE_DOWN, (
+                "with one less worker, " + ', '.join(
+                    f"{name} {value_one_less:.3f} would be lower than "
+                    f"{limit * self.scale_down_ratio:.3f}"
+                    for name, _, value_one_less, limit in LChecks
+                )
+            ), DStats
+        return NO_CHANGE, "", DStats
+
+
+DAutoscalers = {
+    'cpu': CPUAutoscaler,
+    'load': LoadAutoscaler
+}
+
+
+def get_autoscaler(autoscaler, DOptions=None):
+    """
+    :param autoscaler: "cpu", "load", or the import path of a subclass of
+                       AutoscalerBase, e.g. "my_module.MyAutoscaler"
+    :param DOptions: keyword arguments to create the autoscaler with
+    :return: the AutoscalerBase instance
+    """
+    if autoscaler in DAutoscalers:
+        cls = DAutoscalers[autoscaler]
+    else:
+        module, _, class_name = autoscaler.rpartition('.')
+        cls = getattr(importlib.import_module(module), class_name)
+    return cls(**(DOptions or {}))
@@ -13,6 +13,13 @@ if sys.platform == 'win32':
         #print("GET MMAP:", location, create)
         return Win32SHM(location, create, new_size)
 
+
+    def get_or_create_mmap(location, size):
+        try:
+            return get_mmap(location, False)
+        except FileNotFoundError:
+            return get_mmap(location, True, size)
+
 else:
     import posix_ipc
     from posix_ipc import unlink_shared_memory as _usm
@@ -68,6 +75,20 @@ else:
             except posix_ipc.ExistentialError:
                 raise FileNotFoundError(location)
 
+    def get_or_create_mmap(location, size):
+        """
+        Connect to a memory map, creating it (filled with zeroes)
+        if it doesn't exist yet. Unlike get_mmap, an existing
+        memory map is never replaced, so processes can call
+        this at the same time without a race.
+        """
+        memory = posix_ipc.SharedMemory(
+            location.decode('ascii'), posix_ipc.O_CREAT, size=size
+        )
+        mapfile = mmap.mmap(memory.fd, memory.size)
+        memory.close_fd()
+        return mapfile
+
 
 INVALID = 0
 SERVER = b'S'[0]
@@ -0,0 +1,144 @@
+import time
+from _thread import allocate_lock
+from speedysvc.toolkit.documentation.copydoc import copydoc
+
+from speedysvc.client_server.base_classes.ClientProviderBase import ClientProviderBase
+from speedysvc.client_server.batch_encoding import \
+    batch_fn, encode_batch_requests, decode_batch_responses
+
+
+class _PendingCall:
+    __slots__ = ('fn', 'data', 'result', 'exc', 'done_lock')
+
+    def __init__(self, fn, data):
+        self.fn = fn
+        self.data = data
+        self.result = None
+        self.exc = None
+
+        # Released once the result (or exception) has been set
+        self.done_lock = allocate_lock()
+        self.done_lock.acquire()
+
+    def set_result(self, result):
+        self.result = result
+        self.done_lock.release()
+
+    def set_exception(self, exc):
+        self.exc = exc
+        self.done_lock.release()
+
+
+class BatchingClient(ClientProviderBase):
+    def __init__(self, client, batch_window_secs=0.0002, max_batch_size=32):
+        """
+        Wraps another client (e.g. an SHMClient or NetworkClient) so
+        that calls made from different threads at around the same time
+        are sent to the server together, as a single call. This means
+        under heavy fan-in load, calls share a single lock handoff or
+        network round trip, rather than queueing behind each other.
+
+        The first thread to make a call waits for `batch_window_secs`
+        for other threads to add their calls, before sending them all.
+        If only a single call was made, it's sent as a normal call.
+
+        :param client: the client to send batches through
+        :param batch_window_secs: how long to wait for other calls
+                                  after the first call of a batch
+        :param max_batch_size: send the batch straight away once this
+                               many calls have been added to it
+        """
+        ClientProviderBase.__init__(self, client.server_methods, client.port)
+        self.client = client
+        self.batch_window_secs = batch_window_secs
+        self.max_batch_size = max_batch_size
+
+        self.lock = allocate_lock()
+        self.LBatch = []
+        self.leader_waiting = False
+
+    def get_cache_versions(self):
+        return self.client.get_cache_versions()
+
+    def close(self):
+        if hasattr(self.client, 'close'):
+            self.client.close()
+
+    @copydoc(ClientProviderBase.send)
+    def send(self, fn, data):
+        call = _PendingCall(fn, data)
+        LFullBatch = None
+        is_leader = False
+
+        with self.lock:
+            self.LBatch.append(call)
+
+            if len(self.LBatch) >= self.max_batch_size:
+                # Don't wait for the rest of the window
+                LFullBatch = self.LBatch
+                self.LBatch = []
+            elif not self.leader_waiting:
+                # This thread will send the batch
+                # once the window is over
+                self.leader_waiting = is_leader = True
+
+        if LFullBatch is not None:
+            self.__send_batch(LFullBatch)
+
+        if is_leader:
+            time.sleep(self.batch_window_secs)
+            with self.lock:
+                LBatch = self.LBatch
+                self.LBatch = []
+                self.leader_waiting = False
+
+            if LBatch:
+                self.__send_batch(LBatch)
+
+        # Wait for whichever thread sent the batch
+        call.done_lock.acquire()
+        if call.exc is not None:
+            raise call.exc
+        return call.result
+
+    def __send_batch(self, LBatch):
+        if len(LBatch) == 1:
+            # No need for the overhead of encoding a batch
+            call = LBatch[0]
+            try:
+                call.set_result(self.client.send(call.fn, call.data))
+            except Exception as exc:
+                call.set_exception(exc)
+            return
+
+        LCalls = []
+        LEncoded = []
+        for call in LBatch:
+            try:
+                LEncoded.append((
+                    call.fn.__name__.encode('ascii'),
+                    call.fn.serialiser.dumps(call.data)
+                ))
+                LCalls.append(call)
+            except Exception as exc:
+                call.set_exception(exc)
+
+        try:
+            LResponses = decode_batch_responses(
+                self.client.send(batch_fn, encode_batch_requests(LEncoded))
+            )
+            assert len(LResponses) == len(LCalls), \
+                f"Expected {len(LCalls)} responses, got {len(LResponses)}"
+        except Exception as exc:
+            for call in LCalls:
+                call.set_exception(exc)
+            return
+
+        for call, (status, result) in zip(LCalls, LResponses):
+            try:
+                if status == b'+':
+                    call.set_result(call.fn.serialiser.loads(result))
+                else:
+                    self._handle_exception(result)
+            except Exception as exc:
+                call.set_exception(exc)
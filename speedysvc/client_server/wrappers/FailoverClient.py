@@ -0,0 +1,334 @@
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from _thread import allocate_lock, start_new_thread
+from speedysvc.toolkit.documentation.copydoc import copydoc
+
+from speedysvc.hybrid_lock import NoSuchSemaphoreException, SemaphoreDestroyedException
+from speedysvc.client_server.base_classes.ClientProviderBase import ClientProviderBase
+from speedysvc.client_server.network.NetworkClient import ConnectionLostError
+from speedysvc.client_server.shared_memory.SHMClient import SHMClient, ResponseTimeoutError
+from speedysvc.client_server.ping import ping_fn
+
+
+# Errors which mean the transport failed, rather than the method
+# raising an exception. (ConnectionLostError is never raised by
+# servers, so calls can safely be sent to the next address)
+_TRANSPORT_ERRORS = (
+    ConnectionLostError,
+    NoSuchSemaphoreException,
+    SemaphoreDestroyedException
+)
+
+
+def debug(*s):
+    if False:
+        print(*s)
+
+
+class _Candidate:
+    def __init__(self, address):
+        """
+        A single address the service can be reached on, with
+        the latency of the heartbeats sent to it
+        """
+        self.address = address
+        self.client = None
+        self.latency = None
+        self.healthy = False
+        self.last_error = None
+        # Whether a heartbeat is still waiting for a response
+        self.probing = False
+
+
+class FailoverClient(ClientProviderBase):
+    def __init__(self,
+                 server_methods,
+                 addresses,
+                 connect_fn,
+                 probe_every_secs=1.0,
+                 probe_timeout_secs=2.0,
+                 call_timeout_secs=None,
+                 ewma_decay=0.3,
+                 switch_ratio=0.8):
+        """
+        Connects to the service on several addresses (e.g. "shm://",
+        "unix://..." and several "tcp://..." hosts), sending calls to
+        whichever responds to heartbeats the fastest.
+
+        A background thread sends a heartbeat to each address every
+        `probe_every_secs`. If the address calls are being sent to
+        fails (or its heartbeat does), calls are sent to the next
+        fastest address straight away. Once an address which failed
+        responds again, it's reconnected to, and calls are switched
+        back to it if it's the fastest.
+
+        :param server_methods:
+        :param addresses: the addresses to choose between. udp://
+                          isn't supported, as it can't be pinged.
+        :param connect_fn: called with an address to connect to it,
+                           returning a client. Network clients should
+                           have reconnect=False, so that failures
+                           are raised rather than retried.
+        :param probe_every_secs: how often to send heartbeats
+        :param probe_timeout_secs: how long to wait for a heartbeat
+                                   response before treating an address
+                                   as failed. Addresses aren't sent
+                                   another heartbeat until the last one
+                                   returns, so a hung address doesn't
+                                   leave a blocked thread for each one.
+        :param call_timeout_secs: if given, calls which don't get a
+                                  response within this many seconds (on
+                                  shm://, rounded up to whole seconds)
+                                  are treated as a failure of the address,
+                                  and sent to the next one. Only use this
+                                  for methods which are safe to run twice,
+                                  as the first address may still finish
+                                  the call.
+        :param ewma_decay: the weight given to the latest heartbeat
+                           when updating the average latency of
+                           an address, between 0.0 and 1.0
+        :param switch_ratio: only switch to a different healthy address
+                             if its latency is less than this fraction
+                             of the current address's latency, so that
+                             calls don't flip between similar addresses
+        """
+        ClientProviderBase.__init__(self, server_methods)
+        self.connect_fn = connect_fn
+        self.probe_every_secs = probe_every_secs
+        self.probe_timeout_secs = probe_timeout_secs
+        self.call_timeout_secs = call_timeout_secs
+        self.ewma_decay = ewma_decay
+        self.switch_ratio = switch_ratio
+
+        self.lock = allocate_lock()
+        self.LCandidates = [_Candidate(address) for address in addresses]
+        self.current = None
+        self.closed = False
+
+        for candidate in self.LCandidates:
+            self.__probe(candidate)
+        self.__select()
+
+        if self.current is None:
+            # The same as connect(): raise the last address's error
+            raise self.LCandidates[-1].last_error
+        start_new_thread(self.__probe_loop, ())
+
+    def get_address(self):
+        """
+        :return: the address calls are currently being sent to
+        """
+        current = self.current
+        return current.address if current else None
+
+    def get_stats(self):
+        """
+        :return: a list of dicts with the address, average
+                 heartbeat latency (in seconds) and whether it's
+                 healthy/being used, for each address
+        """
+        return [{
+            'address': candidate.address,
+            'latency': candidate.latency,
+            'healthy': candidate.healthy,
+            'current': candidate is self.current
+        } for candidate in self.LCandidates]
+
+    def get_cache_versions(self):
+        LCacheVersions = []
+        for candidate in self.LCandidates:
+            client = candidate.client
+            if client is None:
+                # Can't tell if it's on this host
+                return None
+            LCacheVersions.append(client.get_cache_versions())
+
+        if None in LCacheVersions:
+            return None
+        return LCacheVersions[0]
+
+    def close(self):
+        self.closed = True
+        for candidate in self.LCandidates:
+            self.__close_client(candidate.client)
+
+    #=========================================================#
+    #                      Send Commands                      #
+    #=========================================================#
+
+    @copydoc(ClientProviderBase.send)
+    def send(self, fn, data):
+        LTried = []
+        while True:
+            candidate = self.current
+            if candidate is None or candidate in LTried:
+                raise ConnectionLostError(
+                    f"Service {self.server_methods.name} isn't "
+                    f"responding on any address"
+                )
+
+            client = candidate.client
+            if client is None:
+                # Failed in a different thread
+                LTried.append(candidate)
+                self.__select()
+                continue
+
+            try:
+                return self.__send_with_deadline(
+                    client, fn, data, self.call_timeout_secs
+                )
+            except _TRANSPORT_ERRORS as exc:
+                debug(f"FailoverClient: {candidate.address} failed: {exc!r}")
+                LTried.append(candidate)
+                self.__failed(candidate, client, exc)
+
+    def __send_with_deadline(self, client, fn, data, timeout):
+        """
+        Send a call, raising ConnectionLostError if it doesn't get a
+        response within `timeout` seconds (if it isn't None). Only
+        SHMClients and clients with a submit() method (NetworkClient
+        etc) support this - calls to others wait indefinitely.
+        """
+        if timeout is None:
+            return client.send(fn, data)
+
+        elif isinstance(client, SHMClient):
+            try:
+                return client.send(fn, data, timeout=timeout)
+            except ResponseTimeoutError as exc:
+                raise ConnectionLostError(str(exc))
+
+        elif hasattr(client, 'submit'):
+            future = client.submit(fn, data)
+            try:
+                return future.result(timeout=timeout)
+            except FutureTimeoutError:
+                if future.done():
+                    # The method itself raised TimeoutError
+                    raise
+                raise ConnectionLostError(
+                    f"Service {self.server_methods.name} didn't "
+                    f"respond within {timeout} seconds"
+                )
+        return client.send(fn, data)
+
+    def __failed(self, candidate, client, exc):
+        with self.lock:
+            if candidate.client is not client:
+                # Already handled by a different thread
+                return
+            candidate.client = None
+            candidate.healthy = False
+            candidate.last_error = exc
+        self.__close_client(client)
+        self.__select()
+
+    def __close_client(self, client):
+        if client is not None and hasattr(client, 'close'):
+            try:
+                client.close()
+            except Exception:
+                pass
+
+    #=========================================================#
+    #                   Heartbeats/Selection                  #
+    #=========================================================#
+
+    def __probe_loop(self):
+        while not self.closed:
+            time.sleep(self.probe_every_secs)
+            for candidate in self.LCandidates:
+                if self.closed:
+                    return
+                self.__probe(candidate)
+            self.__select()
+
+    def __probe(self, candidate):
+        if candidate.probing:
+            # The last heartbeat still hasn't returned
+            # (it'll have already been marked as failed)
+            return
+
+        client = candidate.client
+        if client is None:
+            try:
+                client = candidate.client = self.connect_fn(candidate.address)
+            except Exception as exc:
+                candidate.last_error = exc
+                return
+
+        try:
+            latency = self.__ping(candidate, client)
+        except Exception as exc:
+            self.__failed(candidate, client, exc)
+            return
+
+        if candidate.latency is None:
+            candidate.latency = latency
+        else:
+            candidate.latency = (
+                self.ewma_decay * latency +
+                (1.0 - self.ewma_decay) * candidate.latency
+            )
+        candidate.healthy = True
+
+    def __ping(self, candidate, client):
+        """
+        :return: the round trip time of a heartbeat in seconds
+        :raise: ConnectionLostError/TimeoutError if it took
+                longer than probe_timeout_secs
+        """
+        if isinstance(client, SHMClient) or hasattr(client, 'submit'):
+            t_from = time.time()
+            self.__send_with_deadline(
+                client, ping_fn, b'', self.probe_timeout_secs
+            )
+            return time.time() - t_from
+
+        done_lock = allocate_lock()
+        done_lock.acquire()
+        DResult = {}
+
+        def ping():
+            t_from = time.time()
+            try:
+                client.send(ping_fn, b'')
+                DResult['latency'] = time.time() - t_from
+            except Exception as exc:
+                DResult['exc'] = exc
+            finally:
+                candidate.probing = False
+            done_lock.release()
+
+        # Sent from a different thread, as other clients
+        # may wait indefinitely if the service has hung
+        candidate.probing = True
+        start_new_thread(ping, ())
+        if not done_lock.acquire(timeout=self.probe_timeout_secs):
+            raise TimeoutError("Heartbeat timed out")
+        elif 'exc' in DResult:
+            raise DResult['exc']
+        return DResult['latency']
+
+    def __select(self):
+        """
+        Switch to the healthy address with the lowest latency,
+        if the current one failed or is much slower
+        """
+        with self.lock:
+            LHealthy = [i for i in self.LCandidates if i.healthy]
+            if not LHealthy:
+                self.current = None
+                return
+
+            # (Addresses earlier in the list are preferred
+            #  if the latencies are the same)
+            best = min(LHealthy, key=lambda i: i.latency)
+            current = self.current
+            if current is None or not current.healthy or (
+                best.latency < current.latency * self.switch_ratio
+            ):
+                if best is not current:
+                    debug(f"FailoverClient: switching to {best.address}")
+                self.current = best
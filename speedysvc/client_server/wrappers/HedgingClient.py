@@ -0,0 +1,179 @@
+import time
+from collections import deque
+from _thread import allocate_lock
+from concurrent.futures import \
+    ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FutureTimeoutError
+from speedysvc.toolkit.documentation.copydoc import copydoc
+
+from speedysvc.client_server.base_classes.ClientProviderBase import ClientProviderBase
+
+
+def debug(*s):
+    if False:
+        print(*s)
+
+
+class HedgingClient(ClientProviderBase):
+    def __init__(self, LClients,
+                 percentile=0.95,
+                 budget=0.05,
+                 max_burst=10,
+                 min_samples=20,
+                 latency_window=1000):
+        """
+        Sends each call to the first client, but if it hasn't responded
+        within the `percentile` latency of recent calls, also sends it
+        to the next client, returning whichever response comes first.
+        This stops a single slow worker or host (e.g. during a garbage
+        collection pause) from dominating the tail latency.
+
+        The extra load is capped by a budget: each call earns `budget`
+        of a hedged call (up to `max_burst`), so with the default of
+        0.05 at most around 5% extra calls are made.
+
+        Only use this for methods which are safe to call twice.
+
+        :param LClients: clients connected to copies of the same service,
+                         in order of preference, e.g. [local SHMClient,
+                         remote NetworkClient]. Clients with a `submit`
+                         method (NetworkClient) are sent calls without
+                         blocking, others are called from a thread pool.
+        :param percentile: how slow a call must be, compared to
+                           recent calls, before it's hedged
+        :param budget: the maximum fraction of extra calls to make
+        :param max_burst: the maximum number of hedged calls which
+                          can be made at once, after a quiet period
+        :param min_samples: don't hedge calls until this many
+                            latencies have been measured
+        :param latency_window: the number of recent calls to
+                               calculate the percentile from
+        """
+        assert LClients, "At least one client must be provided"
+        assert 0.0 < percentile < 1.0, \
+            "percentile should be between 0.0 and 1.0 non-inclusive"
+        ClientProviderBase.__init__(self, LClients[0].server_methods, LClients[0].port)
+
+        self.LClients = LClients
+        self.percentile = percentile
+        self.budget = budget
+        self.max_burst = max_burst
+        self.min_samples = min_samples
+
+        self.lock = allocate_lock()
+        self.LLatencies = deque(maxlen=latency_window)
+        self.hedge_delay = None
+        self.tokens = 0.0
+        self.num_calls = 0
+        self.num_hedged = 0
+        self.num_hedges_won = 0
+        self.next_hedge_client = 1
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=4 * len(LClients),
+            thread_name_prefix='HedgingClient'
+        )
+
+    def get_stats(self):
+        """
+        :return: a dict with the total number of calls, how many were
+                 hedged, how many of those the hedged call responded to
+                 first, and the current delay before hedging (in seconds)
+        """
+        return {
+            'num_calls': self.num_calls,
+            'num_hedged': self.num_hedged,
+            'num_hedges_won': self.num_hedges_won,
+            'hedge_delay': self.hedge_delay
+        }
+
+    def get_cache_versions(self):
+        # Results can only be cached if every client
+        # can tell when they become stale
+        LCacheVersions = [client.get_cache_versions() for client in self.LClients]
+        if None in LCacheVersions:
+            return None
+        return LCacheVersions[0]
+
+    def close(self):
+        for client in self.LClients:
+            if hasattr(client, 'close'):
+                client.close()
+        self.executor.shutdown(wait=False)
+
+    #=========================================================#
+    #                      Send Commands                      #
+    #=========================================================#
+
+    @copydoc(ClientProviderBase.send)
+    def send(self, fn, data):
+        t_from = time.time()
+        with self.lock:
+            self.num_calls += 1
+            self.tokens = min(self.max_burst, self.tokens + self.budget)
+            hedge_delay = self.hedge_delay
+
+        future = self.__submit(self.LClients[0], fn, data)
+        if hedge_delay is None or len(self.LClients) == 1:
+            return self.__get_result(future, t_from)
+
+        try:
+            return self.__get_result(future, t_from, timeout=hedge_delay)
+        except FutureTimeoutError:
+            pass
+
+        with self.lock:
+            if self.tokens < 1.0:
+                # Over budget, so just keep waiting
+                hedge_client = None
+            else:
+                self.tokens -= 1.0
+                self.num_hedged += 1
+                hedge_client = self.LClients[self.next_hedge_client]
+                self.next_hedge_client += 1
+                if self.next_hedge_client >= len(self.LClients):
+                    self.next_hedge_client = 1
+
+        if hedge_client is None:
+            return self.__get_result(future, t_from)
+
+        debug(f"HedgingClient: hedging {fn.__name__} after {hedge_delay}s")
+        hedge_future = self.__submit(hedge_client, fn, data)
+        SDone, _ = wait([future, hedge_future], return_when=FIRST_COMPLETED)
+        winner = hedge_future if hedge_future in SDone else future
+        loser = future if winner is hedge_future else hedge_future
+
+        if winner.exception() is not None:
+            # Use the other response, if that succeeds
+            winner, loser = loser, winner
+        else:
+            # The response won't be used, so don't
+            # wait for it if it hasn't been started
+            loser.cancel()
+
+        if winner is hedge_future:
+            with self.lock:
+                self.num_hedges_won += 1
+        return self.__get_result(winner, t_from)
+
+    def __submit(self, client, fn, data):
+        if hasattr(client, 'submit'):
+            return client.submit(fn, data)
+        return self.executor.submit(client.send, fn, data)
+
+    def __get_result(self, future, t_from, timeout=None):
+        result = future.result(timeout=timeout)
+        self.__add_latency(time.time() - t_from)
+        return result
+
+    def __add_latency(self, latency):
+        with self.lock:
+            self.LLatencies.append(latency)
+
+            if len(self.LLatencies) >= self.min_samples and (
+                self.hedge_delay is None or
+                not self.num_calls % 50
+            ):
+                # Sorting is relatively expensive, so
+                # only recalculate every so many calls
+                LSorted = sorted(self.LLatencies)
+                self.hedge_delay = LSorted[int(len(LSorted) * self.percentile)]
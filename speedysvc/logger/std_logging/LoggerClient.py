@@ -8,6 +8,7 @@ from _thread import allocate_lock, start_new_thread
 from speedysvc.logger.std_logging.LoggerServer import LoggerServer
 from speedysvc.client_server.shared_memory.SHMClient import SHMClient
 from speedysvc.client_server.base_classes.ClientMethodsBase import ClientMethodsBase
+from speedysvc.client_server.base_classes.LoadStats import get_load_stats
 from speedysvc.logger.std_logging.log_entry_types import \
     NOTSET, DEBUG, INFO, ERROR, WARNING, CRITICAL, STDOUT, STDERR
 
@@ -23,10 +24,16 @@ _old_stderr = sys.stderr
 
 
 class LoggerClient(ClientMethodsBase):
-    def __init__(self, service_server_methods):
+    def __init__(self, service_server_methods, control_only=False):
         """
         A basic logger which sends stderr/stdout
         output to a logging server
+
+        :param control_only: if True, only use this client to call the
+                             logging server's methods (e.g. to request a
+                             restart from a CLI), without capturing
+                             stderr/stdout or sending this process's
+                             stats to the server, as workers do
         """
         self.lock = allocate_lock()
         self.pid = getpid()
@@ -38,10 +45,11 @@ class LoggerClient(ClientMethodsBase):
         self.client = SHMClient(LoggerServer, port=f'{service_server_methods.port}_log',
                                 use_spinlock=False, use_in_process_lock=True)
         ClientMethodsBase.__init__(self, client_provider=self.client)
-        self.stderr_logger = self._StdErrLogger(self)
-        self.stdout_logger = self._StdOutLogger(self)
         self.__shut_me_down = False
-        start_new_thread(self.__log_thread, ())
+        if not control_only:
+            self.stderr_logger = self._StdErrLogger(self)
+            self.stdout_logger = self._StdOutLogger(self)
+            start_new_thread(self.__log_thread, ())
 
     def shutdown(self):
         self.__shut_me_down = True
@@ -103,6 +111,7 @@ class LoggerClient(ClientMethodsBase):
                     # Periodically inform the management server how long methods
                     # are taking/how many times they're being called for benchmarks
                     self._update_method_stats_()
+                    self._update_load_stats_()
                     method_stats_last_updated = time.time()
 
                 elif not cur_stderr_msg and not cur_stderr_msg and sys.platform == 'win32':
@@ -140,6 +149,14 @@ class LoggerClient(ClientMethodsBase):
 
         self.send(LoggerServer._update_method_stats_, [self.pid, DStats])
 
+    def _update_load_stats_(self):
+        """
+        Send how many calls this process is handling, and how long
+        they're taking to the MultiProcessManager for autoscaling
+        """
+        DLoadStats = get_load_stats(self.service_server_methods.port).snapshot()
+        self.send(LoggerServer._update_load_stats_, [self.pid, DLoadStats])
+
     #=========================================================#
     #                     Service Status                      #
     #=========================================================#
@@ -150,6 +167,24 @@ class LoggerClient(ClientMethodsBase):
     def set_service_status(self, status):
         return self.send(LoggerServer.set_service_status, [status])
 
+    def set_worker_started(self):
+        return self.send(LoggerServer.set_worker_started, [self.pid])
+
+    def is_worker_started(self, pid):
+        return self.send(LoggerServer.is_worker_started, [pid])
+
+    def get_started_workers(self, LPIDs):
+        return self.send(LoggerServer.get_started_workers, [LPIDs])
+
+    def request_restart(self):
+        return self.send(LoggerServer.request_restart, [])
+
+    def get_restart_status(self):
+        return self.send(LoggerServer.get_restart_status, [])
+
+    def set_restart_status(self, status):
+        return self.send(LoggerServer.set_restart_status, [status])
+
     #=========================================================#
     #                Service Time Series Data                 #
     #=========================================================#
@@ -166,6 +201,15 @@ class LoggerClient(ClientMethodsBase):
     def remove_pid(self, pid):
         return self.send(LoggerServer.remove_pid, [pid])
 
+    def get_load_stats(self):
+        return self.send(LoggerServer.get_load_stats, [])
+
+    def get_num_requests_by_pid(self):
+        return self.send(LoggerServer.get_num_requests_by_pid, [])
+
+    def add_scaling_decision(self, DDecision):
+        return self.send(LoggerServer.add_scaling_decision, [DDecision])
+
     def start_collecting(self):
         return self.send(LoggerServer.start_collecting, [])
 
@@ -1,5 +1,7 @@
 import time
 import psutil
+from threading import Event
+from collections import deque
 from _thread import allocate_lock, start_new_thread
 
 from speedysvc.client_server.shared_memory.SHMServer import SHMServer
@@ -8,10 +10,18 @@ from speedysvc.logger.std_logging.log_entry_types import \
     dict_to_log_entry, STDERR, STDOUT
 from speedysvc.logger.std_logging.FIFOJSONLog import FIFOJSONLog
 from speedysvc.logger.time_series_data.ServiceTimeSeriesData import ServiceTimeSeriesData
+from speedysvc.client_server.base_classes.LoadStats import combine_load_stats
 
 
 FLUSH_EVERY_SECONDS = 3.0
 
+# Load stats from processes which haven't sent any for this many seconds
+# (e.g. as they've exited) are ignored, so they don't skew autoscaling
+LOAD_STATS_EXPIRE_SECS = 15
+
+# The number of autoscaling decisions kept for the web monitor
+MAX_SCALING_DECISIONS = 100
+
 
 _flush_loop_started = [False]
 _LLoggerServers = []
@@ -48,7 +58,16 @@ class LoggerServer:
         """
         self.original_server_methods = server_methods
         self.status = 'stopped'
+        self.started_event = Event()
+        self.started_time = None
+        # Whether the service was stopped while it was starting,
+        # e.g. as too many of its workers crashed
+        self.start_failed = False
         self.LPIDs = []
+        # The workers which have finished starting up
+        self.SStartedPIDs = set()
+        # None, 'requested', 'restarting', 'restarted' or 'failed'
+        self.restart_status = None
 
         # NOTE ME: I'm overriding the port so as to not have a
         #          collision with the existing (integer) port,
@@ -62,6 +81,12 @@ class LoggerServer:
         # which would take too long to store separately
         self.DMethodStats = {}
 
+        # {pid: (time received, the process's LoadStats snapshot), ...}
+        self.DLoadStats = {}
+        # {pid: the total number of calls the process has handled, ...}
+        self.DNumRequests = {}
+        self.LScalingDecisions = deque(maxlen=MAX_SCALING_DECISIONS)
+
         # Open the stdout/stderr files
         self.stdout_lock = allocate_lock()
         self.f_stdout = open(
@@ -161,6 +186,57 @@ class LoggerServer:
 
         return D
 
+    #=========================================================#
+    #                  Load/Autoscaling Stats                 #
+    #=========================================================#
+
+    @json_method
+    def _update_load_stats_(self, pid, DLoadStats):
+        """
+        Receive the number of calls a process handled
+        and how long they took since it last sent them
+
+        :param pid: the process ID of the calling worker (or manager)
+        :param DLoadStats: a snapshot from LoadStats
+        """
+        self.DLoadStats[pid] = (time.time(), DLoadStats)
+        self.DNumRequests[pid] = self.DNumRequests.get(pid, 0) + DLoadStats['num_requests']
+
+    @json_method
+    def get_load_stats(self):
+        """
+        :return: the combined load stats of all processes,
+                 as returned by combine_load_stats
+        """
+        expire_before = time.time() - LOAD_STATS_EXPIRE_SECS
+        return combine_load_stats([
+            DLoadStats for t, DLoadStats in list(self.DLoadStats.values())
+            if t > expire_before
+        ])
+
+    @json_method
+    def get_num_requests_by_pid(self):
+        """
+        :return: [[pid, the total number of calls the process
+                   has handled], ...]
+        """
+        return list(self.DNumRequests.items())
+
+    @json_method
+    def add_scaling_decision(self, DDecision):
+        """
+        Record a decision the autoscaler made, so it can be seen in
+        the web monitor. DDecision is a dict, with at least the keys
+        'time', 'from_workers', 'to_workers' and 'reason'.
+        """
+        self.LScalingDecisions.append(DDecision)
+
+    def get_L_scaling_decisions(self):
+        """
+        :return: the most recent autoscaling decisions, newest first
+        """
+        return list(reversed(self.LScalingDecisions))
+
     #=========================================================#
     #                 Write to stdout/stderr                  #
     #=========================================================#
@@ -239,8 +315,88 @@ class LoggerServer:
                     warnings.warn(f"PID {pid} for service {self.name}:{self.port} "
                                   f"still exists when it should have been killed!")
             self.LPIDs = []
+            self.SStartedPIDs = set()
+
+        if status == 'starting':
+            self.start_failed = False
+        elif status == 'stopped' and self.status == 'starting':
+            self.start_failed = True
 
         self.status = status
+        if status == 'started':
+            if not self.started_event.is_set():
+                self.started_time = time.time()
+            self.started_event.set()
+        else:
+            self.started_event.clear()
+
+    def wait_until_started(self, timeout=None):
+        """
+        Block until the service's status is 'started' (in the
+        process the LoggerServer is in, without polling)
+
+        :param timeout: the maximum number of seconds to wait, or None
+        :return: True if the service started, False if it timed out
+        """
+        return self.started_event.wait(timeout)
+
+    @json_method
+    def set_worker_started(self, pid):
+        """
+        Called by each worker once it's ready to handle calls
+
+        :param pid: the process ID of the calling worker
+        """
+        self.SStartedPIDs.add(pid)
+
+    @json_method
+    def is_worker_started(self, pid):
+        """
+        :param pid: the process ID of a worker
+        :return: whether the worker is ready to handle calls
+        """
+        return pid in self.SStartedPIDs
+
+    @json_method
+    def get_started_workers(self, LPIDs):
+        """
+        :param LPIDs: a list of worker process IDs
+        :return: the PIDs in `LPIDs` of the workers
+                 which are ready to handle calls
+        """
+        return [pid for pid in LPIDs if pid in self.SStartedPIDs]
+
+    #=========================================================#
+    #                    Rolling Restarts                     #
+    #=========================================================#
+
+    @json_method
+    def request_restart(self):
+        """
+        Ask the MultiProcessManager to replace its workers with ones
+        running the current version of the service's code, one at a
+        time, without interrupting clients. The MultiProcessManager
+        checks for requests periodically, so this returns straight
+        away: get_restart_status() gives the progress.
+        """
+        if self.restart_status not in ('requested', 'restarting'):
+            self.restart_status = 'requested'
+
+    @json_method
+    def get_restart_status(self):
+        """
+        :return: None if a restart has never been requested,
+                 otherwise 'requested', 'restarting', 'restarted'
+                 or 'failed'
+        """
+        return self.restart_status
+
+    @json_method
+    def set_restart_status(self, status):
+        """
+        Called by the MultiProcessManager as a restart progresses
+        """
+        self.restart_status = status
 
     #=========================================================#
     #                Service Time Series Data                 #
@@ -286,8 +442,8 @@ class LoggerServer:
         """
         #print("LOGGER SERVER REMOVE PID", pid)
         try:
-            self.LPIDs.pop(pid)
-        except IndexError:
+            self.LPIDs.remove(pid)
+        except ValueError:
             pass
         try:
             self.service_time_series_data.remove_pid(pid)
@@ -297,6 +453,12 @@ class LoggerServer:
             del self.DMethodStats[pid]
         except KeyError:
             pass
+        try:
+            del self.DLoadStats[pid]
+        except KeyError:
+            pass
+        self.DNumRequests.pop(pid, None)
+        self.SStartedPIDs.discard(pid)
 
     @json_method
     def start_collecting(self):
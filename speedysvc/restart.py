@@ -0,0 +1,69 @@
+import sys
+import time
+import importlib
+from sys import argv
+
+from speedysvc.toolkit.py_ini.read.ReadIni import ReadIni
+from speedysvc.logger.std_logging.LoggerClient import LoggerClient
+
+
+# Sections of the .ini file which aren't services
+_SNonServiceSections = {'web monitor', 'gateway', 'defaults'}
+
+
+def restart_service(server_methods, timeout=None):
+    """
+    Do a rolling restart of a service started by speedysvc.service:
+    its workers are replaced one at a time with ones running the
+    current version of its code, without interrupting clients.
+
+    :param server_methods: the service's server methods class
+    :param timeout: the maximum number of seconds to wait
+                    for the restart to finish, or None
+    :return: True if all the workers were replaced, False if the
+             restart failed (see the service's log for why)
+    :raise: TimeoutError if it didn't finish within `timeout`
+    """
+    logger_client = LoggerClient(server_methods, control_only=True)
+    try:
+        logger_client.request_restart()
+
+        t_from = time.time()
+        while True:
+            status = logger_client.get_restart_status()
+            if status == 'restarted':
+                return True
+            elif status == 'failed':
+                return False
+            elif timeout is not None and time.time()-t_from > timeout:
+                raise TimeoutError(
+                    f"Rolling restart of {server_methods.name} "
+                    f"didn't finish within {timeout} seconds"
+                )
+            time.sleep(0.5)
+    finally:
+        logger_client.shutdown()
+
+
+if __name__ == '__main__':
+    # python3 -m speedysvc.restart service.ini [service class name ...]
+    # restarts the named services in the .ini file, or all of them
+    DValues = ReadIni().read_dict(argv[1])
+    LSections = argv[2:] or [
+        i for i in DValues if i not in _SNonServiceSections
+    ]
+
+    all_ok = True
+    for section in LSections:
+        server_methods = getattr(
+            importlib.import_module(DValues[section]['import_from']),
+            section
+        )
+        print(f"Restarting service {server_methods.name}:", end=" ", flush=True)
+        if restart_service(server_methods):
+            print('[OK]')
+        else:
+            print('[FAILED]')
+            all_ok = False
+
+    sys.exit(0 if all_ok else 1)
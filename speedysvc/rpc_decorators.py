@@ -4,6 +4,7 @@ from .serialisation.MsgPackSerialisation import MsgPackSerialisation
 from .serialisation.PickleSerialisation import PickleSerialisation
 from .serialisation.RawSerialisation import RawSerialisation
 from .serialisation.MarshalSerialisation import MarshalSerialisation
+from .client_server.base_classes.ResultCache import ResultCache
 #from .serialisation.ArrowSerialisation import ArrowSerialisation
 
 
@@ -32,9 +33,15 @@ def __from_server_method(server_fn):
     assert not argspec.kwonlydefaults, \
         "Server function cannot have any keyword only defaults"
 
+    if getattr(server_fn, 'cache_max_entries', None):
+        result_cache = ResultCache(server_fn, server_fn.cache_max_entries)
+        send = result_cache.send
+    else:
+        send = lambda self, args: self.send(server_fn, args)
+
     def fn(self, *args, **kw):
         if not kw:
-            return self.send(server_fn, args)
+            return send(self, args)
         else:
             for k in kw:
                 if k not in base_args_no_self:
@@ -62,7 +69,7 @@ def __from_server_method(server_fn):
                         )
                     args_list.append(argspec.defaults[y])
 
-            return self.send(server_fn, args_list)
+            return send(self, args_list)
     return fn
 
 
@@ -76,6 +83,8 @@ def __network_method(fn, serialiser):
     assert not hasattr(fn, 'serialiser'), \
         f"Serialiser has already been set for {fn}"
     fn.serialiser = serialiser
+    # `async def` methods are run on the worker's event loop
+    fn.is_async = inspect.iscoroutinefunction(fn)
     fn.as_rpc = lambda: __from_server_method(fn)
     fn.metadata = {
         'num_calls': 0,
@@ -98,6 +107,11 @@ def json_method(fn):
     the built-in json module. Tested the most, and quite
     interoperable: I generally use this, unless there's a
     good reason not to.
+
+    This and the other serialisation decorators can also be
+    used for `async def` methods, which each worker process
+    runs concurrently on its own asyncio event loop (see
+    WorkerEventLoop). Clients call them in the same way.
     """
     return __network_method(fn, JSONSerialisation)
 
@@ -134,6 +148,91 @@ def marshal_method(fn):
     return __network_method(fn, MarshalSerialisation)
 
 
+def singleflight(fn):
+    """
+    Mark a method so that if identical calls (the same
+    method and arguments) are in progress at once in a
+    worker process, the method is only actually called
+    once, with every caller getting the same result.
+
+    Useful for expensive methods where many clients request
+    the same thing at the same time, e.g. when a popular
+    cached value expires. Only use this for methods which
+    don't have side effects.
+
+    Can be used before or after the serialisation
+    decorator, e.g.:
+
+    @singleflight
+    @json_method
+    def get_popular_item(self, key):
+        ...
+    """
+    fn.singleflight = True
+    return fn
+
+
+def cached(max_entries=128):
+    """
+    Mark a method as returning data which rarely changes (e.g.
+    configuration), so that clients on the same host as the service
+    keep up to `max_entries` results in a per-process LRU cache.
+
+    Whenever the data changes, the service must call
+    `self.invalidate_cache(self.method_name)` so that clients
+    stop using the cached results straight away. Cached
+    results are shared, so shouldn't be modified by callers.
+
+    @cached(max_entries=1000)
+    @json_method
+    def get_config(self, key):
+        ...
+    """
+    def decorator(fn):
+        fn.cache_max_entries = max_entries
+        return fn
+    return decorator
+
+
+def oneway(fn):
+    """
+    Mark a method as only having side effects, with the result
+    not being needed by clients (e.g. recording metrics or click
+    events), so that it can be called over udp://. Calls over
+    udp:// aren't acknowledged, and may be lost, so only use
+    this for calls where that's acceptable.
+
+    @oneway
+    @json_method
+    def record_event(self, name, value):
+        ...
+    """
+    fn.oneway = True
+    return fn
+
+
+def concurrency_limit(max_concurrency, max_queued=0):
+    """
+    Limit how many calls to a method are handled at once, e.g. for
+    methods which use a lot of memory, or a resource which only
+    allows a few connections. Up to `max_queued` calls on top of
+    that wait for a free slot, and any more are rejected with
+    ServiceBusyError straight away, so clients can shed load or
+    fall back to something else. The limits apply to each worker
+    process separately.
+
+    @concurrency_limit(max_concurrency=2, max_queued=10)
+    @json_method
+    def render_report(self, report_id):
+        ...
+    """
+    def decorator(fn):
+        fn.max_concurrency = max_concurrency
+        fn.max_queued = max_queued
+        return fn
+    return decorator
+
+
 #def arrow_method(fn):
 #    """
 #    Define a method that sends/receives data using the
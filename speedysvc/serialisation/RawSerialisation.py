@@ -4,6 +4,10 @@ class RawSerialisation:
     only returning raw `bytes`
     (and making sure that bytes is indeed
     the type that is being sent/received).
+
+    bytearrays and memoryviews are also accepted
+    when sending, so that large buffers received
+    from the network don't need to be copied.
     """
     mimetype = 'application/octet-stream'
 
@@ -15,12 +19,14 @@ class RawSerialisation:
                 f"len 1 with a bytes object in it"
             o = o[0]
 
-        if not isinstance(o, bytes):
+        if not isinstance(o, (bytes, bytearray, memoryview)):
             raise TypeError(f"Object {o} should be of type bytes")
         return o
 
     @staticmethod
     def loads(o):
-        if not isinstance(o, bytes):
+        if isinstance(o, (bytearray, memoryview)):
+            o = bytes(o)
+        elif not isinstance(o, bytes):
             raise TypeError(f"Object {o} should be of type bytes")
         return o
@@ -17,6 +17,8 @@ from speedysvc.toolkit.io.make_dirs import make_dirs
 from speedysvc.toolkit.py_ini.read.ReadIni import ReadIni
 from speedysvc.kill_pid_and_children import kill_pid_and_children
 from speedysvc.web_monitor.app import web_service_manager, run_server
+from speedysvc.client_server.network.GatewayServer import GatewayServer
+from speedysvc.client_server.network.consts import DEFAULT_GATEWAY_PORT
 
 
 _handling_sigint = [False]
@@ -81,9 +83,24 @@ class Services:
             'log_dir': lambda x: x,
             'tcp_bind': lambda x: x,
             'tcp_allow_insecure_serialisation': self.__convert_bool,
+            'tcp_reuseport': self.__convert_bool,
+            'unix_bind': lambda x: x,
+            'udp_bind': lambda x: x,
             'max_proc_num': self.__greater_than_0_int,
             'min_proc_num': self.__greater_than_0_int,
             'max_proc_mem_bytes': self.__greater_than_0_int_or_none,
+            'worker_max_requests': self.__greater_than_0_int_or_none,
+            'worker_max_rss_bytes': self.__greater_than_0_int_or_none,
+            'worker_max_age_secs': self.__greater_than_0_int_or_none,
+            'zygote': self.__convert_bool,
+            'cpu_affinity': lambda x: x,
+            'max_concurrency': self.__greater_than_0_int_or_none,
+            'max_queued': int,
+            'autoscaler': lambda x: x,
+            'autoscaler_options': json.loads,
+            'drain_timeout_secs': self.__greater_than_0_int,
+            'worker_start_timeout_secs': self.__greater_than_0_int,
+            'start_quorum': self.__greater_than_0_int,
             'wait_until_completed': self.__convert_bool
         }
 
@@ -92,6 +109,17 @@ class Services:
         else:
             self.DWebMonitor = {}
 
+        if 'gateway' in self.DValues:
+            # Serve all services (which have tcp_bind set)
+            # on a single port, as well as their own ports
+            DGateway = self.DValues.pop('gateway')
+            self.gateway_server = GatewayServer(
+                tcp_bind_address=DGateway.get('host', '127.0.0.1'),
+                port=int(DGateway.get('port', DEFAULT_GATEWAY_PORT))
+            )
+        else:
+            self.gateway_server = None
+
         if 'defaults' in self.DValues:
             DDefaults = self.DValues.pop('defaults')
             self.DDefaults = DDefaults = {
@@ -144,13 +172,97 @@ class Services:
 
     def start_all_services(self):
         """
+        Start all the services in the .ini file. Services are started in
+        waves: those which don't depend on others (using depends_on) are
+        started at the same time, then once they're ready, those which
+        depend only on them, and so on. How long each took to start is
+        printed after, slowest first.
+        """
+        LWaves, DDependsOn = self.__get_startup_waves()
+        DStartupTimes = {}  # {section: (wave number, seconds), ...}
+        SFailed = set()
+
+        for wave_num, LWave in enumerate(LWaves, start=1):
+            DStarted = {}  # {section: (server_methods, time started), ...}
+            for section in LWave:
+                LFailedDeps = [i for i in DDependsOn[section] if i in SFailed]
+                if LFailedDeps:
+                    print(f"Not starting service {section}, as "
+                          f"{', '.join(LFailedDeps)} didn't start")
+                    SFailed.add(section)
+                    continue
+                DStarted[section] = (
+                    self.start_service(section, wait=False), time.time()
+                )
+
+            # The services in the wave start in parallel in their own
+            # processes, so wait for them all before starting the next
+            for section, (server_methods, t_from) in DStarted.items():
+                if self.__wait_until_started(server_methods):
+                    logger_server = self.DLoggerServersByPort[server_methods.port]
+                    DStartupTimes[section] = (
+                        wave_num, logger_server.started_time - t_from
+                    )
+                    print(f"Service {server_methods.name} started [OK]")
+                else:
+                    SFailed.add(section)
+                    print(f"Service {server_methods.name} [FAILED]: its "
+                          f"workers didn't start")
+
+        print("Service startup times (slowest first):")
+        for section, (wave_num, secs) in sorted(
+            DStartupTimes.items(), key=lambda i: -i[1][1]
+        ):
+            print(f"    {secs:7.2f}s  {section} (wave {wave_num})")
+        for section in SFailed:
+            print(f"     FAILED  {section}")
+
+    def __get_startup_waves(self):
+        """
+        :return: ([[section, ...], ...] in the order the services should
+                  be started in, {section: [section it depends on, ...]})
+        """
+        DDependsOn = {}
+        for section, DSection in self.DValues.items():
+            DDependsOn[section] = [
+                i.strip() for i in DSection.get('depends_on', '').split(',')
+                if i.strip()
+            ]
+            for depends_on in DDependsOn[section]:
+                assert depends_on in self.DValues, \
+                    f"Service {section} depends on {depends_on}, " \
+                    f"which isn't in the .ini file!"
+
+        LWaves = []
+        SInWaves = set()
+        while len(SInWaves) < len(DDependsOn):
+            LWave = [
+                section for section, LDependsOn in DDependsOn.items()
+                if not section in SInWaves and
+                   all(i in SInWaves for i in LDependsOn)
+            ]
+            assert LWave, \
+                f"The depends_on of services " \
+                f"{', '.join(i for i in DDependsOn if not i in SInWaves)} " \
+                f"are circular!"
+            LWaves.append(LWave)
+            SInWaves.update(LWave)
+        return LWaves, DDependsOn
+
+    def __wait_until_started(self, server_methods):
+        """
+        Wait until a service has started, or has failed to start
+        (it was stopped while starting, e.g. as too many of its
+        workers crashed, or its MultiProcessManager exited)
 
-        :return:
+        :return: True if it started
         """
-        for service_class_name in self.DValues.keys():
-            # Note that DValues is an OrderedDict, which means services
-            # are created in the order they're defined in the .ini file.
-            self.start_service(service_class_name)
+        logger_server = self.DLoggerServersByPort[server_methods.port]
+        proc = self.DProcByPort[server_methods.port]
+        while not logger_server.wait_until_started(timeout=0.25):
+            if logger_server.start_failed or proc.poll() is not None:
+                return False
+        return True
 
     def start_service_by_port(self, port):
         """
@@ -168,15 +280,18 @@ class Services:
         """
         self.start_service(self.DValuesByName[name])
 
-    def start_service(self, service_class_name):
+    def start_service(self, service_class_name, wait=None):
         """
 
         :param service_class_name:
-        :return:
+        :param wait: whether to block until the service has started.
+                     If None, uses the service's wait_until_completed
+        :return: the service's server methods class
         """
         # print("SECTION:", section)
         DSection = self.DValues[service_class_name].copy()
         import_from = DSection.pop('import_from')
+        DSection.pop('depends_on', None)
         server_methods = getattr(
             importlib.import_module(import_from),
             service_class_name
@@ -191,12 +306,26 @@ class Services:
 
         DArgs = self.DDefaults.copy()
         DArgs.update({k: self.DArgKeys[k](v) for k, v in DSection.items()})
+
+        if self.gateway_server and DArgs.get('tcp_bind'):
+            self.gateway_server.add_service(
+                server_methods,
+                allow_insecure_serialisation=DArgs.get(
+                    'tcp_allow_insecure_serialisation', False
+                )
+            )
         self.__run_multi_proc_server(
             server_methods, import_from, service_class_name,
             **DArgs,
             fifo_json_log_parent=self.fifo_json_log_parent
         )
 
+        if wait is None:
+            wait = DArgs.get('wait_until_completed', False)
+        if wait:
+            self.__wait_until_started(server_methods)
+        return server_methods
+
     #====================================================================#
     #                           Stop Services                            #
     #====================================================================#
@@ -225,6 +354,29 @@ class Services:
         self.__kill_proc(proc)
         self.DLoggerServersByPort[name].set_service_status('stopped')
 
+    #====================================================================#
+    #                          Restart Services                          #
+    #====================================================================#
+
+    def restart_service_by_port(self, port):
+        """
+        Replace the workers of a service with ones running the current
+        version of its code one at a time, without interrupting clients.
+        This returns straight away - the service's MultiProcessManager
+        does the restart in the background.
+
+        :param port:
+        """
+        self.DLoggerServersByPort[port].request_restart()
+
+    def restart_service_by_name(self, name):
+        """
+        See restart_service_by_port
+
+        :param name:
+        """
+        self.DLoggerServersByName[name].request_restart()
+
     def __kill_proc(self, proc):
         self.DProcByPort = {
             port: i_proc for port, i_proc in self.DProcByPort.copy().items()
@@ -245,15 +397,30 @@ class Services:
                                 log_dir='/tmp',
                                 tcp_bind=None,
                                 tcp_allow_insecure_serialisation=False,
+                                tcp_reuseport=False,
+                                unix_bind=None,
+                                udp_bind=None,
 
                                 max_proc_num=1,
                                 min_proc_num=1,
                                 max_proc_mem_bytes=None,
+                                worker_max_requests=None,
+                                worker_max_rss_bytes=None,
+                                worker_max_age_secs=None,
+                                zygote=False,
+                                cpu_affinity=None,
+                                max_concurrency=None,
+                                max_queued=None,
+                                autoscaler='cpu',
+                                autoscaler_options=None,
+                                drain_timeout_secs=60,
+                                worker_start_timeout_secs=120,
+                                start_quorum=None,
                                 wait_until_completed=False,
 
                                 fifo_json_log_parent=None):
 
-        print(f"Starting service {server_methods.name}:", end=" ")
+        print(f"Starting service {server_methods.name}")
 
         # Create the logger server, which allows
         # the services to communicate back with us
@@ -283,15 +450,30 @@ class Services:
             'section': section,
             'tcp_bind': tcp_bind,
             'tcp_allow_insecure_serialisation': tcp_allow_insecure_serialisation,
+            'tcp_reuseport': tcp_reuseport,
+            'unix_bind': unix_bind,
+            'udp_bind': udp_bind,
 
             'min_proc_num': min_proc_num,
             'max_proc_num': max_proc_num,
             'max_proc_mem_bytes': max_proc_mem_bytes,
+            'worker_max_requests': worker_max_requests,
+            'worker_max_rss_bytes': worker_max_rss_bytes,
+            'worker_max_age_secs': worker_max_age_secs,
+            'zygote': zygote,
+            'cpu_affinity': cpu_affinity,
+            'max_concurrency': max_concurrency,
+            'max_queued': max_queued,
 
             'new_proc_cpu_pc': 0.3,
             'new_proc_avg_over_secs': 20,
             'kill_proc_avg_over_secs': 240,
+            'autoscaler': autoscaler,
+            'autoscaler_options': autoscaler_options,
+            'drain_timeout_secs': drain_timeout_secs,
+            'worker_start_timeout_secs': worker_start_timeout_secs,
 
+            'start_quorum': start_quorum,
             'wait_until_completed': wait_until_completed
         }
         proc = subprocess.Popen([
@@ -306,12 +488,6 @@ class Services:
         logger_server.tcp_bind = tcp_bind  # HACK!
         web_service_manager.add_service(logger_server)
 
-        if wait_until_completed:
-            while logger_server.get_service_status() != 'started':
-                time.sleep(0.1)
-
-        print('[OK]')
-
 
 if __name__ == '__main__':
     services = Services()
@@ -0,0 +1,103 @@
+import time
+from _thread import start_new_thread
+
+import pytest
+
+from speedysvc.client_server.admission import AdmissionControl, ServiceBusyError
+from speedysvc.client_server.base_classes.ServerMethodsBase import ServerMethodsBase
+from speedysvc.client_server.network.NetworkServer import NetworkServer
+from speedysvc.client_server.network.NetworkClient import NetworkClient
+from speedysvc.rpc_decorators import json_method, concurrency_limit
+from speedysvc.test.utils import call_in_threads, wait_for
+
+
+class FakeLoadStats:
+    def __init__(self):
+        self.LQueueWaits = []
+
+    def add_queue_wait(self, wait_secs):
+        self.LQueueWaits.append(wait_secs)
+
+
+class AdmissionMethods(ServerMethodsBase):
+    port = 5749
+    name = 'test_admission'
+
+    @concurrency_limit(1)
+    @json_method
+    def slow(self, secs):
+        time.sleep(secs)
+        return secs
+
+    @json_method
+    def echo(self, data):
+        return data
+
+
+def test_calls_over_the_limits_rejected():
+    load_stats = FakeLoadStats()
+    admission_control = AdmissionControl(
+        'test_admission', load_stats, max_concurrency=1, max_queued=1
+    )
+    LLimits = admission_control.acquire('echo', None)
+    assert admission_control.is_saturated()
+
+    # One call can wait for the running call to finish,
+    # but a call on top of that is rejected straight away
+    LWaiting = []
+    start_new_thread(
+        lambda: LWaiting.append(admission_control.acquire('echo', None)), ()
+    )
+    time.sleep(0.1)
+    assert not LWaiting
+    with pytest.raises(ServiceBusyError):
+        admission_control.acquire('echo', None)
+
+    admission_control.release(LLimits)
+    wait_for(lambda: LWaiting)
+    assert len(load_stats.LQueueWaits) == 1
+    admission_control.release(LWaiting[0])
+    assert not admission_control.is_saturated()
+
+
+def test_method_limits_scaled_by_workers():
+    # For the manager's NetworkServer, which forwards to 2 workers
+    admission_control = AdmissionControl(
+        'test_admission', FakeLoadStats(), num_workers=2
+    )
+    fn = AdmissionMethods.slow
+    LLimits = [
+        admission_control.acquire('slow', fn, wait=False)
+        for x in range(2)
+    ]
+    with pytest.raises(ServiceBusyError):
+        admission_control.acquire('slow', fn, wait=False)
+    # Methods without limits aren't affected
+    assert admission_control.acquire('echo', AdmissionMethods.echo) == []
+
+    for i in LLimits:
+        admission_control.release(i)
+    admission_control.release(admission_control.acquire('slow', fn, wait=False))
+
+
+def test_network_server_rejects_busy_method():
+    server = NetworkServer(AdmissionMethods(None), call_directly=True)
+    try:
+        LClients = [NetworkClient(AdmissionMethods) for x in range(2)]
+        LResults = call_in_threads(
+            lambda client, secs: client.send(AdmissionMethods.slow, [secs]),
+            [(LClients[0], 0.5), (LClients[1], 0)],
+            stagger_secs=0.1
+        )
+        # The second call was rejected rather than queued,
+        # and the client got the same type of exception
+        assert LResults[0] == 0.5
+        assert isinstance(LResults[1], ServiceBusyError)
+
+        # Once the first call has finished, calls are accepted again
+        assert LClients[1].send(AdmissionMethods.slow, [0]) == 0
+        assert LClients[1].send(AdmissionMethods.echo, ['ok']) == 'ok'
+        for client in LClients:
+            client.close()
+    finally:
+        server.shutdown(timeout=1)
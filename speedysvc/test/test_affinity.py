@@ -0,0 +1,46 @@
+import os
+import tempfile
+
+import pytest
+
+from speedysvc.client_server.shared_memory import affinity
+from speedysvc.client_server.shared_memory.affinity import \
+    parse_cpu_list, get_numa_nodes, get_numa_node, get_cpu_sets
+
+
+pytestmark = pytest.mark.skipif(
+    not affinity.has_affinity,
+    reason="CPU affinity isn't supported on this platform"
+)
+
+
+def test_parse_cpu_sets():
+    assert parse_cpu_list('0-3,8,10-11\n') == {0, 1, 2, 3, 8, 10, 11}
+    assert parse_cpu_list('') == set()
+
+    assert get_cpu_sets(None) is None
+    assert get_cpu_sets('none') is None
+    assert get_cpu_sets('0-1;2,3;') == [{0, 1}, {2, 3}]
+    assert get_cpu_sets([[0, 1], [2]]) == [{0, 1}, {2}]
+
+
+def test_numa_nodes(monkeypatch):
+    # A host with two NUMA nodes of four CPUs each
+    node_path = tempfile.mkdtemp()
+    for node, cpu_list in (('node0', '0-3'), ('node1', '4-7')):
+        os.mkdir(f'{node_path}/{node}')
+        with open(f'{node_path}/{node}/cpulist', 'w') as f:
+            f.write(cpu_list + '\n')
+    monkeypatch.setattr(affinity, 'NODE_SYSFS_PATH', node_path)
+
+    DAffinity = {0: {1, 2, 3, 4, 5}, 1001: {2, 3}, 1002: {3, 4}}
+    monkeypatch.setattr(os, 'sched_getaffinity', DAffinity.__getitem__)
+
+    # Only the CPUs this process is allowed to use are included
+    assert get_numa_nodes() == [{1, 2, 3}, {4, 5}]
+    assert get_cpu_sets('numa') == [{1, 2, 3}, {4, 5}]
+
+    assert get_numa_node(1001) == 0
+    # Pinned to CPUs on both nodes
+    assert get_numa_node(1002) is None
+    assert get_numa_node() is None
@@ -0,0 +1,66 @@
+import time
+import asyncio
+
+import pytest
+
+from speedysvc.client_server.base_classes.ServerMethodsBase import ServerMethodsBase
+from speedysvc.client_server.network.NetworkServer import NetworkServer
+from speedysvc.client_server.network.NetworkClient import NetworkClient
+from speedysvc.rpc_decorators import json_method, concurrency_limit
+from speedysvc.test.utils import call_in_threads
+
+
+class AsyncMethods(ServerMethodsBase):
+    port = 5750
+    name = 'test_async_methods'
+
+    @json_method
+    async def sleep(self, secs):
+        await asyncio.sleep(secs)
+        return secs
+
+
+class CancellingMethods(AsyncMethods):
+    port = 5850
+    name = 'test_async_cancelling'
+
+    @concurrency_limit(1)
+    @json_method
+    async def cancelled(self):
+        asyncio.current_task().cancel()
+        await asyncio.sleep(10)
+
+
+def test_async_calls_run_concurrently():
+    server = NetworkServer(AsyncMethods(None), call_directly=True)
+    try:
+        LClients = [NetworkClient(AsyncMethods) for x in range(20)]
+        t_from = time.time()
+        LResults = call_in_threads(
+            lambda client: client.send(AsyncMethods.sleep, [0.5]),
+            [(client,) for client in LClients]
+        )
+        assert LResults == [0.5] * 20
+        # Rather than waiting for free threads in the pool
+        assert time.time() - t_from < 2.0
+
+        for client in LClients:
+            client.close()
+    finally:
+        server.shutdown(timeout=1)
+
+
+def test_cancelled_call_finished():
+    server = NetworkServer(CancellingMethods(None), call_directly=True)
+    try:
+        client = NetworkClient(CancellingMethods)
+        for x in range(2):
+            # The client gets an error rather than waiting forever, and
+            # the call's admission slot is freed, so the second
+            # call isn't rejected with ServiceBusyError
+            with pytest.raises(RuntimeError, match='cancelled'):
+                client.send(CancellingMethods.cancelled, [])
+        assert client.send(CancellingMethods.sleep, [0]) == 0
+        client.close()
+    finally:
+        server.shutdown(timeout=1)
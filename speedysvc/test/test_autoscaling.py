@@ -0,0 +1,64 @@
+from speedysvc.client_server.shared_memory.autoscaling import \
+    LoadAutoscaler, get_autoscaler
+
+
+class FakeLoggerClient:
+    def __init__(self):
+        """
+        Gives the autoscaler the combined load stats
+        of a service, without needing any workers
+        """
+        self.DLoadStats = {
+            'request_rate': 0.0,
+            'in_flight': 0,
+            'concurrency': 0.0,
+            'queue_wait': None,
+            'p95_latency': None
+        }
+
+    def get_load_stats(self):
+        return self.DLoadStats
+
+
+def test_load_autoscaler():
+    logger_client = FakeLoggerClient()
+    autoscaler = get_autoscaler('load', {
+        'scale_up_after': 2, 'scale_down_after': 3,
+        'scale_up_cooldown_secs': 10, 'scale_down_cooldown_secs': 100
+    })
+    assert isinstance(autoscaler, LoadAutoscaler)
+
+    def decide(num_workers, time_since_last_op=1000):
+        DDecision = autoscaler.decide(
+            logger_client, num_workers, 1, 4, time_since_last_op
+        )
+        return DDecision and DDecision['to_workers']
+
+    # Saturated, but only scaled up after two checks in a row
+    logger_client.DLoadStats['concurrency'] = 3.0
+    assert decide(2) is None
+    assert decide(2) == 3
+    # ...and not within the cooldown, or over max_proc_num
+    assert decide(3) is None
+    assert decide(3, time_since_last_op=5) is None
+    assert decide(4) is None
+
+    # Calls spend too long queued for a worker
+    logger_client.DLoadStats['concurrency'] = 1.0
+    logger_client.DLoadStats['queue_wait'] = 0.5
+    assert decide(3) is None
+    assert decide(3) == 4
+
+    # Removing a worker would still leave it under half the
+    # limits, which has to happen three checks in a row
+    logger_client.DLoadStats['concurrency'] = 0.5
+    logger_client.DLoadStats['queue_wait'] = 0.001
+    assert decide(4) is None
+    assert decide(4) is None
+    assert decide(4, time_since_last_op=50) is None
+    assert decide(4) == 3
+
+    # Not under half the limit with one less worker
+    logger_client.DLoadStats['concurrency'] = 0.9
+    for x in range(5):
+        assert decide(2) is None
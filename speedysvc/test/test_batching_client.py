@@ -0,0 +1,59 @@
+import pytest
+
+from speedysvc.client_server.base_classes.ServerMethodsBase import ServerMethodsBase
+from speedysvc.client_server.network.NetworkServer import NetworkServer
+from speedysvc.client_server.network.NetworkClient import NetworkClient
+from speedysvc.client_server.wrappers.BatchingClient import BatchingClient
+from speedysvc.compression.compression_types import null_compression
+from speedysvc.rpc_decorators import json_method
+from speedysvc.test.utils import call_in_threads
+
+
+class BatchingMethods(ServerMethodsBase):
+    port = 5732
+    name = 'test_batching'
+
+    def __init__(self, logger_client):
+        ServerMethodsBase.__init__(self, logger_client)
+        self.num_calls = 0
+
+    @json_method
+    def double(self, x):
+        self.num_calls += 1
+        if x == 3:
+            raise ValueError(x)
+        return x * 2
+
+
+class CountingClient(NetworkClient):
+    num_sends = 0
+
+    def send(self, fn, data):
+        self.num_sends += 1
+        return NetworkClient.send(self, fn, data)
+
+
+def test_calls_are_batched():
+    server_methods = BatchingMethods(None)
+    server = NetworkServer(server_methods, call_directly=True)
+    network_client = CountingClient(BatchingMethods, compression_inst=null_compression)
+    client = BatchingClient(network_client, batch_window_secs=0.2)
+    try:
+        LResults = call_in_threads(
+            lambda x: client.send(BatchingMethods.double, [x]),
+            [(x,) for x in range(8)]
+        )
+        # Only the call which raised an exception fails
+        assert [r for x, r in enumerate(LResults) if x != 3] == \
+               [x * 2 for x in range(8) if x != 3]
+        assert isinstance(LResults[3], ValueError)
+        assert server_methods.num_calls == 8
+        assert network_client.num_sends == 1
+
+        # A call made on its own is sent as a normal call
+        assert client.send(BatchingMethods.double, [5]) == 10
+        with pytest.raises(ValueError):
+            client.send(BatchingMethods.double, [3])
+    finally:
+        client.close()
+        server.shutdown(timeout=1)
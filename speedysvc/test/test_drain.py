@@ -0,0 +1,79 @@
+import os
+import time
+import signal
+import tempfile
+
+import psutil
+import pytest
+
+from speedysvc.client_server.base_classes.ServerMethodsBase import ServerMethodsBase
+from speedysvc.client_server.shared_memory.SHMServer import SHMServer
+from speedysvc.client_server.shared_memory.SHMClient import SHMClient, ResponseTimeoutError
+from speedysvc.rpc_decorators import json_method
+from speedysvc.test.utils import call_in_threads, start_service, stop_service
+
+
+class DrainMethods(ServerMethodsBase):
+    port = 5743
+    name = 'test_drain'
+
+    @json_method
+    def sleep_then_echo(self, secs, data):
+        time.sleep(secs)
+        return data
+
+
+class StoppingMethods(DrainMethods):
+    port = 5843
+    name = 'test_drain_stopping'
+
+
+def test_calls_finish_while_draining():
+    shm_server = SHMServer(DrainMethods(None))
+    client = SHMClient(DrainMethods)
+    assert client.send(DrainMethods.sleep_then_echo, [0, 'started']) == 'started'
+
+    def shutdown():
+        time.sleep(0.2)
+        t_from = time.time()
+        shm_server.shutdown(timeout=10)
+        return time.time() - t_from
+
+    # The call in progress finishes, and shutdown() waits for it
+    LResults = call_in_threads(lambda fn, args: fn(*args), [
+        (client.send, (DrainMethods.sleep_then_echo, [1.0, 'in progress'])),
+        (shutdown, ())
+    ])
+    assert LResults[0] == 'in progress'
+    assert 0.5 < LResults[1] < 5
+    assert shm_server.num_threads == 0
+
+    # ...but no more are taken, so that other workers can handle them
+    with pytest.raises(ResponseTimeoutError):
+        client.send(DrainMethods.sleep_then_echo, [0, 'after'], timeout=1)
+
+
+def test_stop_after_worker_died():
+    logger_server, proc = start_service(
+        StoppingMethods, tempfile.mkdtemp(),
+        min_proc_num=2, max_proc_num=2
+    )
+    try:
+        assert logger_server.wait_until_started(timeout=30)
+        LPIDs = logger_server.LPIDs[:]
+        assert len(LPIDs) == 2
+
+        # Stop the service before, or while, the
+        # manager notices the worker has gone
+        os.kill(LPIDs[0], signal.SIGKILL)
+        assert stop_service(proc) == 0
+        assert logger_server.get_service_status() == 'stopped'
+
+        # Including the worker the manager may have started in its place
+        for pid in LPIDs + logger_server.LPIDs:
+            assert (
+                not psutil.pid_exists(pid) or
+                psutil.Process(pid).status() == psutil.STATUS_ZOMBIE
+            )
+    finally:
+        stop_service(proc)
@@ -0,0 +1,84 @@
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from speedysvc.client_server.wrappers.FailoverClient import FailoverClient
+from speedysvc.client_server.network.NetworkClient import ConnectionLostError
+
+
+class FailoverMethods:
+    port = 5740
+    name = 'test_failover'
+
+
+def echo(data):
+    pass
+
+
+class FakeClient:
+    server_methods = FailoverMethods
+    port = FailoverMethods.port
+
+    def __init__(self, address, latency):
+        """
+        Stands in for a NetworkClient connected to `address`,
+        which can be made to fail or hang
+        """
+        self.address = address
+        self.latency = latency
+        self.fail = False
+        self.hang = False
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def submit(self, fn, data):
+        future = Future()
+        time.sleep(self.latency)
+        if self.fail:
+            future.set_exception(ConnectionLostError(self.address))
+        elif not self.hang:
+            if data == ['raise']:
+                future.set_exception(ValueError(self.address))
+            else:
+                future.set_result((self.address, data))
+        return future
+
+
+def test_calls_fail_over():
+    DClients = {
+        address: FakeClient(address, latency)
+        for address, latency in (('a', 0.0), ('b', 0.02), ('c', 0.05))
+    }
+    client = FailoverClient(
+        FailoverMethods, ['a', 'b', 'c'], DClients.__getitem__,
+        # Only the initial heartbeats are sent
+        probe_every_secs=1000, call_timeout_secs=0.2
+    )
+    try:
+        assert client.send(echo, [1]) == ('a', [1])
+
+        # Exceptions raised by the method aren't failures of the address
+        with pytest.raises(ValueError):
+            client.send(echo, ['raise'])
+        assert client.get_address() == 'a'
+
+        # The connection is lost
+        DClients['a'].fail = True
+        assert client.send(echo, [2]) == ('b', [2])
+        assert DClients['a'].closed
+
+        # A call doesn't get a response in time
+        DClients['b'].hang = True
+        t_from = time.time()
+        assert client.send(echo, [3]) == ('c', [3])
+        assert time.time() - t_from < 1.0
+        assert client.get_address() == 'c'
+
+        DClients['c'].fail = True
+        with pytest.raises(ConnectionLostError):
+            client.send(echo, [4])
+    finally:
+        client.close()
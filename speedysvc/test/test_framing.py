@@ -0,0 +1,38 @@
+import os
+import socket
+from struct import Struct
+from _thread import start_new_thread
+
+from speedysvc.client_server.network.framing import \
+    RecvBuffer, send_buffers, LARGE_FRAME_SIZE
+
+
+header_packer = Struct('!I')
+
+
+def test_frames_round_trip():
+    """
+    Frames either side of LARGE_FRAME_SIZE (which are received into
+    their own buffer) are sent with sendmsg without joining the header
+    and body, and received intact, however the data is split by recv()
+    """
+    LBodies = [
+        b'', b'x', os.urandom(1000),
+        os.urandom(LARGE_FRAME_SIZE), os.urandom(LARGE_FRAME_SIZE + 1),
+        os.urandom(LARGE_FRAME_SIZE * 20), b'y' * 10,
+    ]
+    sock_a, sock_b = socket.socketpair()
+    try:
+        def send_all():
+            for body in LBodies:
+                send_buffers(sock_a, [header_packer.pack(len(body)), memoryview(body)])
+        start_new_thread(send_all, ())
+
+        recv_buffer = RecvBuffer(size=1024)
+        for body in LBodies:
+            size, = recv_buffer.read_header(sock_b, header_packer)
+            assert size == len(body)
+            assert bytes(recv_buffer.read_exactly(sock_b, size)) == body
+    finally:
+        sock_a.close()
+        sock_b.close()
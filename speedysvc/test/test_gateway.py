@@ -0,0 +1,47 @@
+import pytest
+
+from speedysvc.client_server.base_classes.ServerMethodsBase import ServerMethodsBase
+from speedysvc.client_server.shared_memory.SHMServer import SHMServer
+from speedysvc.client_server.network.GatewayServer import GatewayServer
+from speedysvc.client_server.network.GatewayClient import GatewayClient
+from speedysvc.compression.compression_types import null_compression
+from speedysvc.rpc_decorators import json_method, pickle_method
+
+
+GATEWAY_PORT = 5837
+
+
+class GatewayMethods(ServerMethodsBase):
+    port = 5737
+    name = 'test_gateway'
+
+    @json_method
+    def echo(self, data):
+        return data
+
+    @pickle_method
+    def pickle_echo(self, data):
+        return data
+
+
+def test_calls_routed_to_services():
+    shm_server = SHMServer(GatewayMethods(None))
+    gateway = GatewayServer(port=GATEWAY_PORT)
+    gateway.add_service(GatewayMethods)
+    client = GatewayClient(
+        GatewayMethods, port=GATEWAY_PORT, compression_inst=null_compression
+    )
+    try:
+        assert client.send(GatewayMethods.echo, [[1, 2]]) == [1, 2]
+
+        # Only services which were added can be called,
+        # and not with insecure serialisation by default
+        with pytest.raises(PermissionError):
+            client.send(GatewayMethods.pickle_echo, [[1, 2]])
+        gateway.remove_service(GatewayMethods)
+        with pytest.raises(KeyError):
+            client.send(GatewayMethods.echo, [[1, 2]])
+    finally:
+        client.connection.close()
+        gateway.shutdown(timeout=1)
+        shm_server.shutdown(timeout=1)
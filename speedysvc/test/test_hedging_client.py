@@ -0,0 +1,44 @@
+import time
+
+from speedysvc.client_server.wrappers.HedgingClient import HedgingClient
+
+
+def echo(data):
+    pass
+
+
+class SleepingClient:
+    server_methods = None
+    port = 5735
+
+    def __init__(self, name, secs):
+        self.name = name
+        self.secs = secs
+
+    def send(self, fn, data):
+        time.sleep(self.secs)
+        return self.name, data
+
+
+def test_slow_calls_are_hedged():
+    primary = SleepingClient('primary', 0.01)
+    client = HedgingClient(
+        [primary, SleepingClient('secondary', 0.01)],
+        budget=0.5, max_burst=1, min_samples=5
+    )
+    try:
+        for x in range(5):
+            assert client.send(echo, [x]) == ('primary', [x])
+
+        # The secondary responds first once the primary slows down
+        primary.secs = 1.0
+        t_from = time.time()
+        assert client.send(echo, [5]) == ('secondary', [5])
+        assert time.time() - t_from < 0.5
+
+        # ...but only while within the budget for extra calls
+        assert client.send(echo, [6]) == ('primary', [6])
+        assert client.get_stats()['num_hedged'] == 1
+        assert client.get_stats()['num_hedges_won'] == 1
+    finally:
+        client.close()
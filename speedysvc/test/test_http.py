@@ -0,0 +1,78 @@
+import json
+import socket
+from http.client import HTTPConnection
+
+from speedysvc.client_server.base_classes.ServerMethodsBase import ServerMethodsBase
+from speedysvc.client_server.network.NetworkServer import NetworkServer
+from speedysvc.rpc_decorators import json_method
+
+
+class HTTPMethods(ServerMethodsBase):
+    port = 5738
+    name = 'test_http'
+
+    @json_method
+    def add(self, a, b):
+        return a + b
+
+
+class LimitedHTTPMethods(HTTPMethods):
+    port = 5838
+    name = 'test_http_limited'
+
+
+def post(conn, path, body):
+    conn.request('POST', path, body=json.dumps(body),
+                 headers={'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    return response.status, response.read()
+
+
+def test_keep_alive_requests():
+    server = NetworkServer(HTTPMethods(None), call_directly=True)
+    conn = HTTPConnection('127.0.0.1', HTTPMethods.port, timeout=5)
+    try:
+        # Several requests can be made over the same connection
+        assert post(conn, '/test_http/add', [1, 2]) == (200, b'3')
+        sock = conn.sock
+        assert post(conn, '/add', ['a', 'b']) == (200, b'"ab"')
+
+        status, _ = post(conn, '/test_http/missing', [])
+        assert status == 404
+        status, body = post(conn, '/add', [1, 'b'])
+        assert status == 500 and b'TypeError' in body
+
+        # Errors don't close the connection
+        assert post(conn, '/add', [2, 2]) == (200, b'4')
+        assert conn.sock is sock
+    finally:
+        conn.close()
+        server.shutdown(timeout=1)
+
+
+def test_large_body_rejected():
+    server = NetworkServer(
+        LimitedHTTPMethods(None), call_directly=True, max_http_body_size=16
+    )
+    conn = HTTPConnection('127.0.0.1', LimitedHTTPMethods.port, timeout=5)
+    sock = socket.create_connection(('127.0.0.1', LimitedHTTPMethods.port))
+    try:
+        assert post(conn, '/add', [1, 2]) == (200, b'3')
+
+        # Rejected from the head alone, without waiting for
+        # (or allocating memory for) the body, then closed
+        sock.settimeout(5)
+        sock.sendall(b'POST /add HTTP/1.1\r\n'
+                     b'Content-Length: 100000000000\r\n\r\n')
+        response = b''
+        while True:
+            data = sock.recv(4096)
+            if not data:
+                break
+            response += data
+        assert response.startswith(b'HTTP/1.1 413 ')
+        assert b'Connection: close' in response
+    finally:
+        sock.close()
+        conn.close()
+        server.shutdown(timeout=1)
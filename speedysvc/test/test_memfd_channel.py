@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from speedysvc.client_server.shared_memory.MemFDChannel import \
+    MemFDChannel, memfd_supported, get_memfd_address, new_memfd_token, \
+    new_memfd, map_fd, push_fd, fetch_fd
+
+
+pytestmark = pytest.mark.skipif(
+    not memfd_supported, reason="memfd is only supported on Linux"
+)
+
+
+def test_offer_and_push():
+    data = os.urandom(1024 * 1024)
+    address = get_memfd_address(5731, os.getpid(), 0)
+    channel = MemFDChannel(address)
+    try:
+        # Offered payloads can be fetched by a server worker
+        token = new_memfd_token()
+        channel.offer(token, new_memfd(data))
+        fd = fetch_fd(address, os.getpid(), token)
+        assert map_fd(fd, len(data))[:] == data
+
+        # ...until they're withdrawn
+        channel.withdraw(token)
+        with pytest.raises(FileNotFoundError):
+            fetch_fd(address, os.getpid(), token)
+
+        # A channel created by a different process than
+        # the one expected isn't sent anything
+        fd = new_memfd(data)
+        with pytest.raises(PermissionError):
+            push_fd(address, os.getpid() + 1, token, fd)
+        os.close(fd)
+
+        # Responses can be pushed back to the client
+        token = new_memfd_token()
+        push_fd(address, os.getpid(), token, new_memfd(data))
+        fd = channel.wait_for_pushed(token, timeout=5)
+        assert map_fd(fd, len(data))[:] == data
+    finally:
+        channel.close()
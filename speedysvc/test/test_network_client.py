@@ -0,0 +1,62 @@
+import time
+
+import pytest
+
+from speedysvc.client_server.base_classes.ServerMethodsBase import ServerMethodsBase
+from speedysvc.client_server.network.NetworkServer import NetworkServer
+from speedysvc.client_server.network.NetworkClient import NetworkClient, ConnectionLostError
+from speedysvc.compression.compression_types import null_compression
+from speedysvc.rpc_decorators import json_method
+
+
+class NetworkClientMethods(ServerMethodsBase):
+    port = 5727
+    name = 'test_network_client'
+
+    @json_method
+    def sleep_then_echo(self, secs, data):
+        time.sleep(secs)
+        return data
+
+
+class ClosingClientMethods(NetworkClientMethods):
+    port = 5827
+    name = 'test_network_client_closing'
+
+
+def test_concurrent_calls_share_one_connection():
+    server = NetworkServer(
+        NetworkClientMethods(None), call_directly=True, shm_pool_size=8
+    )
+    client = NetworkClient(NetworkClientMethods, compression_inst=null_compression)
+    try:
+        # Later calls finish first, so the responses
+        # have to be matched up using the request IDs
+        t_from = time.time()
+        LFutures = [
+            client.submit(NetworkClientMethods.sleep_then_echo, [0.5 - x*0.05, x])
+            for x in range(8)
+        ]
+        assert [future.result() for future in LFutures] == list(range(8))
+        assert time.time() - t_from < 1.5
+        assert client.get_num_outstanding() == 0
+    finally:
+        client.close()
+        server.shutdown(timeout=1)
+
+
+def test_calls_fail_once_closed():
+    server = NetworkServer(ClosingClientMethods(None), call_directly=True)
+    client = NetworkClient(ClosingClientMethods)
+    try:
+        future = client.submit(ClosingClientMethods.sleep_then_echo, [1.0, 'a'])
+        client.close()
+        # Calls which were waiting, and any calls made later,
+        # fail rather than waiting for a reconnection
+        with pytest.raises(ConnectionLostError):
+            future.result(timeout=5)
+        with pytest.raises(ConnectionLostError):
+            client.send(ClosingClientMethods.sleep_then_echo, [0, 'b'])
+        assert client.get_num_outstanding() == 0
+    finally:
+        server.shutdown(timeout=2)
@@ -0,0 +1,42 @@
+import socket
+
+from speedysvc.client_server.base_classes.ServerMethodsBase import ServerMethodsBase
+from speedysvc.client_server.network.NetworkServer import NetworkServer
+from speedysvc.client_server.network.NetworkClient import NetworkClient
+from speedysvc.compression.compression_types import null_compression
+from speedysvc.rpc_decorators import json_method
+from speedysvc.test.utils import call_in_threads
+
+
+class NetworkServerMethods(ServerMethodsBase):
+    port = 5726
+    name = 'test_network_server'
+
+    @json_method
+    def echo(self, data):
+        return data
+
+
+def test_many_connections_one_event_loop():
+    server = NetworkServer(NetworkServerMethods(None), call_directly=True)
+    try:
+        # A client which only sends part of a request
+        # mustn't hold up the others
+        stalled = socket.create_connection(('127.0.0.1', NetworkServerMethods.port))
+        stalled.sendall(b'N\0\0')
+
+        LClients = [
+            NetworkClient(NetworkServerMethods, compression_inst=null_compression)
+            for x in range(64)
+        ]
+        LResults = call_in_threads(
+            lambda client, x: client.send(NetworkServerMethods.echo, [x]),
+            [(client, x) for x, client in enumerate(LClients)]
+        )
+        assert LResults == list(range(64))
+
+        for client in LClients:
+            client.close()
+        stalled.close()
+    finally:
+        server.shutdown(timeout=1)
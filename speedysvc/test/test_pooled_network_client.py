@@ -0,0 +1,99 @@
+import time
+import socket
+
+import pytest
+
+from speedysvc.client_server.base_classes.ServerMethodsBase import ServerMethodsBase
+from speedysvc.client_server.network.NetworkServer import NetworkServer
+from speedysvc.client_server.network.PooledNetworkClient import \
+    PooledNetworkClient, LEAST_OUTSTANDING
+from speedysvc.client_server.network.NetworkClient import ConnectionLostError
+from speedysvc.compression.compression_types import null_compression
+from speedysvc.rpc_decorators import json_method
+from speedysvc.test.utils import call_in_threads, wait_for
+
+
+class PooledMethods(ServerMethodsBase):
+    port = 5728
+    name = 'test_pooled'
+
+    def __init__(self, logger_client, port):
+        ServerMethodsBase.__init__(self, logger_client)
+        # Each replica listens on a different port
+        self.port = port
+
+    @json_method
+    def get_port(self, secs):
+        time.sleep(secs)
+        return self.port
+
+
+def test_calls_spread_between_replicas():
+    LServers = [
+        NetworkServer(PooledMethods(None, port), call_directly=True)
+        for port in (5728, 5828)
+    ]
+    # Nothing listens on 5928, so it should be ejected from the pool
+    client = PooledNetworkClient(
+        PooledMethods,
+        [('127.0.0.1', 5728), ('127.0.0.1', 5828), ('127.0.0.1', 5928)],
+        connections_per_address=2,
+        load_balancing=LEAST_OUTSTANDING,
+        compression_inst=null_compression
+    )
+    try:
+        LPorts = call_in_threads(
+            lambda: client.send(PooledMethods.get_port, [0.3]),
+            [()] * 8
+        )
+        assert sorted(set(LPorts)) == [5728, 5828]
+    finally:
+        client.close()
+        for server in LServers:
+            server.shutdown(timeout=1)
+
+
+def test_lost_calls_only_retried_if_enabled():
+    LServers = [
+        NetworkServer(PooledMethods(None, port), call_directly=True)
+        for port in (5729, 5829)
+    ]
+    try:
+        for retry in (False, True):
+            client = PooledNetworkClient(
+                PooledMethods, [('127.0.0.1', 5729), ('127.0.0.1', 5829)],
+                retry_on_connection_lost=retry
+            )
+            try:
+                # Connections closed locally are skipped,
+                # rather than their host being ejected
+                client.LBackends[0].LClients[0].close()
+                for x in range(8):
+                    assert client.send(PooledMethods.get_port, [0]) in (5729, 5829)
+                assert not any(backend.ejected for backend in client.LBackends)
+
+                # Lose the connection while a call is in progress, as
+                # the server may have already run it
+                def lose_connection():
+                    LClients = wait_for(lambda: [
+                        i for backend in client.LBackends
+                        for i in backend.LClients if i.get_num_outstanding()
+                    ])
+                    LClients[0].conn_to_server.shutdown(socket.SHUT_RDWR)
+
+                LResults = call_in_threads(lambda fn, args: fn(*args), [
+                    (client.send, (PooledMethods.get_port, [0.5])),
+                    (lose_connection, ())
+                ])
+                if retry:
+                    assert LResults[0] in (5729, 5829)
+                else:
+                    assert isinstance(LResults[0], ConnectionLostError)
+            finally:
+                client.close()
+
+            with pytest.raises(ConnectionLostError):
+                client.send(PooledMethods.get_port, [0])
+    finally:
+        for server in LServers:
+            server.shutdown(timeout=1)
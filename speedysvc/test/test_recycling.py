@@ -0,0 +1,40 @@
+import os
+import time
+import tempfile
+
+from speedysvc.client_server.base_classes.ServerMethodsBase import ServerMethodsBase
+from speedysvc.client_server.shared_memory.SHMClient import SHMClient
+from speedysvc.rpc_decorators import json_method
+from speedysvc.test.utils import start_service, stop_service
+
+
+class RecyclingMethods(ServerMethodsBase):
+    port = 5746
+    name = 'test_recycling'
+
+    @json_method
+    def get_pid(self):
+        return os.getpid()
+
+
+def test_old_workers_recycled():
+    logger_server, proc = start_service(
+        RecyclingMethods, tempfile.mkdtemp(),
+        min_proc_num=1, max_proc_num=1, worker_max_age_secs=2
+    )
+    try:
+        assert logger_server.wait_until_started(timeout=30)
+        client = SHMClient(RecyclingMethods)
+        old_pid = client.send(RecyclingMethods.get_pid, [])
+
+        # Calls keep being handled while the
+        # worker is replaced, without any failing
+        t_from = time.time()
+        new_pid = old_pid
+        while new_pid == old_pid:
+            assert time.time() - t_from < 30
+            time.sleep(0.05)
+            new_pid = client.send(RecyclingMethods.get_pid, [])
+        assert new_pid in logger_server.LPIDs
+    finally:
+        stop_service(proc)
@@ -0,0 +1,45 @@
+import os
+import sys
+import tempfile
+
+from speedysvc.client_server.base_classes.ServerMethodsBase import ServerMethodsBase
+from speedysvc.client_server.shared_memory.SHMClient import SHMClient
+from speedysvc.rpc_decorators import json_method
+from speedysvc.restart import restart_service
+from speedysvc.test.utils import start_service, stop_service
+
+
+class RestartMethods(ServerMethodsBase):
+    port = 5744
+    name = 'test_restart'
+
+    @json_method
+    def get_pid(self):
+        return os.getpid()
+
+
+def test_rolling_restart():
+    logger_server, proc = start_service(
+        RestartMethods, tempfile.mkdtemp(),
+        min_proc_num=2, max_proc_num=2
+    )
+    try:
+        assert logger_server.wait_until_started(timeout=30)
+        client = SHMClient(RestartMethods)
+        SOldPIDs = set(logger_server.LPIDs)
+        assert client.send(RestartMethods.get_pid, []) in SOldPIDs
+
+        stdout = sys.stdout
+        assert restart_service(RestartMethods, timeout=60)
+        # Only the logger server's methods were
+        # called, without capturing stdout
+        assert sys.stdout is stdout
+
+        # Every worker was replaced, and the
+        # same client can still make calls
+        assert len(logger_server.LPIDs) == 2
+        assert not SOldPIDs & set(logger_server.LPIDs)
+        assert client.send(RestartMethods.get_pid, []) in logger_server.LPIDs
+        assert logger_server.get_service_status() == 'started'
+    finally:
+        stop_service(proc)
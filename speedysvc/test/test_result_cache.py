@@ -0,0 +1,60 @@
+from speedysvc.client_server.base_classes.ServerMethodsBase import ServerMethodsBase
+from speedysvc.client_server.base_classes.ClientMethodsBase import ClientMethodsBase
+from speedysvc.client_server.network.NetworkServer import NetworkServer
+from speedysvc.client_server.network.NetworkClient import NetworkClient
+from speedysvc.compression.compression_types import null_compression
+from speedysvc.rpc_decorators import json_method, cached
+
+
+class CachedMethods(ServerMethodsBase):
+    port = 5734
+    name = 'test_result_cache'
+
+    def __init__(self, logger_client):
+        ServerMethodsBase.__init__(self, logger_client)
+        self.DValues = {}
+        self.num_gets = 0
+
+    @cached(max_entries=2)
+    @json_method
+    def get_value(self, key):
+        self.num_gets += 1
+        return self.DValues.get(key)
+
+    @json_method
+    def set_value(self, key, value):
+        self.DValues[key] = value
+        self.invalidate_cache(self.get_value)
+
+
+class CachedClientMethods(ClientMethodsBase):
+    get_value = CachedMethods.get_value.as_rpc()
+    set_value = CachedMethods.set_value.as_rpc()
+
+
+def test_results_cached_until_invalidated():
+    server_methods = CachedMethods(None)
+    server = NetworkServer(server_methods, call_directly=True)
+    client = CachedClientMethods(
+        NetworkClient(CachedMethods, compression_inst=null_compression)
+    )
+    try:
+        client.set_value('a', 1)
+        assert client.get_value('a') == 1
+        assert client.get_value('a') == 1
+        assert server_methods.num_gets == 1
+
+        # Changing the data on the server stops
+        # the cached result from being used
+        client.set_value('a', 2)
+        assert client.get_value('a') == 2
+        assert server_methods.num_gets == 2
+
+        # Only the most recently used results are kept
+        client.get_value('b')
+        client.get_value('c')
+        client.get_value('a')
+        assert server_methods.num_gets == 5
+    finally:
+        client.client_provider.close()
+        server.shutdown(timeout=1)
@@ -0,0 +1,53 @@
+import socket
+
+import pytest
+
+from speedysvc.client_server.base_classes.ServerMethodsBase import ServerMethodsBase
+from speedysvc.client_server.network.NetworkServer import NetworkServer
+from speedysvc.client_server.network.NetworkClient import NetworkClient
+from speedysvc.compression.compression_types import null_compression
+from speedysvc.rpc_decorators import json_method
+
+
+class ReusePortMethods(ServerMethodsBase):
+    port = 5736
+    name = 'test_reuse_port'
+
+    def __init__(self, logger_client, worker_id):
+        ServerMethodsBase.__init__(self, logger_client)
+        self.worker_id = worker_id
+
+    @json_method
+    def get_worker_id(self):
+        return self.worker_id
+
+
+@pytest.mark.skipif(
+    not hasattr(socket, 'SO_REUSEPORT'),
+    reason="SO_REUSEPORT isn't supported on this platform"
+)
+def test_workers_share_a_port():
+    # As if served by two worker processes
+    LServers = [
+        NetworkServer(
+            ReusePortMethods(None, worker_id),
+            reuse_port=True, call_directly=True
+        )
+        for worker_id in range(2)
+    ]
+    LClients = [
+        NetworkClient(ReusePortMethods, compression_inst=null_compression)
+        for x in range(32)
+    ]
+    try:
+        # The kernel balances connections between them
+        SWorkerIds = {
+            client.send(ReusePortMethods.get_worker_id, [])
+            for client in LClients
+        }
+        assert SWorkerIds == {0, 1}
+    finally:
+        for client in LClients:
+            client.close()
+        for server in LServers:
+            server.shutdown(timeout=1)
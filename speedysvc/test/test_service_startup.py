@@ -0,0 +1,95 @@
+import os
+import sys
+import signal
+import tempfile
+import subprocess
+from _thread import start_new_thread
+
+import pytest
+
+from speedysvc.client_server.base_classes.ServerMethodsBase import ServerMethodsBase
+from speedysvc.rpc_decorators import json_method
+from speedysvc.test.utils import wait_for
+
+
+# The web monitor needs cherrypy
+pytest.importorskip('cherrypy')
+
+
+class StartupMethods(ServerMethodsBase):
+    port = 5747
+    name = 'test_startup'
+
+    @json_method
+    def echo(self, data):
+        return data
+
+
+class FailingStartupMethods(ServerMethodsBase):
+    port = 5847
+    name = 'test_startup_failing'
+
+    def __init__(self, logger_client):
+        raise ValueError("Can't start")
+
+
+class DependentStartupMethods(StartupMethods):
+    port = 5947
+    name = 'test_startup_dependent'
+
+
+INI = '''
+[defaults]
+log_dir=%(log_dir)s
+worker_start_timeout_secs=30
+
+[web monitor]
+port=5848
+
+[StartupMethods]
+import_from=speedysvc.test.test_service_startup
+
+[FailingStartupMethods]
+import_from=speedysvc.test.test_service_startup
+min_proc_num=2
+max_proc_num=2
+
+[DependentStartupMethods]
+import_from=speedysvc.test.test_service_startup
+depends_on=FailingStartupMethods,StartupMethods
+'''
+
+
+def test_failed_dependencies_not_started():
+    log_dir = tempfile.mkdtemp()
+    ini_path = f'{log_dir}/service.ini'
+    with open(ini_path, 'w') as f:
+        f.write(INI % dict(log_dir=log_dir))
+
+    proc = subprocess.Popen(
+        [sys.executable, '-u', '-m', 'speedysvc.service', ini_path],
+        stdout=subprocess.PIPE, text=True
+    )
+    LLines = []
+    def read_output():
+        for line in proc.stdout:
+            LLines.append(line.strip())
+    start_new_thread(read_output, ())
+
+    try:
+        wait_for(
+            lambda: any('FAILED  DependentStartupMethods' in i for i in LLines),
+            timeout=60
+        )
+        assert 'Service test_startup started [OK]' in LLines
+        assert any(
+            i.startswith('Service test_startup_failing [FAILED]') for i in LLines
+        )
+        assert any(
+            i.startswith('Not starting service DependentStartupMethods')
+            for i in LLines
+        )
+        assert not any('test_startup_dependent' in i for i in LLines)
+    finally:
+        proc.send_signal(signal.SIGINT)
+        proc.wait(30)
@@ -0,0 +1,32 @@
+import time
+
+from speedysvc.client_server.shared_memory.SingleFlight import SingleFlight
+from speedysvc.test.utils import call_in_threads
+
+
+def test_identical_calls_share_a_result():
+    single_flight = SingleFlight()
+    LCalls = []
+
+    def call(key):
+        LCalls.append(key)
+        time.sleep(0.3)
+        if key == 'bad':
+            raise KeyError(key)
+        return key * 2
+
+    LResults = call_in_threads(
+        lambda key: single_flight.do(key, lambda: call(key)),
+        [('a',)] * 4 + [('b',)] * 4 + [('bad',)] * 4,
+        stagger_secs=0.01
+    )
+    # Only the first of each overlapping call was made,
+    # and the others got its result, or its exception
+    assert sorted(LCalls) == ['a', 'b', 'bad']
+    assert LResults[:8] == ['aa'] * 4 + ['bb'] * 4
+    assert all(isinstance(exc, KeyError) for exc in LResults[8:])
+
+    # Results aren't kept once the call has finished
+    assert single_flight.do('a', lambda: call('a')) == 'aa'
+    assert LCalls.count('a') == 2
+    assert not single_flight.DInFlight
@@ -0,0 +1,58 @@
+import time
+import tempfile
+
+from speedysvc.client_server.base_classes.ServerMethodsBase import ServerMethodsBase
+from speedysvc.rpc_decorators import json_method
+from speedysvc.test.utils import start_service, stop_service
+
+
+class SlowStartMethods(ServerMethodsBase):
+    port = 5748
+    name = 'test_slow_start'
+
+    @classmethod
+    def preload(cls):
+        time.sleep(1.5)
+
+    @json_method
+    def echo(self, data):
+        return data
+
+
+class FailingStartMethods(ServerMethodsBase):
+    port = 5848
+    name = 'test_failing_start'
+
+    def __init__(self, logger_client):
+        raise ValueError("Can't start")
+
+
+def test_workers_start_concurrently():
+    t_from = time.time()
+    logger_server, proc = start_service(
+        SlowStartMethods, tempfile.mkdtemp(),
+        min_proc_num=4, max_proc_num=4
+    )
+    try:
+        assert logger_server.wait_until_started(timeout=30)
+        # Rather than 6 seconds, if started one at a time
+        assert time.time() - t_from < 4.5
+        # Every worker is ready by default, not just the first
+        assert len(logger_server.SStartedPIDs) == 4
+    finally:
+        stop_service(proc)
+
+
+def test_quorum_failure_stops_service():
+    logger_server, proc = start_service(
+        FailingStartMethods, tempfile.mkdtemp(),
+        min_proc_num=2, max_proc_num=2
+    )
+    try:
+        # The manager exits, rather than waiting forever
+        assert proc.wait(30) != 0
+        assert logger_server.start_failed
+        assert logger_server.get_service_status() == 'stopped'
+        assert not logger_server.wait_until_started(timeout=0)
+    finally:
+        stop_service(proc)
@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+from speedysvc.client_server.base_classes.ServerMethodsBase import ServerMethodsBase
+from speedysvc.client_server.shared_memory.SHMServer import SHMServer
+from speedysvc.client_server.network.UDPServer import UDPServer
+from speedysvc.client_server.network.UDPClient import UDPClient
+from speedysvc.client_server.batch_encoding import encode_batch_requests
+from speedysvc.rpc_decorators import json_method, oneway
+from speedysvc.test.utils import wait_for
+
+
+class UDPMethods(ServerMethodsBase):
+    port = 5739
+    name = 'test_udp'
+
+    def __init__(self, logger_client):
+        ServerMethodsBase.__init__(self, logger_client)
+        self.LEvents = []
+
+    @oneway
+    @json_method
+    def record_event(self, name, value):
+        self.LEvents.append((name, value))
+
+    @json_method
+    def clear_events(self):
+        self.LEvents.clear()
+
+
+def test_oneway_calls():
+    server_methods = UDPMethods(None)
+    shm_server = SHMServer(server_methods)
+    UDPServer(server_methods)
+    client = UDPClient(UDPMethods, batch_window_secs=0.05)
+    try:
+        for x in range(10):
+            assert client.send(UDPMethods.record_event, ['clicks', x]) is None
+        wait_for(lambda: len(server_methods.LEvents) == 10)
+        assert server_methods.LEvents == [('clicks', x) for x in range(10)]
+
+        # Only @oneway methods can be called
+        with pytest.raises(TypeError):
+            client.send(UDPMethods.clear_events, [])
+        client.sock.send(encode_batch_requests([(b'clear_events', b'[]')]))
+        time.sleep(0.3)
+        assert len(server_methods.LEvents) == 10
+    finally:
+        client.close()
+        shm_server.shutdown(timeout=1)
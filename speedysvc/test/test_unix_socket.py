@@ -0,0 +1,36 @@
+import os
+import tempfile
+
+from speedysvc.client_server.base_classes.ServerMethodsBase import ServerMethodsBase
+from speedysvc.client_server.network.NetworkServer import NetworkServer
+from speedysvc.client_server.connect import connect
+from speedysvc.compression.compression_types import null_compression
+from speedysvc.rpc_decorators import json_method
+
+
+class UnixSocketMethods(ServerMethodsBase):
+    port = 5730
+    name = 'test_unix_socket'
+
+    @json_method
+    def echo(self, data):
+        return data
+
+
+def test_unix_address():
+    path = os.path.join(tempfile.mkdtemp(), 'test_unix_socket.sock')
+    # A socket file left behind by a previous copy
+    # of the service is replaced
+    open(path, 'w').close()
+
+    server = NetworkServer(
+        UnixSocketMethods(None), unix_socket_path=path, call_directly=True
+    )
+    client = connect(UnixSocketMethods, f'unix://{path}',
+                     compression_inst=null_compression)
+    try:
+        assert client.send(UnixSocketMethods.echo, [{'a': [1, 2]}]) == {'a': [1, 2]}
+        assert client.get_address() == f'unix://{path}'
+    finally:
+        client.close()
+        server.shutdown(timeout=1)
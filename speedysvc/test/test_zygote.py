@@ -0,0 +1,46 @@
+import os
+import tempfile
+
+from speedysvc.client_server.base_classes.ServerMethodsBase import ServerMethodsBase
+from speedysvc.client_server.shared_memory.SHMClient import SHMClient
+from speedysvc.rpc_decorators import json_method
+from speedysvc.test.utils import start_service, stop_service
+
+
+class ZygoteMethods(ServerMethodsBase):
+    port = 5741
+    name = 'test_zygote'
+    preloaded_by = None
+
+    @classmethod
+    def preload(cls):
+        cls.preloaded_by = os.getpid()
+
+    @json_method
+    def get_pids(self):
+        return self.preloaded_by, os.getpid()
+
+
+def test_workers_forked_from_zygote():
+    logger_server, proc = start_service(
+        ZygoteMethods, tempfile.mkdtemp(),
+        min_proc_num=2, max_proc_num=2, zygote=True
+    )
+    try:
+        assert logger_server.wait_until_started(timeout=30)
+        client = SHMClient(ZygoteMethods)
+
+        # Each worker was preloaded once, in the zygote
+        SPreloadedBy = set()
+        SWorkerPIDs = set()
+        for x in range(20):
+            preloaded_by, worker_pid = client.send(ZygoteMethods.get_pids, [])
+            SPreloadedBy.add(preloaded_by)
+            SWorkerPIDs.add(worker_pid)
+
+        assert len(SPreloadedBy) == 1
+        assert not SPreloadedBy & SWorkerPIDs
+        assert not SPreloadedBy & {proc.pid, None}
+        assert SWorkerPIDs <= set(logger_server.LPIDs)
+    finally:
+        stop_service(proc)
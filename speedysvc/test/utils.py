@@ -0,0 +1,94 @@
+import sys
+import time
+import json
+import signal
+import subprocess
+from _thread import allocate_lock, start_new_thread
+
+from speedysvc.logger.std_logging.LoggerServer import LoggerServer
+
+
+def wait_for(fn, timeout=10.0):
+    """
+    Call `fn` until it returns something true
+
+    :return: what `fn` returned
+    :raise: TimeoutError if it didn't within `timeout` seconds
+    """
+    t_from = time.time()
+    while True:
+        result = fn()
+        if result:
+            return result
+        elif time.time() - t_from > timeout:
+            raise TimeoutError(f"{fn} wasn't true within {timeout} seconds")
+        time.sleep(0.02)
+
+
+def call_in_threads(fn, LArgs, stagger_secs=0.0):
+    """
+    Call `fn` with each of `LArgs` at the same
+    time, each from a different thread
+
+    :param stagger_secs: how long to wait between starting each thread
+    :return: a list of the return values (or the exceptions raised)
+             in the same order as `LArgs`
+    """
+    LResults = [None] * len(LArgs)
+    LLocks = []
+
+    def call(x, args):
+        try:
+            LResults[x] = fn(*args)
+        except Exception as exc:
+            LResults[x] = exc
+        LLocks[x].release()
+
+    for x, args in enumerate(LArgs):
+        lock = allocate_lock()
+        lock.acquire()
+        LLocks.append(lock)
+        start_new_thread(call, (x, args))
+        if stagger_secs:
+            time.sleep(stagger_secs)
+
+    for lock in LLocks:
+        lock.acquire()
+    return LResults
+
+
+def start_service(server_methods, log_dir, **DArgs):
+    """
+    Start a service in the same way as Services does: with its
+    LoggerServer in this process, and its MultiProcessManager
+    in a new one (which can be stopped with stop_service())
+
+    :param server_methods: the server methods class, which must be
+                           importable from the MultiProcessManager
+    :param DArgs: passed on to MultiProcessServer
+    :return: (the LoggerServer, the MultiProcessManager's Popen)
+    """
+    logger_server = LoggerServer(log_dir=log_dir, server_methods=server_methods)
+    logger_server.set_service_status('forking')
+
+    DArgs['import_from'] = server_methods.__module__
+    DArgs['section'] = server_methods.__name__
+    # The start quorum is waited for by Services (see
+    # LoggerServer.wait_until_started), rather than the manager
+    DArgs.setdefault('wait_until_completed', False)
+    proc = subprocess.Popen([
+        sys.executable, '-m',
+        'speedysvc.client_server.shared_memory.MultiProcessManager',
+        json.dumps(DArgs)
+    ])
+    return logger_server, proc
+
+
+def stop_service(proc, timeout=30):
+    """
+    Stop a service started with start_service(),
+    as with ctrl+c, and wait for it to exit
+    """
+    if proc.poll() is None:
+        proc.send_signal(signal.SIGINT)
+    return proc.wait(timeout)
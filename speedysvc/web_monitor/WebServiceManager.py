@@ -93,6 +93,15 @@ class WebServiceManager:
         """
         self.services.stop_service_by_port(port)
 
+    def restart_service(self, port):
+        """
+        Start a rolling restart, loading the service's current code
+
+        :param port:
+        :return:
+        """
+        self.services.restart_service_by_port(port)
+
     #=====================================================================#
     #                     Get All Service Status/Stats                    #
     #=====================================================================#
@@ -188,12 +197,14 @@ class WebServiceManager:
             offset=console_offset
         )
         method_stats_html = self.get_method_stats_html(port)
+        scaling_decisions_html = self.get_scaling_decisions_html(port)
 
         D = {
             "graphs": self.__get_D_graphs(recent_values),
             "console_text": '\n'.join(LHTML),
             "console_offset": offset,
-            "method_stats_html": method_stats_html
+            "method_stats_html": method_stats_html,
+            "scaling_decisions_html": scaling_decisions_html
         }
         D.update(self.__get_D_table_info(port, recent_values))
         D["table_html"] = self.__get_table_html(D)
@@ -219,6 +230,30 @@ class WebServiceManager:
             LMethodStats=LMethodStats
         )
 
+    def get_scaling_decisions_html(self, port):
+        """
+        Get a table of the most recent times the autoscaler
+        added or removed workers, and why
+
+        :param port:
+        :return:
+        """
+        LScalingDecisions = [
+            (
+                datetime.fromtimestamp(D['time']).strftime('%Y-%m-%d %H:%M:%S'),
+                D['from_workers'],
+                D['to_workers'],
+                D['reason']
+            )
+            for D in self.DServices[port].get_L_scaling_decisions()
+        ]
+        return self.jinja2_env.from_string(
+            '{% from "service_macros.html" import scaling_decisions_html %}\n'
+            '{{ scaling_decisions_html(LScalingDecisions) }}'
+        ).render(
+            LScalingDecisions=LScalingDecisions
+        )
+
     def __get_D_table_info(self, port, recent_values):
         """
 
@@ -227,11 +262,16 @@ class WebServiceManager:
         :return:
         """
         service = self.DServices[port]
+        status = service.get_service_status()
+        if service.get_restart_status() in ('requested', 'restarting'):
+            # (Also hides the stop/restart links until it's done)
+            status = f"{status} ({service.get_restart_status()})"
+
         return {
             "port": port,
             "name": service.original_server_methods.name,
             "bound_to_tcp": service.tcp_bind,
-            "status": service.get_service_status(),
+            "status": status,
             'workers': len(service.LPIDs),  # TODO: MAKE BASED ON INTERFACE, NOT IMPLEMENTATION!
             'physical_mem': recent_values[-1]['physical_mem'] // 1024 // 1024,
             # We'll average over 3 iterations, as this can spike pretty quickly.
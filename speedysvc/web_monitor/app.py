@@ -131,3 +131,9 @@ class App:
         port = int(port)
         web_service_manager.stop_service(port)
         raise cherrypy.HTTPRedirect('/')
+
+    @cherrypy.expose
+    def restart_service(self, port):
+        port = int(port)
+        web_service_manager.restart_service(port)
+        raise cherrypy.HTTPRedirect('/')
@@ -81,6 +81,8 @@ class Service {
         this.$(".console_log").setAttribute("offset", o["console_offset"]);
         document.getElementById("method_stats_html_cont_div").innerHTML =
             o["method_stats_html"];
+        document.getElementById("scaling_decisions_html_cont_div").innerHTML =
+            o["scaling_decisions_html"];
     }
 
     updateStatusTable(tableHTML) {